@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of the fixed-offset log decoders against the `eth_abi.decode` path they replace.
+
+Usage:
+    python benchmarks/bench_decoders.py [iterations]
+"""
+
+import sys
+import timeit
+
+import eth_abi
+
+from cream_bots.config import decoders
+
+SWAP_TYPES = ["int256", "int256", "uint160", "uint128", "int24"]
+MINT_TYPES = ["address", "uint128", "uint256", "uint256"]
+BURN_TYPES = ["uint128", "uint256", "uint256"]
+SYNC_TYPES = ["uint112", "uint112"]
+
+SWAP_DATA = "0x" + eth_abi.encode(
+    SWAP_TYPES,
+    [-1_234_567_890_123, 987_654_321_000_000_000, 2**96 + 12_345, 10**24, -887_220],
+).hex()
+MINT_DATA = "0x" + eth_abi.encode(
+    MINT_TYPES,
+    ["0xc36442b4a4522e871399cd717abdd847ab11fe88", 10**20, 10**18, 5 * 10**9],
+).hex()
+BURN_DATA = "0x" + eth_abi.encode(BURN_TYPES, [10**20, 10**18, 5 * 10**9]).hex()
+SYNC_DATA = "0x" + eth_abi.encode(SYNC_TYPES, [2**100 + 1, 2**90 + 7]).hex()
+TICK_TOPIC = "0x" + eth_abi.encode(["int24"], [-887_220]).hex()
+
+
+def eth_abi_swap():
+    return eth_abi.decode(SWAP_TYPES, bytes.fromhex(SWAP_DATA[2:]))
+
+
+def eth_abi_mint():
+    return (
+        eth_abi.decode(["int24"], bytes.fromhex(TICK_TOPIC[2:]))[0],
+        eth_abi.decode(["int24"], bytes.fromhex(TICK_TOPIC[2:]))[0],
+        eth_abi.decode(MINT_TYPES, bytes.fromhex(MINT_DATA[2:]))[1],
+    )
+
+
+def eth_abi_burn():
+    return (
+        eth_abi.decode(["int24"], bytes.fromhex(TICK_TOPIC[2:]))[0],
+        eth_abi.decode(["int24"], bytes.fromhex(TICK_TOPIC[2:]))[0],
+        eth_abi.decode(BURN_TYPES, bytes.fromhex(BURN_DATA[2:]))[0],
+    )
+
+
+def eth_abi_sync():
+    return eth_abi.decode(SYNC_TYPES, bytes.fromhex(SYNC_DATA[2:]))
+
+
+def fast_swap():
+    return decoders.decode_v3_swap(decoders.to_bytes(SWAP_DATA))
+
+
+def fast_mint():
+    return (
+        decoders.decode_int_topic(TICK_TOPIC),
+        decoders.decode_int_topic(TICK_TOPIC),
+        decoders.decode_v3_mint(decoders.to_bytes(MINT_DATA))[0],
+    )
+
+
+def fast_burn():
+    return (
+        decoders.decode_int_topic(TICK_TOPIC),
+        decoders.decode_int_topic(TICK_TOPIC),
+        decoders.decode_v3_burn(decoders.to_bytes(BURN_DATA))[0],
+    )
+
+
+def fast_sync():
+    return decoders.decode_sync(decoders.to_bytes(SYNC_DATA))
+
+
+CASES = {
+    "Swap": (eth_abi_swap, fast_swap),
+    "Mint": (eth_abi_mint, fast_mint),
+    "Burn": (eth_abi_burn, fast_burn),
+    "Sync": (eth_abi_sync, fast_sync),
+}
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    print(f"{'event':<6} {'eth_abi (us)':>13} {'decoders (us)':>14} {'speedup':>8}")
+    for name, (baseline, fast) in CASES.items():
+        assert tuple(baseline()) == tuple(fast()), f"{name} decoders disagree"
+
+        baseline_time = min(timeit.repeat(baseline, number=iterations, repeat=5))
+        fast_time = min(timeit.repeat(fast, number=iterations, repeat=5))
+
+        print(
+            f"{name:<6} {1e6 * baseline_time / iterations:>13.2f} "
+            f"{1e6 * fast_time / iterations:>14.2f} {baseline_time / fast_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
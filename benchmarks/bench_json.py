@@ -0,0 +1,168 @@
+"""
+Benchmark of the JSON backends on payloads shaped and sized like the ones the bots handle:
+`cream_events` log messages, `cream_app_state` updates, LP files and arb path files.
+
+Usage:
+    python benchmarks/bench_json.py [pools] [arbs]
+"""
+
+import json
+import random
+import sys
+import time
+
+from cream_bots.config import helpers
+
+BACKENDS = {"json": json.loads}
+
+try:
+    import ujson
+
+    BACKENDS["ujson"] = ujson.loads
+except ImportError:
+    pass
+
+try:
+    import orjson
+
+    BACKENDS["orjson"] = orjson.loads
+except ImportError:
+    pass
+
+try:
+    import msgspec
+
+    BACKENDS["msgspec"] = msgspec.json.Decoder().decode
+except ImportError:
+    pass
+
+rng = random.Random(0)
+
+
+def random_address() -> str:
+    return "0x" + rng.getrandbits(160).to_bytes(20, "big").hex()
+
+
+def random_word() -> str:
+    return "0x" + rng.getrandbits(256).to_bytes(32, "big").hex()
+
+
+def event_message() -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "method": "eth_subscription",
+        "params": {
+            "subscription": "0x" + rng.getrandbits(128).to_bytes(16, "big").hex(),
+            "result": {
+                "address": random_address(),
+                "topics": [random_word() for _ in range(3)],
+                "data": "0x" + "".join(random_word()[2:] for _ in range(5)),
+                "blockNumber": hex(rng.randrange(18_000_000, 19_000_000)),
+                "transactionHash": random_word(),
+                "transactionIndex": hex(rng.randrange(200)),
+                "blockHash": random_word(),
+                "logIndex": hex(rng.randrange(500)),
+                "removed": False,
+            },
+        },
+    }
+
+
+def app_state_message() -> dict:
+    return {
+        "average_blocktime": 2.0,
+        "base_fee_last": rng.randrange(10**8, 10**10),
+        "base_fee_next": rng.randrange(10**8, 10**10),
+        "block_number": rng.randrange(18_000_000, 19_000_000),
+        "block_timestamp": int(time.time()),
+        "chain_id": 8453,
+        "chain_name": "base",
+        "live": True,
+        "newest_block": rng.randrange(18_000_000, 19_000_000),
+        "newest_block_timestamp": int(time.time()),
+        "router_addresses": [random_address() for _ in range(20)],
+        "aggregator_addresses": [random_address() for _ in range(10)],
+    }
+
+
+def lp_file(pools: int) -> list:
+    return [
+        {
+            "pool_address": random_address(),
+            "token0": random_address(),
+            "token1": random_address(),
+            "block_number": rng.randrange(1_000_000, 19_000_000),
+            "pool_id": pool_id,
+            "type": "UniswapV3",
+            "exchange": "uniswap",
+            "fee": rng.choice([100, 500, 3000, 10000]),
+            "tick_spacing": rng.choice([1, 10, 60, 200]),
+        }
+        for pool_id in range(pools)
+    ]
+
+
+def arb_paths_file(arbs: int, pools: list) -> dict:
+    arb_paths = {}
+    for _ in range(arbs):
+        path = [pool["pool_address"] for pool in rng.sample(pools, 3)]
+        arb_id = random_word()[2:]
+        arb_paths[arb_id] = {
+            "id": arb_id,
+            "path": path,
+            "pools": {
+                pool["pool_address"]: {
+                    key: pool[key] for key in ("pool_address", "token0", "token1", "type", "fee")
+                }
+                for pool in pools[:3]
+            },
+        }
+    return arb_paths
+
+
+def bench(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    pools = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    arbs = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+
+    lp_data = lp_file(pools)
+    payloads = {
+        "event message": (json.dumps(event_message()).encode(), 20_000),
+        "app_state": (json.dumps(app_state_message()).encode(), 20_000),
+        f"LP file ({pools} pools)": (json.dumps(lp_data, indent=2).encode(), 3),
+        f"arb paths ({arbs} arbs)": (json.dumps(arb_paths_file(arbs, lp_data), indent=2).encode(), 3),
+    }
+
+    print(f"Selected backend: {helpers.json_backend}")
+    for name, (data, repeat) in payloads.items():
+        print(f"\n{name}: {len(data) / 1e6:.2f} MB" if len(data) > 1e6 else f"\n{name}: {len(data)} B")
+
+        # Small messages are timed in a loop, the per-call cost is what matters for them
+        loops = repeat if len(data) < 1e6 else 1
+        repeat = 5 if loops > 1 else repeat
+
+        # The old hot path decoded the bytes to str before parsing them
+        timings = {
+            "ujson (decode + loads)": lambda: [ujson.loads(data.decode("utf-8")) for _ in range(loops)]
+        } if "ujson" in BACKENDS else {}
+        for backend, loads in BACKENDS.items():
+            timings[backend] = lambda loads=loads: [loads(data) for _ in range(loops)]
+
+        baseline = None
+        for backend, func in timings.items():
+            elapsed = bench(func, repeat) / loops
+            baseline = baseline or elapsed
+            unit, scale = ("us", 1e6) if loops > 1 else ("ms", 1e3)
+            print(f"  {backend:<24} {elapsed * scale:>10.2f} {unit} {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
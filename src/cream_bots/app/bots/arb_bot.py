@@ -1,9 +1,9 @@
 import asyncio
-from asyncio import Queue
 from aiohttp import ClientSession
 from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 import degenbot
+import multiprocessing
 import os
 import redis.asyncio as redis
 from typing import Dict, Optional, Set
@@ -15,13 +15,23 @@ from degenbot.uniswap.v3_snapshot import (
 
 from cream_chains import chain_data as cream_chains_data
 
+from ..core.arb_index import ArbIndex
 from ..core.arbitrage_service import ArbitrageService
 from ..core.blacklist_service import BlacklistService
+from ..core.calculation_cache import CalculationCache
+from ..core.checkpoint_service import CheckpointService
 from ..core.bootstrap_service import BootstrapService
 from ..core.event_service import EventService
 from ..core.exchange_service import ExchangeService
-from ..core.pool_service import PoolService
-from ...config.constants import REDIS_HOST, REDIS_PORT
+from ..core.gas_model import GasModel
+from ..core.lazy_catalog import LazyCatalog
+from ..core.max_input_bounds import MaxInputBounds
+from ..core.metrics import StageMetrics
+from ..core.pool_queue import PoolUpdateQueue
+from ..core.pool_service import PoolRoute, PoolService
+from ..core.shared_state import SharedPoolStateTable
+from ..core.snapshot_service import SnapshotService
+from ...config.constants import EXECUTOR_WORKERS, REDIS_HOST, REDIS_PORT, SHARED_POOL_STATE
 from ...config.logging import logger
 
 log = logger(__name__)
@@ -34,25 +44,43 @@ class ArbDetails:
 
 
 class ArbBotState:
-    def __init__(self, chain_name: str, chain_data: Dict):
+    def __init__(self, chain_name: str, chain_data: Dict, redis_client: Optional[redis.Redis] = None):
         self.aggregators: Optional[Dict] = chain_data.get("aggregators")
         self.all_arbs: Dict[str, ArbDetails] = {}
         self.all_pools: degenbot.AllPools = degenbot.AllPools(chain_data["chain_id"])
+        self.arb_index: ArbIndex = ArbIndex()
         self.blacklists: Set[str] = set()
+        self.bot_name: str = "arb"
+        self.calculation_cache: Optional[CalculationCache] = None
         self.chain_id: int = chain_data["chain_id"]
         self.chain_data: Dict = chain_data
         self.chain_name: str = chain_name
-        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=8)
+        self.checkpoint_service: Optional[CheckpointService] = None
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=EXECUTOR_WORKERS,
+            # The workers inherit the shared state table and the arb helpers when they are forked
+            mp_context=multiprocessing.get_context("fork") if SHARED_POOL_STATE else None,
+        )
         self.factories: Optional[Dict] = chain_data.get("factories")
+        self.gas_model: GasModel = GasModel()
         self.http_session: ClientSession = ClientSession()
         self.http_uri: str = chain_data["http_uri"]
+        self.lazy_catalog: Optional[LazyCatalog] = None
         self.live: bool = False
+        self.max_input_bounds: MaxInputBounds = MaxInputBounds()
+        self.metrics: Optional[StageMetrics] = None
         self.node: str = chain_data["node"]
         self.pool_managers: Dict = {}
-        self.pools_to_process: Queue = Queue()
-        self.redis_client: redis.Redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+        self.pool_routes: Dict[str, PoolRoute] = {}
+        self.pools_loaded: bool = False
+        self.pools_to_process: PoolUpdateQueue = PoolUpdateQueue()
+        self.redis_client: redis.Redis = redis_client or redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
         self.routers: Optional[Dict] = chain_data.get("routers")
+        self.shared_state: Optional[SharedPoolStateTable] = (
+            SharedPoolStateTable() if SHARED_POOL_STATE else None
+        )
         self.snapshot: Optional[UniswapV3LiquiditySnapshot] = None
+        self.snapshot_service: Optional[SnapshotService] = None
         self.websocket_uri: str = chain_data["websocket_uri"]
         self.w3: web3.Web3 = web3.Web3(web3.WebsocketProvider(chain_data["websocket_uri"]))
 
@@ -69,12 +97,14 @@ class ArbBotState:
 
 
 class ArbBot:
-    def __init__(self, chain_name: str):
+    def __init__(self, chain_name: str, redis_client: Optional[redis.Redis] = None):
         """
         Initializes a new instance of the ArbBot class.
 
         Args:
             chain_name (str): The name of the chain.
+            redis_client (Optional[redis.Redis]): A client to use instead of connecting to
+                REDIS_HOST, e.g. the replay harness's in-process stand-in.
 
         Attributes:
             chain_name (str): The name of the chain.
@@ -85,12 +115,14 @@ class ArbBot:
             event_service (EventService): The event service used by the bot.
             exchange_service (ExchangeService): The exchange service used by the bot.
             pool_service (PoolService): The pool service used by the bot.
+            snapshot_service (SnapshotService): Persists the V3 liquidity snapshot.
+            checkpoint_service (CheckpointService): Persists the pools and arbs for warm starts.
         """
         self.chain_name = chain_name
         chain_data = cream_chains_data.get(self.chain_name)
         if not chain_data:
             raise ValueError(f"No chain data found for {self.chain_name}")
-        self.bot_state = ArbBotState(self.chain_name, chain_data)
+        self.bot_state = ArbBotState(self.chain_name, chain_data, redis_client)
 
         # Initialize web3
         degenbot.set_web3(self.bot_state.w3)
@@ -110,6 +142,13 @@ class ArbBot:
         snapshot_filename = f"{self.chain_name}_v3_liquidity_snapshot.json"
         snapshot_filepath = os.path.join(data_dir, snapshot_filename)
         self.bot_state.snapshot = UniswapV3LiquiditySnapshot(snapshot_filepath)
+        self.snapshot_service = SnapshotService(self.bot_state, snapshot_filepath)
+        self.bot_state.snapshot_service = self.snapshot_service
+
+        # Initialize checkpoint, after the snapshot it has to match
+        checkpoint_filepath = os.path.join(data_dir, f"{self.chain_name}_checkpoint.bin")
+        self.checkpoint_service = CheckpointService(self.bot_state, checkpoint_filepath)
+        self.bot_state.checkpoint_service = self.checkpoint_service
 
     async def initialize(self):
         """
@@ -128,6 +167,9 @@ class ArbBot:
             await self.bot_state.redis_client.aclose()
         if self.bot_state.http_session:
             await self.bot_state.http_session.close()
+        if self.bot_state.shared_state:
+            self.bot_state.executor.shutdown(wait=False, cancel_futures=True)
+            self.bot_state.shared_state.close(unlink=True)
         log.info("Resources closed.")
 
     async def run(self):
@@ -143,6 +185,9 @@ class ArbBot:
         # Start process_uniswap_events immediately in the background
         uniswap_events_task = asyncio.create_task(self.event_service.process_uniswap_events())
 
+        # Persist the liquidity snapshot once the pools are loaded
+        snapshot_task = asyncio.create_task(self.snapshot_service.start())
+
         # Wait for bot_state.live to become True
         while not self.bot_state.live:
             await asyncio.sleep(1)
@@ -156,5 +201,6 @@ class ArbBot:
         await asyncio.gather(
             uniswap_events_task,
             arbitrage_task,
-            bootstrap_task
+            bootstrap_task,
+            snapshot_task,
         )
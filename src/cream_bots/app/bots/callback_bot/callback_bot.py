@@ -17,6 +17,7 @@ log = logger(__name__)
 class CallbackBotState:
     def __init__(self, chain_name: str, chain_data: Dict):
         self.aggregators: Optional[Dict] = chain_data.get("aggregators")
+        self.bot_name: str = "callback"
         self.chain_id: int = chain_data["chain_id"]
         self.chain_data: Dict = chain_data
         self.chain_name: str = chain_name
@@ -3,7 +3,6 @@ import degenbot
 from eth_utils.address import to_checksum_address
 from hexbytes import HexBytes
 from typing import TYPE_CHECKING, Dict, List, Optional, Set
-import ujson
 import web3
 
 from degenbot.arbitrage.uniswap_lp_cycle import (
@@ -21,6 +20,7 @@ from ...core.anvil_service import AnvilService
 from ...core.aggregator_service import AggregatorService
 
 from ....config.constants import *
+from ....config.helpers import json_loads
 from ....config.logging import logger
 
 log = logger(__name__)
@@ -54,7 +54,7 @@ class CallbackTransactionService:
                 async for message in pubsub.listen():
                     if message["type"] == "message":
                         transaction_data = message["data"]
-                        transaction_dict = ujson.loads(transaction_data.decode('utf-8'))
+                        transaction_dict = json_loads(transaction_data)
 
                         # Skip if the transaction is already in failed_transactions
                         if transaction_dict['hash'] in self.bot_state.failed_transactions:
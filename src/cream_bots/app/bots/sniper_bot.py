@@ -1,4 +1,3 @@
-from asyncio import Queue
 from aiohttp import ClientSession
 from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
@@ -14,11 +13,21 @@ from degenbot.uniswap.v3_snapshot import (
 
 from cream_chains import chain_data as cream_chains_data
 
+from ..core.arb_index import ArbIndex
 from ..core.blacklist_service import BlacklistService
+from ..core.calculation_cache import CalculationCache
+from ..core.checkpoint_service import CheckpointService
 from ..core.event_service import EventService
 from ..core.exchange_service import ExchangeService
+from ..core.gas_model import GasModel
+from ..core.lazy_catalog import LazyCatalog
+from ..core.max_input_bounds import MaxInputBounds
+from ..core.metrics import StageMetrics
+from ..core.pool_queue import PoolUpdateQueue
 from ..core.pool_service import PoolService
-from ...config.constants import REDIS_HOST, REDIS_PORT
+from ..core.shared_state import SharedPoolStateTable
+from ..core.snapshot_service import SnapshotService
+from ...config.constants import EXECUTOR_WORKERS, REDIS_HOST, REDIS_PORT
 from ...config.logging import logger
 
 log = logger(__name__)
@@ -27,22 +36,34 @@ log = logger(__name__)
 @dataclass
 class SniperBotState:
     aggregators: Optional[Dict] = None
+    all_arbs: Dict = field(default_factory=dict)
     all_pools: degenbot.AllPools = field(default_factory=degenbot.AllPools)
+    arb_index: ArbIndex = field(default_factory=ArbIndex)
     blacklists: Set[str] = field(default_factory=set)
+    bot_name: str = "sniper"
+    calculation_cache: Optional[CalculationCache] = None
     chain_id: Optional[int] = None
     chain_data: Optional[Dict] = None
     chain_name: Optional[str] = None
+    checkpoint_service: Optional[CheckpointService] = None
     executor: Optional[ProcessPoolExecutor] = None
     factories: Optional[Dict] = None
+    gas_model: GasModel = field(default_factory=GasModel)
     http_session: Optional[ClientSession] = None
     http_uri: Optional[str] = None
+    lazy_catalog: Optional[LazyCatalog] = None
     live: bool = False
+    max_input_bounds: MaxInputBounds = field(default_factory=MaxInputBounds)
+    metrics: Optional[StageMetrics] = None
     node: Optional[str] = None
     pool_managers: Optional[Dict] = None
-    pools_to_process: Queue = Queue()
+    pool_routes: Dict = field(default_factory=dict)
+    pools_to_process: PoolUpdateQueue = field(default_factory=PoolUpdateQueue)
     redis_client: redis.Redis = None
     routers: Optional[Dict] = None
+    shared_state: Optional[SharedPoolStateTable] = None
     snapshot: Optional[UniswapV3LiquiditySnapshot] = None
+    snapshot_service: Optional[SnapshotService] = None
     websocket_uri: Optional[str] = None
     w3: web3.main.Web3 = None
 
@@ -102,7 +123,7 @@ class SniperBot:
             chain_id=chain_id,
             chain_data=chain_data,
             chain_name=self.chain_name,
-            executor=ProcessPoolExecutor(max_workers=8),
+            executor=ProcessPoolExecutor(max_workers=EXECUTOR_WORKERS),
             factories=chain_data["factories"],
             http_session=ClientSession(),
             http_uri=chain_data["http_uri"],
@@ -0,0 +1,128 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class ArbIndex:
+    """
+    Inverted index from pool address to the ids of every arb that routes through it.
+
+    `bot_state.all_arbs` stays the source of truth for the arb helpers themselves, this
+    only answers "which arbs touch this pool" without scanning the whole catalog.
+
+    Every pool also gets a dense integer id when its first arb is added, and the pool ids of
+    each arb are kept, for `non_overlapping`.
+    """
+
+    def __init__(self):
+        self.arbs_by_pool: Dict[str, Set[str]] = {}
+        self.pools_by_arb: Dict[str, tuple] = {}
+        self.pool_ids: Dict[str, int] = {}
+        self.pool_ids_by_arb: Dict[str, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.pools_by_arb)
+
+    def __contains__(self, arb_id: str) -> bool:
+        return arb_id in self.pools_by_arb
+
+    def add(self, arb_id: str, pool_addresses: Iterable[str]):
+        """
+        Registers an arb under every pool in its path.
+
+        Args:
+            arb_id (str): The id of the arb.
+            pool_addresses (Iterable[str]): The addresses of the pools in the arb path, in any position.
+        """
+        pool_addresses = tuple(pool_addresses)
+        if arb_id in self.pools_by_arb:
+            # Arbs indexed while loading the paths are added again with their helper
+            if self.pools_by_arb[arb_id] == pool_addresses:
+                return
+            self.remove(arb_id)
+
+        self.pools_by_arb[arb_id] = pool_addresses
+        for pool_address in pool_addresses:
+            self.arbs_by_pool.setdefault(pool_address, set()).add(arb_id)
+        self.pool_ids_by_arb[arb_id] = tuple(
+            self.pool_ids.setdefault(pool_address, len(self.pool_ids)) for pool_address in pool_addresses
+        )
+
+    def remove(self, arb_id: str):
+        """
+        Removes an arb from the index. Unknown ids are ignored.
+
+        Args:
+            arb_id (str): The id of the arb.
+        """
+        pool_addresses = self.pools_by_arb.pop(arb_id, ())
+        self.pool_ids_by_arb.pop(arb_id, None)
+        for pool_address in pool_addresses:
+            arb_ids = self.arbs_by_pool.get(pool_address)
+            if arb_ids is None:
+                continue
+            arb_ids.discard(arb_id)
+            if not arb_ids:
+                del self.arbs_by_pool[pool_address]
+
+    def remove_pool(self, pool_address: str) -> Set[str]:
+        """
+        Removes every arb that routes through a pool.
+
+        Args:
+            pool_address (str): The address of the pool.
+
+        Returns:
+            Set[str]: The ids of the arbs that were removed.
+        """
+        arb_ids = set(self.arbs_by_pool.get(pool_address, ()))
+        for arb_id in arb_ids:
+            self.remove(arb_id)
+        return arb_ids
+
+    def get(self, pool_address: str) -> Set[str]:
+        """
+        Returns the ids of the arbs that route through a pool.
+
+        Args:
+            pool_address (str): The address of the pool.
+
+        Returns:
+            Set[str]: The affected arb ids. Do not mutate the returned set.
+        """
+        return self.arbs_by_pool.get(pool_address, set())
+
+    def non_overlapping(self, arb_ids: Iterable[str]) -> List[str]:
+        """
+        Greedily selects arbs that share no pool, in one pass: an arb is kept unless one of
+        its pools is used by an arb kept before it. Unknown ids are skipped.
+
+        Pools are numbered again in the order they are seen, so the bitmasks stay as small as
+        the number of pools involved rather than the whole catalog.
+
+        Args:
+            arb_ids (Iterable[str]): The candidate arb ids, most preferred first.
+
+        Returns:
+            List[str]: The selected arb ids, in the same order.
+        """
+        bits: Dict[int, int] = {}
+        used = 0
+        selected: List[str] = []
+
+        for arb_id in arb_ids:
+            pool_ids = self.pool_ids_by_arb.get(arb_id)
+            if pool_ids is None:
+                continue
+
+            mask = 0
+            for pool_id in pool_ids:
+                bit = bits.get(pool_id)
+                if bit is None:
+                    bit = bits[pool_id] = 1 << len(bits)
+                mask |= bit
+
+            if mask & used:
+                continue
+            used |= mask
+            selected.append(arb_id)
+
+        return selected
@@ -2,13 +2,12 @@ import asyncio
 import degenbot
 from eth_utils.address import to_checksum_address
 from hexbytes import HexBytes
-from typing import TYPE_CHECKING, Dict, List, Set
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
 
 import web3
 
 from degenbot.arbitrage.uniswap_lp_cycle import (
     ArbitrageCalculationResult,
-    UniswapLpCycle,
 )
 from degenbot.uniswap.v3_types import (
     UniswapV3PoolExternalUpdate,
@@ -17,6 +16,10 @@ from degenbot.uniswap.v3_snapshot import (
     UniswapV3LiquiditySnapshot,
 )
 
+from .batch_evaluator import BatchEvaluator
+from .calculation_cache import CalculationCache
+from .evaluation_scheduler import EvaluationScheduler
+from ...config.constants import EVALUATE_ARBS_BY_BLOCK, EXECUTOR_WORKERS
 from ...config.logging import logger
 
 log = logger(__name__)
@@ -27,11 +30,53 @@ class ArbDetails:
         self.lp_cycle = lp_cycle
         self.status = status
 
+        # Calculation history, used to evaluate the most promising arbs first
+        self.evaluations: int = 0
+        self.profitable_count: int = 0
+        self.last_profit: Optional[int] = None
+        self.cost_ewma: Optional[float] = None
+
+    def record_evaluation(self, seconds: float):
+        self.evaluations += 1
+        if self.cost_ewma is None:
+            self.cost_ewma = seconds
+        else:
+            self.cost_ewma += 0.2 * (seconds - self.cost_ewma)
+
+    def record_result(self, profit_amount: int):
+        self.last_profit = profit_amount
+        if profit_amount > 0:
+            self.profitable_count += 1
+
+    def priority(self, default_cost: float) -> float:
+        """
+        Expected profitable results per second of calculation: the (smoothed) share of
+        evaluations that were profitable, over the average calculation time.
+
+        Args:
+            default_cost (float): The calculation time to assume for an arb never calculated.
+
+        Returns:
+            float: The priority, higher is evaluated first.
+        """
+        cost = self.cost_ewma if self.cost_ewma is not None else default_cost
+        return (self.profitable_count + 1) / (self.evaluations + 2) / max(cost, 1e-9)
+
 
 class ArbitrageService:
     def __init__(self, bot_state):
         self.bot_state = bot_state
         self.w3 = self.bot_state.w3
+        self.bot_state.calculation_cache = CalculationCache(self.bot_state.pool_routes)
+        self.batch_evaluator = BatchEvaluator(
+            self.bot_state.executor,
+            EXECUTOR_WORKERS,
+            shared_state=self.bot_state.shared_state,
+            all_arbs=self.bot_state.all_arbs,
+            cache=self.bot_state.calculation_cache,
+            min_profit=self.gas_cost,
+        )
+        self.scheduler = EvaluationScheduler(self.bot_state)
         
         log.info(
             f"ArbitrageService initialized with app instance at {id(self.bot_state)}"
@@ -45,9 +90,9 @@ class ArbitrageService:
         """
         Finds arbitrage opportunities affected by a specific pool address.
 
-        This method iterates through all arbitrage opportunities stored in the bot state
-        and checks if the given pool address is part of any of the arbitrage cycles. If it is,
-        the arbitrage opportunity is added to the list of affected arbitrage opportunities.
+        This method looks the pool address up in the pool-to-arbs index maintained in the bot
+        state, so the cost is proportional to the number of affected arbs rather than the size
+        of the arb catalog. Every position in the arb path is indexed.
 
         Args:
             pool_address (str): The address of the pool to check for affected arbitrage opportunities.
@@ -55,58 +100,185 @@ class ArbitrageService:
         Returns:
             List[degenbot.UniswapLpCycle]: A list of arbitrage opportunities affected by the given pool address.
         """
-        affected_arbs = []
-        
-        for _, arb_details in self.bot_state.all_arbs.items():
-            arb_object = arb_details.lp_cycle
-            if len(arb_object.swap_pools) == 2:
-                if arb_object.swap_pools[0].address == pool_address or arb_object.swap_pools[1].address == pool_address:
-                    affected_arbs.append(arb_object)
-            elif len(arb_object.swap_pools) == 3:
-                if arb_object.swap_pools[1].address == pool_address:
-                    affected_arbs.append(arb_object)
-                
-        return affected_arbs
-    
+        return await self.find_affected_arbs_for_pools([pool_address])
+
+    async def find_affected_arbs_for_pools(
+        self,
+        pool_addresses: Iterable[str],
+    ):
+        """
+        Finds arbitrage opportunities affected by any of several pool addresses.
+
+        An arb that routes through more than one of the pools is only returned once.
+
+        Args:
+            pool_addresses (Iterable[str]): The addresses of the pools to check for affected arbitrage opportunities.
+
+        Returns:
+            List[degenbot.UniswapLpCycle]: A list of arbitrage opportunities affected by any of the given pool addresses.
+        """
+        all_arbs = self.bot_state.all_arbs
+        arb_index = self.bot_state.arb_index
+
+        affected_arb_ids: Set[str] = set()
+        for pool_address in pool_addresses:
+            affected_arb_ids.update(arb_index.get(pool_address))
+
+        lazy_catalog = self.bot_state.lazy_catalog
+        if lazy_catalog is not None:
+            # Builds the arbs affected for the first time, and the pools they need
+            return [
+                arb_details.lp_cycle
+                for arb_details in await lazy_catalog.materialize_arbs(affected_arb_ids)
+            ]
+
+        return [
+            arb_details.lp_cycle
+            for arb_id in affected_arb_ids
+            if (arb_details := all_arbs.get(arb_id)) is not None
+        ]
 
     async def find_onchain_arbs(self):
         """
         Continuously finds and processes on-chain arbitrage opportunities.
 
-        This method runs in an infinite loop, checking for pools that need to be processed.
-        When a pool is found, it retrieves the pool address and finds the affected arbitrage
-        opportunities. If any affected arbitrage opportunities are found, it creates a task
-        to process them.
+        This method runs in an infinite loop, taking every pool that was updated since the
+        previous iteration from the coalescing `pools_to_process` queue. The arbitrage
+        opportunities affected by any of those pools are processed together in one task, run by
+        the `EvaluationScheduler` with the newest block seen so far.
+
+        With `EVALUATE_ARBS_BY_BLOCK` enabled, evaluation happens once per block instead,
+        see `find_onchain_arbs_by_block`.
 
         Returns:
             None
         """
+        if EVALUATE_ARBS_BY_BLOCK:
+            return await self.find_onchain_arbs_by_block()
+
         while True:
             try:
-                pool_address = await self.bot_state.pools_to_process.get()
+                pool_addresses = await self.bot_state.pools_to_process.get_batch()
+
+                #log.info(f"(find_onchain_arbs) Number of pools: {len(pool_addresses)}")
+
+                affected_arbs = await self.find_affected_arbs_for_pools(pool_addresses)
 
-                #log.info(f"(find_onchain_arbs) pool_address: {pool_address}")
-                
-                affected_arbs = await self.find_affected_arbs(pool_address)
-                
                 #log.info(f"(find_onchain_arbs) Number of arbs: {len(affected_arbs)}")
-                            
+
                 if affected_arbs:
-                    asyncio.create_task(
-                        self.process_onchain_arbs(
-                            arb_helpers=affected_arbs,
-                        )
+                    evaluation = self.process_onchain_arbs(
+                        arb_helpers=affected_arbs,
                     )
-                
+                    metrics = self.bot_state.metrics
+                    await self.scheduler.submit(
+                        self.bot_state.pools_to_process.newest_block,
+                        pool_addresses,
+                        metrics.timed("arb_evaluation", evaluation)
+                        if metrics is not None
+                        else evaluation,
+                    )
+
             except Exception as e:
                 log.error(f"Error in find_onchain_arbs: {e}")
-            finally:
-                self.bot_state.pools_to_process.task_done()
+
+    async def find_onchain_arbs_by_block(self):
+        """
+        Continuously finds and processes on-chain arbitrage opportunities, one block at a time.
+
+        This method waits until every pool dirtied within a block has been collected. A block is
+        sealed when an event from a later block arrives, when `BootstrapService` reports a newer
+        block, or after two average block times without either. The union of the affected arbs
+        is then evaluated once, with a single non-overlap selection across all of them. The
+        evaluation is cancelled if it runs past the block's deadline, see `EvaluationScheduler`.
+
+        Returns:
+            None
+        """
+        pools_to_process = self.bot_state.pools_to_process
+
+        while True:
+            try:
+                try:
+                    block_number, pool_addresses = await asyncio.wait_for(
+                        pools_to_process.get_block_batch(),
+                        timeout=2 * (self.bot_state.average_blocktime or 1),
+                    )
+                except asyncio.TimeoutError:
+                    # No new block has been seen for a while, flush what we have
+                    if pools_to_process.newest_block is not None:
+                        pools_to_process.seal_block(pools_to_process.newest_block)
+                    continue
+
+                affected_arbs = await self.find_affected_arbs_for_pools(pool_addresses)
+
+                #log.info(f"(find_onchain_arbs_by_block) Block {block_number}: {len(pool_addresses)} pools, {len(affected_arbs)} arbs")
+
+                if affected_arbs:
+                    evaluation = self.process_onchain_arbs(
+                        arb_helpers=affected_arbs,
+                        block_number=block_number,
+                    )
+                    metrics = self.bot_state.metrics
+                    task = await self.scheduler.submit(
+                        block_number,
+                        pool_addresses,
+                        metrics.timed("arb_evaluation", evaluation)
+                        if metrics is not None
+                        else evaluation,
+                    )
+                    if task is not None:
+                        # Blocks are evaluated one at a time, the deadline can still cancel it
+                        await asyncio.wait([task])
+
+            except Exception as e:
+                log.error(f"Error in find_onchain_arbs_by_block: {e}")
     
 
+    def gas_cost(self, arb_helper: degenbot.UniswapLpCycle) -> int:
+        """
+        Returns:
+            int: The estimated gas cost of executing the arb in the next block, in wei.
+        """
+        return self.bot_state.gas_model.cost(arb_helper, self.bot_state.base_fee_next)
+
+    def select_non_overlapping(
+        self,
+        calculation_results: List[ArbitrageCalculationResult],
+    ) -> List[ArbitrageCalculationResult]:
+        """
+        Selects the results to execute: highest profit net of gas first, skipping any arb that
+        shares a pool with one already selected, see `ArbIndex.non_overlapping`. Results that
+        don't pay for their gas are dropped.
+
+        Args:
+            calculation_results (List[ArbitrageCalculationResult]): The calculation results.
+
+        Returns:
+            List[ArbitrageCalculationResult]: The selected results, highest net profit first.
+        """
+        all_arbs = self.bot_state.all_arbs
+        net_profits: Dict[str, int] = {}
+        results_by_arb_id: Dict[str, ArbitrageCalculationResult] = {}
+        for calc_result in calculation_results:
+            arb_details = all_arbs.get(calc_result.id)
+            if arb_details is None:
+                continue
+            net_profit = calc_result.profit_amount - self.gas_cost(arb_details.lp_cycle)
+            if net_profit >= 0 and net_profit > net_profits.get(calc_result.id, -1):
+                net_profits[calc_result.id] = net_profit
+                results_by_arb_id[calc_result.id] = calc_result
+
+        ranked_arb_ids = sorted(net_profits, key=net_profits.__getitem__, reverse=True)
+        return [
+            results_by_arb_id[arb_id]
+            for arb_id in self.bot_state.arb_index.non_overlapping(ranked_arb_ids)
+        ]
+
     async def process_onchain_arbs(
         self,
         arb_helpers: List[degenbot.UniswapLpCycle],
+        block_number: Optional[int] = None,
     ):
         """
         Processes on-chain arbitrage opportunities.
@@ -117,44 +289,33 @@ class ArbitrageService:
 
         Args:
             arb_helpers (List[degenbot.UniswapLpCycle]): A list of arbitrage opportunities to process.
+            block_number (Optional[int]): The block the pool states were updated at, if known.
 
         Returns:
             None
         """
         num_arbs = len(arb_helpers)
 
-        log.info(f"(process_onchain_arbs) Number of arbs: {num_arbs}")
+        log.info(f"(process_onchain_arbs) Number of arbs: {num_arbs} @ block {block_number}")
         
         # No arbs affected, quit
         if num_arbs == 0:
             return
         
-        calculation_futures = []
-        
-        for arb_helper in arb_helpers:
-            try:
-                future = await arb_helper.calculate_with_pool(
-                    executor=self.bot_state.executor,
-                )
-                calculation_futures.append(future)
-            except degenbot.exceptions.ArbitrageError as exc:
-                pass
-                #logger.info(f"(process_onchain_arbs) (bot.exceptions.ArbitrageError): {exc}")
-            except Exception as exc:
-                log.info(f"(process_onchain_arbs) Unexpected exception: {type(exc).__name__} - {exc}")
-        
-        
+        # Calculated in chunks in the process pool, only profitable results come back. They
+        # stream in most promising first, so a cut-off batch still has its best candidates.
         calculation_results: List[ArbitrageCalculationResult] = []
-        
-        for task in asyncio.as_completed(calculation_futures):
-            try:
-                result = await task
-                calculation_results.append(result)
-            except degenbot.exceptions.ArbitrageError as exc:
-                pass
-                #logger.info(f"(process_onchain_arbs) (bot.exceptions.ArbitrageError): {exc}")
-            except Exception as exc:  # Catch all exceptions
-                log.info(f"(process_onchain_arbs) Unexpected exception: {type(exc).__name__} - {exc}")
+        try:
+            async for results in self.batch_evaluator.evaluate_iter(arb_helpers):
+                calculation_results.extend(results)
+        except asyncio.CancelledError:
+            if calculation_results:
+                best_result = max(calculation_results, key=lambda calc_result: calc_result.profit_amount)
+                log.info(
+                    f"(process_onchain_arbs) Cut off @ block {block_number} with {len(calculation_results)} "
+                    f"results, best {best_result.id} (profit {best_result.profit_amount})"
+                )
+            raise
             
         # Show the calculation results
         '''
@@ -167,68 +328,18 @@ class ArbitrageService:
                 logger.info(f"pool_{i}_swap           : {swap_amount}")
         '''
         
-        # Sort the arb helpers by profit
-        all_profitable_calc_results = sorted(
-            [
-                calc_result
-                for calc_result in calculation_results
-                if calc_result.profit_amount >= 0
-            ],
-            key=lambda calc_result: calc_result.profit_amount,
-            reverse=True,
-        )
-        
-        all_profitable_arbs = [
-            arb_details.lp_cycle
-            for calc_result in all_profitable_calc_results
-            if (arb_details := self.bot_state.all_arbs.get(calc_result.id)) is not None
-        ]
-        
-        # Store results and arbitrage IDs for easy retrieval later
-        results_by_arb_id: Dict[str, ArbitrageCalculationResult] = dict()
-        for calc_result, arb in zip(
-            all_profitable_calc_results,
-            all_profitable_arbs,
-            strict=True,
-        ):
-            if TYPE_CHECKING:
-                assert arb is not None
-            results_by_arb_id[arb.id] = calc_result
-        
-        if not all_profitable_arbs:
+        # Most profitable net of gas first, without two arbs through the same pool
+        selected_results = self.select_non_overlapping(calculation_results)
+
+        if not selected_results:
             #logger.info(f"No profitable arbs")
             return
-        
-        arbs_without_overlap: Set[UniswapLpCycle] = set()
-        
-        while True:
-            most_profitable_arb = all_profitable_arbs.pop(0)
-            if TYPE_CHECKING:
-                assert most_profitable_arb is not None
-            arbs_without_overlap.add(most_profitable_arb)
-        
-            conflicting_arbs = [
-                arb_helper
-                for arb_helper in all_profitable_arbs
-                if set(most_profitable_arb.swap_pools)
-                & set(arb_helper.swap_pools)
-            ]
-        
-            # Drop conflicting arbs from working set
-            for arb in conflicting_arbs:
-                all_profitable_arbs.remove(arb)
-        
-            # Escape the loop if no arbs remain
-            if not all_profitable_arbs:
-                break
-        
+
         log.info(
-            f"Reduced {len(arb_helpers)} arbs to {len(arbs_without_overlap)}"
+            f"Reduced {len(arb_helpers)} arbs to {len(selected_results)}"
         )
         
-        for arb_helper in arbs_without_overlap:
-            arb_result = results_by_arb_id[arb_helper.id]
-            
+        for arb_result in selected_results:
             # Determine the bribe amount
             arb_details = self.bot_state.all_arbs.get(arb_result.id)
 
@@ -258,7 +369,6 @@ class ArbitrageService:
     ):
         all_arbs = self.app_state.all_arbs
         http_session = self.app_state.http_session
-        executor = self.app_state.executor
 
         transaction_hash = pending_transaction["hash"]
 
@@ -300,37 +410,10 @@ class ArbitrageService:
             ]
             """
 
-            calculation_futures = []
-
-            for arb_helper in arb_helpers:
-                try:
-                    future = await arb_helper.calculate_with_pool(
-                        executor=executor,
-                        override_state=override_state,
-                    )
-                    calculation_futures.append(future)
-                except degenbot.exceptions.ArbitrageError as exc:
-                    pass
-                    # logger.info(f"(process_backrun_arbs) (bot.exceptions.ArbitrageError): {exc}")
-                except Exception as exc:
-                    log.error(
-                        f"(process_backrun_arbs) Unexpected exception: {type(exc).__name__} - {exc}"
-                    )
-
-            calculation_results: List[ArbitrageCalculationResult] = []
-
-            for task in asyncio.as_completed(calculation_futures):
-                try:
-                    result = await task
-                    calculation_results.append(result)
-                except degenbot.exceptions.ArbitrageError as exc:
-                    log.error(
-                        f"(process_backrun_arbs) (bot.exceptions.ArbitrageError): {exc}"
-                    )
-                except Exception as exc:  # Catch all exceptions
-                    log.error(
-                        f"(process_backrun_arbs) Unexpected exception: {type(exc).__name__} - {exc}"
-                    )
+            calculation_results: List[ArbitrageCalculationResult] = await self.batch_evaluator.evaluate(
+                arb_helpers,
+                override_state=override_state,
+            )
 
             # logger.info(f"(process_backrun_arbs) {transaction_hash} calculation_results: {calculation_results}")
 
@@ -344,64 +427,16 @@ class ArbitrageService:
                 for i, swap_amount in enumerate(calc_result.swap_amounts, 1):
                     logger.info(f"pool_{i}_swap           : {swap_amount}")
             """
-            # Sort the arb helpers by profit
-            all_profitable_calc_results = sorted(
-                [
-                    calc_result
-                    for calc_result in calculation_results
-                    if calc_result.profit_amount >= 0
-                ],
-                key=lambda calc_result: calc_result.profit_amount,
-                reverse=True,
-            )
+            # Most profitable net of gas first, without two arbs through the same pool
+            selected_results = self.select_non_overlapping(calculation_results)
 
-            all_profitable_arbs = [
-                arb_details.lp_cycle
-                for calc_result in all_profitable_calc_results
-                if (arb_details := all_arbs.get(calc_result.id)) is not None
-            ]
-
-            # Store results and arbitrage IDs for easy retrieval later
-            results_by_arb_id: Dict[str, ArbitrageCalculationResult] = dict()
-            for calc_result, arb in zip(
-                all_profitable_calc_results,
-                all_profitable_arbs,
-                strict=True,
-            ):
-                if TYPE_CHECKING:
-                    assert arb is not None
-                results_by_arb_id[arb.id] = calc_result
-
-            if not all_profitable_arbs:
+            if not selected_results:
                 # logger.info(f"No profitable arbs for {transaction_hash}")
                 return
 
-            arbs_without_overlap: Set[UniswapLpCycle] = set()
-
-            while True:
-                most_profitable_arb = all_profitable_arbs.pop(0)
-                if TYPE_CHECKING:
-                    assert most_profitable_arb is not None
-                arbs_without_overlap.add(most_profitable_arb)
-
-                conflicting_arbs = [
-                    arb_helper
-                    for arb_helper in all_profitable_arbs
-                    if set(most_profitable_arb.swap_pools) & set(arb_helper.swap_pools)
-                ]
-
-                # Drop conflicting arbs from working set
-                for arb in conflicting_arbs:
-                    all_profitable_arbs.remove(arb)
-
-                # Escape the loop if no arbs remain
-                if not all_profitable_arbs:
-                    break
-
-            log.info(f"Reduced {len(arb_helpers)} arbs to {len(arbs_without_overlap)}")
+            log.info(f"Reduced {len(arb_helpers)} arbs to {len(selected_results)}")
 
-            for arb_helper in arbs_without_overlap:
-                arb_result = results_by_arb_id[arb_helper.id]
+            for arb_result in selected_results:
 
                 # Determine the bribe amount
                 arb_details = all_arbs.get(arb_result.id)
@@ -0,0 +1,359 @@
+import asyncio
+from concurrent.futures import Executor
+import degenbot
+import math
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import (
+    ArbitrageCalculationResult,
+    UniswapLpCycle,
+)
+
+from .calculation_cache import CalculationCache
+from .marginal_rate_filter import MarginalRateFilter
+from .shared_state import SharedPoolStateTable, calculate_shared_chunk
+from .v2_cycle_solver import V2CycleSolver
+from ...config.constants import (
+    BATCH_EVAL_MAX_CHUNK,
+    BATCH_EVAL_MIN_CHUNK,
+    BATCH_EVAL_TARGET_SECONDS,
+    V2_CLOSED_FORM_SOLVER,
+)
+from ...config.logging import logger
+
+log = logger(__name__)
+
+
+def calculate_chunk(
+    arb_helpers: List[UniswapLpCycle],
+    override_state=None,
+) -> Tuple[List[ArbitrageCalculationResult], List[Tuple[str, str]], List[Tuple[str, float]], float]:
+    """
+    Calculates a chunk of arbs in a worker process.
+
+    The chunk is pickled in one go, so a pool shared by several of its arbs is only sent once.
+
+    Args:
+        arb_helpers (List[UniswapLpCycle]): The arbs to calculate.
+        override_state: Pool state overrides, as for `UniswapLpCycle.calculate_with_pool`.
+
+    Returns:
+        Tuple[List[ArbitrageCalculationResult], List[Tuple[str, str]], List[Tuple[str, float]], float]:
+            The profitable results, the unexpected errors by arb id, the calculation time of
+            each arb and of the whole chunk.
+    """
+    start = time.perf_counter()
+    results: List[ArbitrageCalculationResult] = []
+    errors: List[Tuple[str, str]] = []
+    costs: List[Tuple[str, float]] = []
+
+    for arb_helper in arb_helpers:
+        arb_start = time.perf_counter()
+        try:
+            result = arb_helper._calculate(override_state)
+        except degenbot.exceptions.ArbitrageError:
+            continue
+        except Exception as exc:
+            errors.append((arb_helper.id, f"{type(exc).__name__} - {exc}"))
+            continue
+        finally:
+            costs.append((arb_helper.id, time.perf_counter() - arb_start))
+        if result.profit_amount >= 0:
+            results.append(result)
+
+    return results, errors, costs, time.perf_counter() - start
+
+
+class BatchEvaluator:
+    def __init__(
+        self,
+        executor: Executor,
+        workers: int,
+        shared_state: Optional[SharedPoolStateTable] = None,
+        all_arbs: Optional[Dict] = None,
+        cache: Optional[CalculationCache] = None,
+        min_profit: Optional[Callable[[UniswapLpCycle], int]] = None,
+    ):
+        """
+        Calculates arbs in the process pool in chunks instead of one task per arb, which saves
+        a pickle and IPC round trip per arb and sends each pool once per chunk.
+
+        The chunk size follows the measured calculation time per arb, so a chunk takes about
+        `BATCH_EVAL_TARGET_SECONDS` in a worker, but a batch is always spread over every worker.
+
+        Arbs whose marginal rate shows they can't be profitable, or can't make `min_profit`, are
+        dropped first, see `MarginalRateFilter`. Arbs made only of Uniswap V2 pools are solved in closed form in the main process by a
+        `V2CycleSolver` and never reach the process pool.
+
+        The remaining arbs are submitted in order of `ArbDetails.priority`, so the arbs that
+        were often profitable and are cheap to calculate are known first.
+
+        With a shared pool state table, arbs the workers already know are sent as ids only and
+        the workers read the pool states from the table.
+
+        With a calculation cache, arbs whose pools haven't changed since their last calculation
+        get their cached result and aren't calculated again.
+
+        Args:
+            executor (Executor): The process pool.
+            workers (int): The number of workers in the pool.
+            shared_state (Optional[SharedPoolStateTable]): The shared pool state table, if enabled.
+            all_arbs (Optional[Dict]): The arb catalog the workers inherit with the shared table.
+            cache (Optional[CalculationCache]): The calculation cache, if enabled.
+            min_profit (Optional[Callable[[UniswapLpCycle], int]]): The minimum profit of an arb,
+                e.g. its gas cost.
+        """
+        self.executor = executor
+        self.workers = workers
+        self.shared_state = shared_state
+        self.all_arbs = all_arbs
+        self.cache = cache
+        self.min_profit = min_profit
+        self.prefilter = MarginalRateFilter()
+        self.v2_solver: Optional[V2CycleSolver] = V2CycleSolver() if V2_CLOSED_FORM_SOLVER else None
+
+        self.seconds_per_arb: Optional[float] = None
+
+        # Counters, for logging and benchmarking
+        self.arbs: int = 0
+        self.chunks: int = 0
+
+    @property
+    def chunk_size(self) -> int:
+        if self.seconds_per_arb is None:
+            return BATCH_EVAL_MIN_CHUNK
+        chunk_size = int(BATCH_EVAL_TARGET_SECONDS / max(self.seconds_per_arb, 1e-9))
+        return max(BATCH_EVAL_MIN_CHUNK, min(BATCH_EVAL_MAX_CHUNK, chunk_size))
+
+    async def evaluate(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        override_state=None,
+    ) -> List[ArbitrageCalculationResult]:
+        """
+        Calculates the arbs and returns the profitable results.
+
+        Args:
+            arb_helpers (List[UniswapLpCycle]): The arbs to calculate.
+            override_state: Pool state overrides, as for `UniswapLpCycle.calculate_with_pool`.
+
+        Returns:
+            List[ArbitrageCalculationResult]: The results with a non-negative profit.
+        """
+        calculation_results: List[ArbitrageCalculationResult] = []
+        async for results in self.evaluate_iter(arb_helpers, override_state):
+            calculation_results.extend(results)
+        return calculation_results
+
+    async def evaluate_iter(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        override_state=None,
+    ) -> AsyncIterator[List[ArbitrageCalculationResult]]:
+        """
+        Calculates the arbs and yields the profitable results as they become available: cached
+        and closed-form results first, then each chunk as it completes. Chunks not yet started
+        are cancelled if the iteration is abandoned or cancelled.
+
+        Args:
+            arb_helpers (List[UniswapLpCycle]): The arbs to calculate.
+            override_state: Pool state overrides, as for `UniswapLpCycle.calculate_with_pool`.
+
+        Yields:
+            List[ArbitrageCalculationResult]: Results with a non-negative profit.
+        """
+        # Overridden states have no versions, those arbs are always calculated
+        if self.cache is None or override_state is not None:
+            async for _, results in self._evaluate_iter(arb_helpers, override_state):
+                if results:
+                    yield results
+            return
+
+        cached_results: List[ArbitrageCalculationResult] = []
+        state_keys: Dict[str, Tuple[int, ...]] = {}
+        pending: List[UniswapLpCycle] = []
+        for arb_helper in arb_helpers:
+            state_key = self.cache.state_key(arb_helper)
+            if state_key is not None:
+                hit, result = self.cache.get(arb_helper.id, state_key)
+                if hit:
+                    if result is not None:
+                        cached_results.append(result)
+                    continue
+                state_keys[arb_helper.id] = state_key
+            pending.append(arb_helper)
+
+        if len(pending) < len(arb_helpers):
+            log.info(
+                f"(BatchEvaluator) Calculation cache served {len(arb_helpers) - len(pending)} "
+                f"of {len(arb_helpers)} arbs ({self.cache.hits}/{self.cache.hits + self.cache.misses} "
+                f"since start)"
+            )
+        if cached_results:
+            yield cached_results
+        if not pending:
+            return
+
+        async for settled_ids, results in self._evaluate_iter(pending, override_state):
+            # Settled arbs without a result were dropped or not profitable, cached as None
+            results_by_id = {result.id: result for result in results}
+            for arb_id in settled_ids:
+                state_key = state_keys.get(arb_id)
+                if state_key is not None:
+                    self.cache.put(arb_id, state_key, results_by_id.get(arb_id))
+            if results:
+                yield results
+
+    async def _evaluate_iter(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        override_state,
+    ) -> AsyncIterator[Tuple[List[str], List[ArbitrageCalculationResult]]]:
+        # Yields the ids of the arbs settled by each step with its results. Arbs that failed
+        # unexpectedly are never settled, so they aren't cached.
+        candidates = self.prefilter.filter(arb_helpers, override_state, self.min_profit)
+        if len(candidates) < len(arb_helpers):
+            log.info(
+                f"(BatchEvaluator) Marginal rate pre-filter pruned {len(arb_helpers) - len(candidates)} "
+                f"of {len(arb_helpers)} arbs (threshold {self.prefilter.threshold:g}, "
+                f"{self.prefilter.pruned}/{self.prefilter.checked} since start)"
+            )
+
+        # Pruned arbs aren't settled, the minimum profit changes with the base fee
+        settled_ids: List[str] = []
+
+        ready: List[UniswapLpCycle] = []
+        for arb_helper in candidates:
+            try:
+                self._pre_calculation_check(arb_helper, override_state)
+            except degenbot.exceptions.ArbitrageError:
+                settled_ids.append(arb_helper.id)
+                continue
+            except Exception as exc:
+                log.info(f"(BatchEvaluator) Unexpected exception: {type(exc).__name__} - {exc}")
+                continue
+            ready.append(arb_helper)
+
+        calculation_results: List[ArbitrageCalculationResult] = []
+
+        if self.v2_solver is not None:
+            v2_arbs = [arb_helper for arb_helper in ready if self.v2_solver.supports(arb_helper)]
+            if v2_arbs:
+                ready = [arb_helper for arb_helper in ready if not self.v2_solver.supports(arb_helper)]
+                calculation_results.extend(self.v2_solver.solve(v2_arbs, override_state))
+                settled_ids.extend(arb_helper.id for arb_helper in v2_arbs)
+                self._record_results(calculation_results)
+
+        yield settled_ids, calculation_results
+
+        if not ready:
+            return
+
+        # The executor runs chunks in submission order, so the most promising arbs go first
+        default_cost = self.seconds_per_arb or BATCH_EVAL_TARGET_SECONDS
+        ready.sort(key=lambda arb_helper: self._priority(arb_helper, default_cost), reverse=True)
+
+        chunk_size = max(1, min(self.chunk_size, math.ceil(len(ready) / self.workers)))
+
+        # Overridden states are not in the shared table, those arbs are always sent whole
+        frozen_arb_ids: Set[str] = set()
+        if override_state is None and self._shared_state_ready():
+            frozen_arb_ids = self.shared_state.frozen_arb_ids
+
+        loop = asyncio.get_running_loop()
+        chunk_ids: Dict[asyncio.Future, List[str]] = {}
+        for i in range(0, len(ready), chunk_size):
+            chunk = ready[i : i + chunk_size]
+            arb_ids = [arb_helper.id for arb_helper in chunk]
+            if all(arb_id in frozen_arb_ids for arb_id in arb_ids):
+                chunk_future = loop.run_in_executor(
+                    self.executor,
+                    calculate_shared_chunk,
+                    arb_ids,
+                    [arb_helper.max_input for arb_helper in chunk],
+                )
+            else:
+                chunk_future = loop.run_in_executor(self.executor, calculate_chunk, chunk, override_state)
+            chunk_ids[chunk_future] = arb_ids
+
+        try:
+            while chunk_ids:
+                done, _ = await asyncio.wait(chunk_ids, return_when=asyncio.FIRST_COMPLETED)
+                for chunk_future in done:
+                    arb_ids = chunk_ids.pop(chunk_future)
+                    try:
+                        results, errors, costs, elapsed = chunk_future.result()
+                    except Exception as exc:
+                        log.info(f"(BatchEvaluator) Chunk failed: {type(exc).__name__} - {exc}")
+                        continue
+
+                    failed_ids = set()
+                    for arb_id, error in errors:
+                        log.info(f"(BatchEvaluator) Unexpected exception: {arb_id}: {error}")
+                        failed_ids.add(arb_id)
+
+                    self._record_chunk(costs, elapsed)
+                    self._record_results(results)
+
+                    yield [arb_id for arb_id in arb_ids if arb_id not in failed_ids], results
+        finally:
+            for chunk_future in chunk_ids:
+                chunk_future.cancel()
+
+    def _shared_state_ready(self) -> bool:
+        if self.shared_state is None:
+            return False
+        if self.shared_state.frozen:
+            return True
+
+        if getattr(self.executor, "_processes", None):
+            log.warning("(BatchEvaluator) Executor already started, not using the shared pool state table")
+            self.shared_state = None
+            return False
+
+        self.shared_state.freeze(self.all_arbs or {})
+        return True
+
+    def _pre_calculation_check(self, arb_helper: UniswapLpCycle, override_state):
+        # The checks `calculate_with_pool` runs before sending an arb to the executor
+        if any(
+            pool._sparse_bitmap for pool in arb_helper.swap_pools if isinstance(pool, degenbot.V3LiquidityPool)
+        ):
+            raise ValueError(
+                f"Cannot calculate {arb_helper} with executor. One or more V3 pools has a sparse bitmap."
+            )
+        arb_helper._pre_calculation_check(override_state)
+
+    def _priority(self, arb_helper: UniswapLpCycle, default_cost: float) -> float:
+        arb_details = self.all_arbs.get(arb_helper.id) if self.all_arbs is not None else None
+        if arb_details is None:
+            return 0.0
+        return arb_details.priority(default_cost)
+
+    def _record_results(self, results: List[ArbitrageCalculationResult]):
+        if self.all_arbs is None:
+            return
+        for result in results:
+            arb_details = self.all_arbs.get(result.id)
+            if arb_details is not None:
+                arb_details.record_result(result.profit_amount)
+
+    def _record_chunk(self, costs: List[Tuple[str, float]], elapsed: float):
+        calculated = len(costs)
+        self.arbs += calculated
+        self.chunks += 1
+        if not calculated:
+            return
+
+        if self.all_arbs is not None:
+            for arb_id, seconds in costs:
+                arb_details = self.all_arbs.get(arb_id)
+                if arb_details is not None:
+                    arb_details.record_evaluation(seconds)
+
+        seconds_per_arb = elapsed / calculated
+        if self.seconds_per_arb is None:
+            self.seconds_per_arb = seconds_per_arb
+        else:
+            self.seconds_per_arb += 0.2 * (seconds_per_arb - self.seconds_per_arb)
@@ -1,5 +1,5 @@
 import asyncio
-import ujson
+from ...config import helpers
 from ...config.logging import logger
 
 log = logger(__name__)
@@ -10,23 +10,23 @@ class BootstrapService:
         self.redis_client = bot_state.redis_client
 
     async def start(self):
-        pubsub = self.redis_client.pubsub()
-        await pubsub.subscribe("cream_app_state")
-        
         log.info("BootstrapService started, waiting for messages...")
         
         try:
-            async for message in pubsub.listen():
-                if message["type"] == "message":
-                    app_state = ujson.loads(message["data"].decode('utf-8'))
+            async for payloads in helpers.iter_redis_messages(
+                self.redis_client,
+                "cream_app_state",
+                consumer_group=f"cream_bots_{self.bot_state.chain_name}_{self.bot_state.bot_name}",
+                consumer=self.bot_state.bot_name,
+            ):
+                for message_data in payloads:
+                    app_state = helpers.json_loads(message_data)
                     #log.info(f"Received app_state update: {app_state}")
                     self.update_bot_state(app_state)
         except asyncio.CancelledError:
             log.info("BootstrapService cancelled")
         except Exception as exc:
             log.error(f"Error in BootstrapService: {exc}")
-        finally:
-            await pubsub.unsubscribe("cream_app_state")
 
     def update_bot_state(self, app_state):
         relevant_keys = [
@@ -45,12 +45,20 @@ class BootstrapService:
             "watching_events",
         ]
 
+        previous_newest_block = self.bot_state.newest_block
+
         for key in relevant_keys:
             if key in app_state:
                 #old_value = getattr(self.bot_state, key, None)
                 setattr(self.bot_state, key, app_state[key])
                 #log.info(f"Updated {key}: {old_value} -> {app_state[key]}")
 
+        # A new block header means the events for the previous block have all been published
+        pools_to_process = getattr(self.bot_state, "pools_to_process", None)
+        newest_block = self.bot_state.newest_block
+        if pools_to_process is not None and newest_block is not None and newest_block != previous_newest_block:
+            pools_to_process.seal_block(newest_block - 1)
+
         #log.info(f"Updated bot state. Newest block: {self.bot_state.newest_block}")
         #log.info(f"Updated bot state. Live: {self.bot_state.live}")
         #log.info(f"Updated bot state. First event: {self.bot_state.first_event}")
\ No newline at end of file
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import (
+    ArbitrageCalculationResult,
+    UniswapLpCycle,
+)
+
+from ...config.constants import CALCULATION_CACHE_SIZE
+
+
+class CalculationCache:
+    def __init__(self, pool_routes: Dict, max_size: int = CALCULATION_CACHE_SIZE):
+        """
+        The latest calculation result of each arb, with the state versions of its pools at the
+        time. An arb whose pools have the same versions again (a Sync with identical reserves, an
+        update that raised `ExternalUpdateError`, an arb shared by several dirty pools) gets the
+        cached result instead of being calculated again. Unprofitable outcomes are cached too, as
+        None.
+
+        State versions come from the `PoolRoute` of each pool and only change when an update
+        actually changed the pool state. Entries are evicted least recently used first.
+
+        Args:
+            pool_routes (Dict): The `pool_routes` of the bot state.
+            max_size (int): The maximum number of arbs kept.
+        """
+        self.pool_routes = pool_routes
+        self.max_size = max_size
+
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, ...], Optional[ArbitrageCalculationResult]]]" = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def state_key(self, arb_helper: UniswapLpCycle) -> Optional[Tuple[int, ...]]:
+        """
+        Returns:
+            Optional[Tuple[int, ...]]: The state versions of the arb's pools, None if one of
+                them has no route.
+        """
+        try:
+            return tuple(
+                self.pool_routes[pool.address].state_version for pool in arb_helper.swap_pools
+            )
+        except KeyError:
+            return None
+
+    def get(self, arb_id: str, state_key: Tuple[int, ...]) -> Tuple[bool, Optional[ArbitrageCalculationResult]]:
+        """
+        Returns:
+            Tuple[bool, Optional[ArbitrageCalculationResult]]: Whether there is a result for these
+                pool states, and the result (None if the arb was not profitable).
+        """
+        entry = self._entries.get(arb_id)
+        if entry is None or entry[0] != state_key:
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(arb_id)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, arb_id: str, state_key: Tuple[int, ...], result: Optional[ArbitrageCalculationResult]):
+        self._entries[arb_id] = (state_key, result)
+        self._entries.move_to_end(arb_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, arb_id: str):
+        self._entries.pop(arb_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,266 @@
+import asyncio
+import degenbot
+import gc
+import importlib.metadata
+import os
+from pathlib import Path
+import pickle
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from degenbot.dex.uniswap import TICKLENS_ADDRESSES
+from degenbot.uniswap.v3_tick_lens import TickLens
+
+from ...config.constants import CHECKPOINT_INTERVAL
+from ...config.logging import logger
+
+log = logger(__name__)
+
+CHECKPOINT_MAGIC = b"CRMCKPT1"
+# magic, header length
+CHECKPOINT_PREAMBLE = struct.Struct(">8sI")
+# Bumped whenever the pickled body or the revival of the helpers changes
+CHECKPOINT_FORMAT_VERSION = 2
+
+
+try:
+    DEGENBOT_VERSION: Optional[str] = importlib.metadata.version("degenbot")
+except importlib.metadata.PackageNotFoundError:
+    DEGENBOT_VERSION = None
+
+
+class CheckpointService:
+    def __init__(self, bot_state, checkpoint_path: Union[str, Path]):
+        """
+        Writes the loaded pools and arbs to a binary checkpoint, so a restart can restore them
+        instead of rebuilding them from the pool and arb files and the node.
+
+        A checkpoint is taken together with a liquidity snapshot flush and only moved in place
+        after the snapshot is written, so both describe the same block. The V3 liquidity events
+        fetched for the snapshot on startup then cover exactly the blocks the checkpoint is
+        missing. It is serialized in a forked child, so event processing doesn't wait for the
+        pickle.
+
+        The helpers are pickled as degenbot defines them and revived by restoring what they
+        drop. A checkpoint is ignored unless it was written by the same degenbot version and
+        checkpoint format, from the same pool and arb files, at the block of the snapshot.
+
+        The file is a small pickled header (block, chain id, source fingerprint, checkpoint
+        format and degenbot version), then the zlib-compressed pickle of the pool helpers, the
+        arbs with their statistics and the V3 tick spacings.
+
+        Args:
+            bot_state: The shared bot state.
+            checkpoint_path (Union[str, Path]): The `{chain}_checkpoint.bin` file.
+        """
+        self.bot_state = bot_state
+        self.checkpoint_path = Path(checkpoint_path)
+
+        self.fingerprint: Optional[Tuple] = None
+        self.interval: float = CHECKPOINT_INTERVAL
+        self.written_block: Optional[int] = None
+
+        # The block of the snapshot file, before the snapshot is brought up to date
+        self.snapshot_block: Optional[int] = (
+            bot_state.snapshot.newest_block if bot_state.snapshot is not None else None
+        )
+
+        self._next_checkpoint: float = time.monotonic()
+        self._started_at: float = 0.0
+
+        log.info(f"CheckpointService initialized with app instance at {id(self.bot_state)}")
+
+    @staticmethod
+    def source_fingerprint(paths: Iterable[Union[str, Path]]) -> Tuple:
+        """
+        Args:
+            paths (Iterable[Union[str, Path]]): The pool and arb files the state is built from.
+
+        Returns:
+            Tuple: The name, size and modification time of each file.
+        """
+        fingerprint = []
+        for path in paths:
+            stat = os.stat(path)
+            fingerprint.append((Path(path).name, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+
+    def due(self) -> bool:
+        return self.fingerprint is not None and time.monotonic() >= self._next_checkpoint
+
+    def fork(self, block_number: int) -> Optional[int]:
+        """
+        Starts writing the state as of `block_number` to a temporary file, in a forked child
+        that pickles and compresses a copy-on-write view of the pools and arbs. The event loop
+        only pays for the fork. Must only be called once every event up to `block_number` is
+        applied, and without awaiting, so the state is consistent.
+
+        Args:
+            block_number (int): The newest complete block.
+
+        Returns:
+            Optional[int]: The pid of the child, to pass to `finish`, or None if it could not
+                be started.
+        """
+        self._next_checkpoint = time.monotonic() + self.interval
+
+        start = time.perf_counter()
+        try:
+            pid = os.fork()
+        except OSError as exc:
+            log.error(f"Could not fork to write checkpoint: {exc}")
+            return None
+
+        if pid == 0:
+            # The child must not log or touch the event loop, other threads may hold their locks
+            exit_code = 1
+            try:
+                gc.disable()
+                self._write_file(self._temp_path, self._serialize(), block_number)
+                exit_code = 0
+            finally:
+                os._exit(exit_code)
+
+        self._started_at = start
+        log.info(
+            f"Forked checkpoint writer @ block {block_number} (pid {pid}) "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return pid
+
+    async def finish(self, pid: int, block_number: int, keep: bool = True):
+        """
+        Waits for the child started by `fork` and moves its file in place.
+
+        Args:
+            pid (int): The pid returned by `fork`.
+            block_number (int): The block it was started at.
+            keep (bool): Whether to keep the checkpoint, False if the snapshot of the same
+                block could not be written.
+        """
+        _, status = await asyncio.to_thread(os.waitpid, pid, 0)
+        exit_code = os.waitstatus_to_exitcode(status)
+
+        if exit_code != 0 or not keep:
+            if exit_code != 0:
+                log.error(f"Checkpoint writer for block {block_number} exited with {exit_code}")
+            self._temp_path.unlink(missing_ok=True)
+            return
+
+        os.replace(self._temp_path, self.checkpoint_path)
+        self.written_block = block_number
+        log.info(
+            f"Wrote checkpoint @ block {block_number} to {self.checkpoint_path.name} "
+            f"({self.checkpoint_path.stat().st_size / 2**20:.1f} MiB) "
+            f"in {time.perf_counter() - self._started_at:.2f}s"
+        )
+
+    @property
+    def _temp_path(self) -> Path:
+        return self.checkpoint_path.with_suffix(".bin.tmp")
+
+    def _serialize(self) -> bytes:
+        snapshot_service = self.bot_state.snapshot_service
+        return pickle.dumps(
+            {
+                "arbs": self.bot_state.all_arbs,
+                "pools": {
+                    pool_address: pool_route.pool_helper
+                    for pool_address, pool_route in self.bot_state.pool_routes.items()
+                },
+                "tick_spacings": snapshot_service.tick_spacings if snapshot_service is not None else {},
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    def _write_file(self, path: Path, body: bytes, block_number: int):
+        header = pickle.dumps(
+            {
+                "block": block_number,
+                "chain_id": self.bot_state.chain_id,
+                "degenbot_version": DEGENBOT_VERSION,
+                "fingerprint": self.fingerprint,
+                "format_version": CHECKPOINT_FORMAT_VERSION,
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        with open(path, "wb") as file:
+            file.write(CHECKPOINT_PREAMBLE.pack(CHECKPOINT_MAGIC, len(header)))
+            file.write(header)
+            file.write(zlib.compress(body, 1))
+
+    def load(self, first_event: int) -> Optional[Dict[str, Any]]:
+        """
+        Reads the checkpoint if it can be caught up from the liquidity snapshot.
+
+        Args:
+            first_event (int): The block of the first event, the pools are caught up to the
+                block before it.
+
+        Returns:
+            Optional[Dict[str, Any]]: The checkpoint, with `block` and the restored `arbs`,
+                `pools` and `tick_spacings`, or None if there is no usable one.
+        """
+        if not self.checkpoint_path.exists():
+            return None
+
+        start = time.perf_counter()
+        try:
+            with open(self.checkpoint_path, "rb") as file:
+                magic, header_length = CHECKPOINT_PREAMBLE.unpack(file.read(CHECKPOINT_PREAMBLE.size))
+                if magic != CHECKPOINT_MAGIC:
+                    log.warning(f"Ignoring checkpoint {self.checkpoint_path.name}: unknown format")
+                    return None
+                header = pickle.loads(file.read(header_length))
+
+                reason = self._stale_reason(header, first_event)
+                if reason is not None:
+                    log.info(f"Ignoring checkpoint @ block {header['block']}: {reason}")
+                    return None
+
+                checkpoint = pickle.loads(zlib.decompress(file.read()))
+        except Exception as exc:
+            log.error(f"Could not read checkpoint {self.checkpoint_path.name}: {exc}")
+            return None
+
+        for pool_helper in checkpoint["pools"].values():
+            self._revive_pool(pool_helper)
+        for arb_details in checkpoint["arbs"].values():
+            arb_helper = arb_details.lp_cycle
+            arb_helper._subscribers = set()
+            for pool_helper in arb_helper.swap_pools:
+                pool_helper.subscribe(arb_helper)
+
+        checkpoint["block"] = header["block"]
+        log.info(
+            f"Read checkpoint @ block {header['block']}: {len(checkpoint['pools'])} pools, "
+            f"{len(checkpoint['arbs'])} arbs in {time.perf_counter() - start:.2f}s"
+        )
+        return checkpoint
+
+    def _stale_reason(self, header: Dict, first_event: int) -> Optional[str]:
+        if header.get("format_version") != CHECKPOINT_FORMAT_VERSION:
+            return f"checkpoint format {header.get('format_version')}, expected {CHECKPOINT_FORMAT_VERSION}"
+        if header.get("degenbot_version") is None or header["degenbot_version"] != DEGENBOT_VERSION:
+            return f"written by degenbot {header.get('degenbot_version')}, running {DEGENBOT_VERSION}"
+        if header["chain_id"] != self.bot_state.chain_id:
+            return "different chain"
+        if header["fingerprint"] != self.fingerprint:
+            return "pool or arb files changed"
+        if header["block"] != self.snapshot_block:
+            return f"liquidity snapshot is @ block {self.snapshot_block}"
+        if header["block"] >= first_event:
+            return f"first event is @ block {first_event}"
+        return None
+
+    def _revive_pool(self, pool_helper: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]):
+        # Restore what the helpers drop when they are pickled
+        pool_helper._state_lock = threading.Lock()
+        pool_helper._subscribers = set()
+        if isinstance(pool_helper, degenbot.V3LiquidityPool):
+            pool_helper.lens = TickLens(address=TICKLENS_ADDRESSES[self.bot_state.chain_id][pool_helper.factory])
+        else:
+            pool_helper._pool_state_archive = {pool_helper.update_block: pool_helper.state}
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Coroutine, Dict, Iterable, List, Optional
+
+from ...config.constants import EVALUATION_MAX_IN_FLIGHT
+from ...config.logging import logger
+
+log = logger(__name__)
+
+
+class _Evaluation:
+    def __init__(self, block_number: Optional[int], pool_addresses: List[str]):
+        self.block_number = block_number
+        self.pool_addresses = pool_addresses
+        self.task: Optional[asyncio.Task] = None
+        self.deadline_handle: Optional[asyncio.TimerHandle] = None
+        self.stale_reason: Optional[str] = None
+
+
+class EvaluationScheduler:
+    def __init__(self, bot_state, max_in_flight: int = EVALUATION_MAX_IN_FLIGHT):
+        """
+        Runs arb evaluations tagged with the block of the pool updates they were triggered by.
+
+        An evaluation is only useful until the next block: its deadline is the estimated time
+        of the block after its own, from `newest_block_timestamp` and `average_blocktime` as
+        reported through `BootstrapService`. Evaluations past their deadline are dropped, or
+        cancelled if already running, which also cancels their chunks still waiting in the
+        executor.
+
+        Evaluations still running when an evaluation for a newer block is submitted are
+        cancelled too. Their pools go back to `pools_to_process`, so the arbs through pools that
+        were not updated again are evaluated with the newer batch.
+
+        At most `max_in_flight` evaluations run at once, `submit` waits for a slot. Meanwhile the
+        pool queue keeps coalescing updates into the next batch.
+
+        Args:
+            bot_state: The bot state.
+            max_in_flight (int): The maximum number of evaluations running at once.
+        """
+        self.bot_state = bot_state
+        self.max_in_flight = max_in_flight
+
+        self._in_flight: Dict[asyncio.Task, _Evaluation] = {}
+
+        # Counters
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.dropped_superseded: int = 0
+        self.dropped_deadline: int = 0
+        self.pools_requeued: int = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def deadline(self, block_number: Optional[int]) -> Optional[float]:
+        """
+        Args:
+            block_number (Optional[int]): The block of the pool updates.
+
+        Returns:
+            Optional[float]: The estimated unix time of the next block, None if unknown.
+        """
+        average_blocktime = self.bot_state.average_blocktime
+        newest_block = self.bot_state.newest_block
+        newest_block_timestamp = self.bot_state.newest_block_timestamp
+        if None in (block_number, average_blocktime, newest_block, newest_block_timestamp):
+            return None
+        return newest_block_timestamp + (block_number - newest_block + 1) * average_blocktime
+
+    async def submit(
+        self,
+        block_number: Optional[int],
+        pool_addresses: Iterable[str],
+        evaluation: Coroutine,
+    ) -> Optional[asyncio.Task]:
+        """
+        Schedules an evaluation, after cancelling the evaluations of older blocks.
+
+        Args:
+            block_number (Optional[int]): The block of the pool updates, if known.
+            pool_addresses (Iterable[str]): The pools the evaluation was triggered by.
+            evaluation (Coroutine): The evaluation to run.
+
+        Returns:
+            Optional[asyncio.Task]: The task running the evaluation, None if it was already
+                past its deadline.
+        """
+        entry = _Evaluation(block_number, list(pool_addresses))
+
+        if block_number is not None:
+            self._supersede(block_number)
+
+        while len(self._in_flight) >= self.max_in_flight:
+            await asyncio.wait(list(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+
+        deadline = self.deadline(block_number)
+        if deadline is not None and time.time() >= deadline:
+            evaluation.close()
+            self.dropped_deadline += 1
+            return None
+
+        task = asyncio.create_task(evaluation)
+        entry.task = task
+        if deadline is not None:
+            entry.deadline_handle = asyncio.get_running_loop().call_later(
+                deadline - time.time(), self._cancel, entry, "deadline"
+            )
+        task.add_done_callback(self._done)
+
+        self._in_flight[task] = entry
+        self.submitted += 1
+        return task
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "in_flight": len(self._in_flight),
+            "dropped_superseded": self.dropped_superseded,
+            "dropped_deadline": self.dropped_deadline,
+            "pools_requeued": self.pools_requeued,
+        }
+
+    def _supersede(self, block_number: int):
+        for entry in list(self._in_flight.values()):
+            if entry.block_number is not None and entry.block_number < block_number:
+                self._cancel(entry, "superseded")
+
+    def _cancel(self, entry: _Evaluation, reason: str):
+        if entry.task is None or entry.task.done() or entry.stale_reason is not None:
+            return
+        entry.stale_reason = reason
+        entry.task.cancel()
+
+    def _done(self, task: asyncio.Task):
+        entry = self._in_flight.pop(task)
+        if entry.deadline_handle is not None:
+            entry.deadline_handle.cancel()
+
+        if not task.cancelled():
+            self.completed += 1
+            if task.exception() is not None:
+                log.error(f"(EvaluationScheduler) Evaluation failed: {task.exception()}")
+            return
+        if entry.stale_reason is None:
+            # cancelled from outside, e.g. on shutdown
+            return
+
+        if entry.stale_reason == "superseded":
+            self.dropped_superseded += 1
+            self._requeue(entry)
+        else:
+            self.dropped_deadline += 1
+        log.info(
+            f"(EvaluationScheduler) Cancelled stale evaluation for block {entry.block_number} "
+            f"({entry.stale_reason})"
+        )
+
+    def _requeue(self, entry: _Evaluation):
+        pools_to_process = self.bot_state.pools_to_process
+        for pool_address in entry.pool_addresses:
+            pools_to_process.put_nowait(pool_address, entry.block_number)
+        self.pools_requeued += len(entry.pool_addresses)
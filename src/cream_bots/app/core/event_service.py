@@ -1,18 +1,18 @@
 import ape
 import asyncio
 import degenbot
-import eth_abi
 import eth_account
-from eth_utils.address import to_checksum_address
+import time
 from hexbytes import HexBytes
 from typing import TYPE_CHECKING, Union, Optional
-import ujson
 
 from .anvil_service import AnvilService
+from .pool_service import PoolRoute, PoolService
 
 from ...config.constants import *
-from ...config import helpers
+from ...config import decoders, helpers
 from ...config.logging import logger
+from ...config.schemas import LogEvent, decode_log_event
 
 log = logger(__name__)
 
@@ -27,6 +27,7 @@ class EventService:
         self.redis_client = self.bot_state.redis_client
         self.w3 = self.bot_state.w3
         self.anvil_service = AnvilService(bot_state)
+        self.pool_service = PoolService(bot_state)
 
         log.info(f"EventService initialized with app instance at {id(self.bot_state)}")
 
@@ -34,65 +35,83 @@ class EventService:
         """
         Process events from the "cream_events" channel.
 
-        This method subscribes to the "cream_events" channel using Redis pubsub and processes the received events.
+        This method reads the "cream_events" channel, through Redis pubsub or, when `REDIS_STREAMS` is enabled,
+        through a consumer group on the "cream_events" stream, and processes the received events.
         The events are processed based on their type (burn, mint, sync, swap) and the corresponding helper methods are called.
         The processed events are then added to the `pools_to_process` queue for further processing.
 
         Returns:
             None
         """
-        pubsub = self.redis_client.pubsub()
-        await pubsub.subscribe("cream_events")
-
         async def check_queue_size():
             while True:
-                log.info(f"Current pools_to_process queue size: {self.bot_state.pools_to_process.qsize()}")
+                queue_stats = self.bot_state.pools_to_process.stats()
+                log.info(
+                    f"pools_to_process: depth {queue_stats['depth']}, "
+                    f"updates {queue_stats['puts']}, "
+                    f"coalesced {queue_stats['coalesced']} ({queue_stats['coalesce_ratio']:.1%}), "
+                    f"batches {queue_stats['batches']} (avg {queue_stats['avg_batch_size']:.1f} pools)"
+                )
                 await asyncio.sleep(60)  # Check every minute
 
         asyncio.create_task(check_queue_size())
 
-        def process_burn_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
-
-            v3_pool_helper: Optional[
-                Union[degenbot.V3LiquidityPool, degenbot.LiquidityPool]
-            ] = None
-
-            for pool_manager in self.bot_state.pool_managers.values():
-                try:
-                    v3_pool_helper = pool_manager.get_pool(
-                        pool_address=event_address,
-                        silent=not VERBOSE_EVENT_UPDATES,
-                        # WIP: use previous block state to avoid double-counting liquidity events
-                        state_block=event_block - 1,
-                    )
-                except degenbot.exceptions.ManagerError:
-                    continue
-                else:
-                    break
-
-            if v3_pool_helper is None:
-                # ignore events for unknown pools
+        snapshot_service = self.bot_state.snapshot_service
+        shared_state = self.bot_state.shared_state
+        max_input_bounds = self.bot_state.max_input_bounds
+
+        def get_pool_route(pool_address: str, block_number: int) -> Optional[PoolRoute]:
+            pool_route = self.bot_state.pool_routes.get(pool_address)
+            lazy_catalog = self.bot_state.lazy_catalog
+            if pool_route is None and lazy_catalog is not None:
+                # First event for a pool of the catalog, its helper is built at the block
+                # before so the event applies on top
+                if lazy_catalog.materialize_pool(pool_address, block_number - 1) is not None:
+                    pool_route = self.bot_state.pool_routes.get(pool_address)
+            return pool_route
+
+        def refresh_max_input(pool_helper):
+            # Arbs starting with the pool get a new max input if its liquidity moved materially
+            max_input = max_input_bounds.refresh(pool_helper)
+            if max_input is None:
                 return
+            all_arbs = self.bot_state.all_arbs
+            for arb_id in self.bot_state.arb_index.get(pool_helper.address):
+                arb_details = all_arbs.get(arb_id)
+                if arb_details is not None and arb_details.lp_cycle.swap_pools[0] is pool_helper:
+                    arb_details.lp_cycle.max_input = max_input
+
+        def update_liquidity_snapshot(
+            pool_address: str,
+            block_number: int,
+            liquidity: int,
+            tick_lower: int,
+            tick_upper: int,
+            pool_helper: Optional[degenbot.V3LiquidityPool] = None,
+        ):
+            if snapshot_service is not None:
+                snapshot_service.record_liquidity_change(
+                    pool_address, block_number, liquidity, tick_lower, tick_upper, pool_helper
+                )
+            elif pool_helper is not None:
+                self.bot_state.snapshot.update_snapshot(
+                    pool=pool_address,
+                    tick_bitmap=pool_helper.tick_bitmap,
+                    tick_data=pool_helper.tick_data,
+                )
 
-            if TYPE_CHECKING:
-                assert isinstance(v3_pool_helper, degenbot.V3LiquidityPool)
+        def process_burn_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
             try:
-                _, _, lower, upper = message["params"]["result"]["topics"]
-                event_tick_lower = eth_abi.decode(["int24"], bytes.fromhex(lower[2:]))[
-                    0
-                ]
-                event_tick_upper = eth_abi.decode(["int24"], bytes.fromhex(upper[2:]))[
-                    0
-                ]
-                event_liquidity, _, _ = eth_abi.decode(
-                    ["uint128", "uint256", "uint256"],
-                    bytes.fromhex(event_data[2:]),
-                )
-            except KeyError:
+                _, _, lower, upper = event.topics
+                event_tick_lower = decoders.decode_int_topic(lower)
+                event_tick_upper = decoders.decode_int_topic(upper)
+                event_liquidity, _, _ = decoders.decode_v3_burn(event_data)
+            except ValueError:
+                # wrong number of topics or truncated data
                 return
             else:
                 if event_liquidity == 0:
@@ -100,6 +119,21 @@ class EventService:
 
                 event_liquidity *= -1
 
+                pool_route = get_pool_route(event_address, event_block)
+                if pool_route is None:
+                    # no helper for this pool, only its liquidity snapshot needs the update
+                    update_liquidity_snapshot(
+                        event_address, event_block, event_liquidity, event_tick_lower, event_tick_upper
+                    )
+                    return
+
+                v3_pool_helper = pool_route.pool_helper
+
+                if TYPE_CHECKING:
+                    assert isinstance(v3_pool_helper, degenbot.V3LiquidityPool)
+
+                # liquidity changes always change the tick data
+                pool_route.bump_state_version()
                 try:
                     v3_pool_helper.external_update(
                         update=degenbot.UniswapV3PoolExternalUpdate(
@@ -111,81 +145,61 @@ class EventService:
                             ),
                         ),
                     )
-                    self.bot_state.snapshot.update_snapshot(
-                        pool=event_address,
-                        tick_bitmap=v3_pool_helper.tick_bitmap,
-                        tick_data=v3_pool_helper.tick_data,
+                    update_liquidity_snapshot(
+                        event_address,
+                        event_block,
+                        event_liquidity,
+                        event_tick_lower,
+                        event_tick_upper,
+                        v3_pool_helper,
                     )
+                    if shared_state is not None:
+                        shared_state.update_v3(v3_pool_helper, event_block, ticks_changed=True)
+                    refresh_max_input(v3_pool_helper)
                 # WIP: sys.exit to kill the bot on a failed assert
                 # looking to fix "assert self.liquidity >= 0" throwing on some Burn events
                 except AssertionError:
-                    log.exception(f"(process_burn_event) AssertionError: {message}")
+                    log.exception(f"(process_burn_event) AssertionError: {event}")
 
-                    # Directly remove the pool from the pool manager
-                    for pool_manager in self.bot_state.pool_managers.values():
-                        try:
-                            # Attempt to delete using the pool helper object
-                            pool_manager.__delitem__(v3_pool_helper.address)
-                            log.info(
-                                f"Removed pool {v3_pool_helper.address} from its pool manager due to AssertionError."
-                            )
-                            break  # Exit the loop after successfully removing the pool
-                        except KeyError:
-                            # This exception will occur if the pool was not found in the current manager
-                            continue  # Try the next pool manager if the pool was not found in this one
+                    # Remove the pool and the arbs that route through it
+                    self.pool_service.remove_pool(v3_pool_helper.address)
                 except:
-                    log.exception(f"(process_burn_event): {message}")
+                    log.exception(f"(process_burn_event): {event}")
                 else:
-                    asyncio.create_task(
-                        self.bot_state.pools_to_process.put(event_address)
-                    )
+                    self.bot_state.pools_to_process.put_nowait(event_address, event_block)
 
-        def process_mint_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
-
-            v3_pool_helper: Optional[
-                Union[degenbot.V3LiquidityPool, degenbot.LiquidityPool]
-            ] = None
-            for pool_manager in self.bot_state.pool_managers.values():
-                try:
-                    v3_pool_helper = pool_manager.get_pool(
-                        pool_address=event_address,
-                        silent=not VERBOSE_EVENT_UPDATES,
-                        # WIP: use previous block state to avoid double-counting liquidity events
-                        state_block=event_block - 1,
-                    )
-                except degenbot.exceptions.ManagerError:
-                    continue
-                else:
-                    break
-
-            if v3_pool_helper is None:
-                # ignore events for unknown pools
-                return
-
-            if TYPE_CHECKING:
-                assert isinstance(v3_pool_helper, degenbot.V3LiquidityPool)
+        def process_mint_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
             try:
-                _, _, lower, upper = message["params"]["result"]["topics"]
-                event_tick_lower = eth_abi.decode(["int24"], bytes.fromhex(lower[2:]))[
-                    0
-                ]
-                event_tick_upper = eth_abi.decode(["int24"], bytes.fromhex(upper[2:]))[
-                    0
-                ]
-                _, event_liquidity, _, _ = eth_abi.decode(
-                    ["address", "uint128", "uint256", "uint256"],
-                    bytes.fromhex(event_data[2:]),
-                )
-            except KeyError:
+                _, _, lower, upper = event.topics
+                event_tick_lower = decoders.decode_int_topic(lower)
+                event_tick_upper = decoders.decode_int_topic(upper)
+                event_liquidity, _, _ = decoders.decode_v3_mint(event_data)
+            except ValueError:
+                # wrong number of topics or truncated data
                 return
             else:
                 if event_liquidity == 0:
                     return
 
+                pool_route = get_pool_route(event_address, event_block)
+                if pool_route is None:
+                    # no helper for this pool, only its liquidity snapshot needs the update
+                    update_liquidity_snapshot(
+                        event_address, event_block, event_liquidity, event_tick_lower, event_tick_upper
+                    )
+                    return
+
+                v3_pool_helper = pool_route.pool_helper
+
+                if TYPE_CHECKING:
+                    assert isinstance(v3_pool_helper, degenbot.V3LiquidityPool)
+
+                # liquidity changes always change the tick data
+                pool_route.bump_state_version()
                 try:
                     v3_pool_helper.external_update(
                         update=degenbot.UniswapV3PoolExternalUpdate(
@@ -197,69 +211,60 @@ class EventService:
                             ),
                         ),
                     )
-                    self.bot_state.snapshot.update_snapshot(
-                        pool=event_address,
-                        tick_bitmap=v3_pool_helper.tick_bitmap,
-                        tick_data=v3_pool_helper.tick_data,
+                    update_liquidity_snapshot(
+                        event_address,
+                        event_block,
+                        event_liquidity,
+                        event_tick_lower,
+                        event_tick_upper,
+                        v3_pool_helper,
                     )
+                    if shared_state is not None:
+                        shared_state.update_v3(v3_pool_helper, event_block, ticks_changed=True)
+                    refresh_max_input(v3_pool_helper)
 
                 except Exception as exc:
                     log.exception(f"(process_mint_event): {exc}")
                 else:
-                    asyncio.create_task(
-                        self.bot_state.pools_to_process.put(event_address)
-                    )
+                    self.bot_state.pools_to_process.put_nowait(event_address, event_block)
 
-        def process_sync_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
+        def process_sync_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
-            event_reserves = eth_abi.decode(
-                ["uint112", "uint112"],
-                bytes.fromhex(event_data[2:]),
-            )
+            event_reserves = decoders.decode_sync(event_data)
 
-            v2_pool_helper = None
-            for pool_manager in self.bot_state.pool_managers.values():
-                try:
-                    v2_pool_helper = pool_manager.get_pool(
-                        pool_address=event_address,
-                        silent=not VERBOSE_EVENT_UPDATES,
-                    )
-                except degenbot.exceptions.ManagerError:
-                    continue
-                else:
-                    break
-
-            if v2_pool_helper is None:
+            pool_route = get_pool_route(event_address, event_block)
+            if pool_route is None:
                 # ignore events for unknown pools
                 return
 
+            v2_pool_helper = pool_route.pool_helper
+
             reserves0, reserves1 = event_reserves
 
             if TYPE_CHECKING:
                 assert isinstance(v2_pool_helper, degenbot.LiquidityPool)
 
             try:
-                v2_pool_helper.update_reserves(
-                    external_token0_reserves=reserves0,
-                    external_token1_reserves=reserves1,
-                    silent=not VERBOSE_EVENT_UPDATES,
-                    print_reserves=False,
-                    update_block=event_block,
-                )
+                if pool_route.update_v2_reserves(
+                    reserves0, reserves1, event_block, silent=not VERBOSE_EVENT_UPDATES
+                ):
+                    refresh_max_input(v2_pool_helper)
+                if shared_state is not None:
+                    shared_state.update_v2(v2_pool_helper, event_block)
             except degenbot.exceptions.ExternalUpdateError:
                 pass
             except Exception as exc:
                 log.exception(f"(process_sync_event): {exc}")
             else:
-                asyncio.create_task(self.bot_state.pools_to_process.put(event_address))
+                self.bot_state.pools_to_process.put_nowait(event_address, event_block)
 
-        def process_swap_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
+        def process_swap_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
             (
                 _,
@@ -267,67 +272,44 @@ class EventService:
                 event_sqrt_price_x96,
                 event_liquidity,
                 event_tick,
-            ) = eth_abi.decode(
-                [
-                    "int256",
-                    "int256",
-                    "uint160",
-                    "uint128",
-                    "int24",
-                ],
-                bytes.fromhex(event_data[2:]),
-            )
-
-            v3_pool_helper: Optional[
-                Union[degenbot.V3LiquidityPool, degenbot.LiquidityPool]
-            ] = None
-            for pool_manager in self.bot_state.pool_managers.values():
-                try:
-                    v3_pool_helper = pool_manager.get_pool(
-                        pool_address=event_address,
-                        silent=not VERBOSE_EVENT_UPDATES,
-                        state_block=event_block - 1,
-                    )
-                except degenbot.exceptions.ManagerError:
-                    continue
-                else:
-                    break
+            ) = decoders.decode_v3_swap(event_data)
 
-            if v3_pool_helper is None:
+            pool_route = get_pool_route(event_address, event_block)
+            if pool_route is None:
                 # ignore events for unknown pools
                 return
 
+            v3_pool_helper = pool_route.pool_helper
+
             if TYPE_CHECKING:
                 assert isinstance(v3_pool_helper, degenbot.V3LiquidityPool)
 
             try:
-                v3_pool_helper.external_update(
+                if v3_pool_helper.external_update(
                     update=degenbot.UniswapV3PoolExternalUpdate(
                         block_number=event_block,
                         liquidity=event_liquidity,
                         tick=event_tick,
                         sqrt_price_x96=event_sqrt_price_x96,
                     ),
-                )
+                ):
+                    pool_route.bump_state_version()
+                    refresh_max_input(v3_pool_helper)
+                if shared_state is not None:
+                    shared_state.update_v3(v3_pool_helper, event_block)
             except degenbot.exceptions.ExternalUpdateError:
                 pass
             except Exception as exc:
                 log.exception(f"(process_swap_event): {exc}")
             else:
-                asyncio.create_task(self.bot_state.pools_to_process.put(event_address))
+                self.bot_state.pools_to_process.put_nowait(event_address, event_block)
 
-        def process_new_v2_pool_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
+        def process_new_v2_pool_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
-            pool_address, _ = eth_abi.decode(
-                [
-                    "address",
-                    "uint256",
-                ],
-                bytes.fromhex(event_data[2:]),
-            )
+            pool_address, _ = decoders.decode_pair_created(event_data)
 
             # Determine if Pool Manager for this factory address already exists
             if event_address not in self.bot_state.pool_managers:
@@ -354,19 +336,20 @@ class EventService:
                 log.error(f"(process_new_v2_pool_event) (get_pool) {exc}")
                 return
             else:
+                self.bot_state.pool_routes[new_pool_helper.address] = PoolRoute(
+                    pool_manager=pool_manager,
+                    pool_helper=new_pool_helper,
+                )
                 log.info(
                     f"Created new V2 pool at block {event_block}: {new_pool_helper} @ {pool_address}"
                 )
 
-        def process_new_v3_pool_event(message: dict):
-            event_address = to_checksum_address(message["params"]["result"]["address"])
-            event_block = int(message["params"]["result"]["blockNumber"], 16)
-            event_data = message["params"]["result"]["data"]
+        def process_new_v3_pool_event(event: LogEvent):
+            event_address = event.address
+            event_block = event.block_number
+            event_data = event.data
 
-            _, pool_address = eth_abi.decode(
-                types=("int24", "address"),
-                data=bytes.fromhex(event_data[2:]),
-            )
+            _, pool_address = decoders.decode_pool_created(event_data)
 
             # Determine if Pool Manager for this factory address already exists
             if event_address not in self.bot_state.pool_managers:
@@ -393,6 +376,10 @@ class EventService:
                 log.error(f"(process_new_v3_pool_event) (get_pool) {exc}")
                 return
             else:
+                self.bot_state.pool_routes[new_pool_helper.address] = PoolRoute(
+                    pool_manager=pool_manager,
+                    pool_helper=new_pool_helper,
+                )
                 log.info(
                     f"Created new V3 pool at block {event_block}: {new_pool_helper} @ {pool_address}"
                 )
@@ -434,45 +421,69 @@ class EventService:
             },
         }
 
-        # Get events from the redis queue
+        # Get events from redis, either pub/sub or a stream consumer group
         while True:
             try:
-                async for message in pubsub.listen():
-                    if message["type"] == "message":
-                        
+                async for payloads in helpers.iter_redis_messages(
+                    self.redis_client,
+                    "cream_events",
+                    consumer_group=f"cream_bots_{self.bot_state.chain_name}_{self.bot_state.bot_name}",
+                    consumer=self.bot_state.bot_name,
+                ):
+                    for message_data in payloads:
+                        metrics = self.bot_state.metrics
+                        if metrics is not None:
+                            started = time.perf_counter()
+
+                        try:
+                            event = decode_log_event(message_data)
+                        except Exception as exc:
+                            log.error(f"(process_uniswap_events) Could not decode event: {exc}")
+                            continue
+
+                        if metrics is not None:
+                            decoded = time.perf_counter()
+                            metrics.record("event_decode", decoded - started)
+
                         # set the first event
                         if self.bot_state.first_event is None:
-                            self.bot_state.first_event = message["params"]["result"]["blockNumber"]
+                            self.bot_state.first_event = event.block_number
                             log.info(f"First event: {self.bot_state.first_event}")
 
-                        message_data = message.get("data")
-                        if message_data:
-                            event = ujson.loads(message_data.decode("utf-8"))
-                            event_block = event["params"]["result"]["blockNumber"]
-                            topic0: str = event["params"]["result"]["topics"][0]
+                        if snapshot_service is not None:
+                            snapshot_service.mark_block(event.block_number)
 
+                        try:
+                            topic0: str = event.topics[0]
+                            process_func = _EVENTS[topic0]["process_func"]
+                        except KeyError:
+                            # handle the KeyError if topic0 is not in process_func_map
+                            continue
+                        except IndexError:
+                            # ignore anonymous events (no topic0)
+                            continue
+                        except Exception as exc:
+                            log.exception(
+                                f"(process_uniswap_events) Unexpected error: {exc}"
+                            )
+                            continue
+                        else:
+                            if TYPE_CHECKING:
+                                assert callable(process_func)
                             try:
-                                process_func = _EVENTS[topic0]["process_func"]
-                            except KeyError:
-                                # handle the KeyError if topic0 is not in process_func_map
-                                continue
-                            except IndexError:
-                                # ignore anonymous events (no topic0)
-                                continue
+                                process_func(event)
+                                if metrics is not None:
+                                    metrics.record("event_handler", time.perf_counter() - decoded)
                             except Exception as exc:
+                                # don't let a single bad event stall (or endlessly replay) the batch
                                 log.exception(
-                                    f"(process_uniswap_events) Unexpected error: {exc}"
+                                    f"(process_uniswap_events) Error processing event: {exc}"
                                 )
                                 continue
-                            else:
-                                if TYPE_CHECKING:
-                                    assert callable(process_func)
-                                process_func(event)
-                                if VERBOSE_EVENT_PROCESSING:
-                                    log.info(
-                                        f"processed {_EVENTS[topic0]['name']} event @ {int(event_block,16)}"
-                                    )
-                                continue
+                            if VERBOSE_EVENT_PROCESSING:
+                                log.info(
+                                    f"processed {_EVENTS[topic0]['name']} event @ {event.block_number}"
+                                )
 
             except asyncio.CancelledError:
                 return
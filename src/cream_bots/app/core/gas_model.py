@@ -0,0 +1,59 @@
+import degenbot
+from typing import Dict, Optional, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import UniswapLpCycle
+
+from ...config.constants import (
+    GAS_ESTIMATE_BASE,
+    GAS_ESTIMATE_V2_SWAP,
+    GAS_ESTIMATE_V3_SWAP,
+)
+from ...config.logging import logger
+
+log = logger(__name__)
+
+
+class GasModel:
+    def __init__(self):
+        """
+        Estimates the gas used by an arb from the shape of its path, the number of V2 and V3
+        pools, with the `GAS_ESTIMATE_*` constants. The estimates are fixed, so they should be
+        kept at or below the gas the arb transactions actually use: an overestimate prunes
+        profitable arbs.
+        """
+        self._shapes: Dict[str, Tuple[int, int]] = {}
+
+    def shape(self, arb_helper: UniswapLpCycle) -> Tuple[int, int]:
+        """
+        Returns:
+            Tuple[int, int]: The number of V2 pools and of V3 pools in the arb path.
+        """
+        try:
+            return self._shapes[arb_helper.id]
+        except KeyError:
+            pass
+
+        v3_pools = sum(isinstance(pool, degenbot.V3LiquidityPool) for pool in arb_helper.swap_pools)
+        shape = self._shapes[arb_helper.id] = (len(arb_helper.swap_pools) - v3_pools, v3_pools)
+        return shape
+
+    def estimate(self, arb_helper: UniswapLpCycle) -> int:
+        """
+        Returns:
+            int: The estimated gas used by the arb transaction.
+        """
+        v2_pools, v3_pools = self.shape(arb_helper)
+        return GAS_ESTIMATE_BASE + v2_pools * GAS_ESTIMATE_V2_SWAP + v3_pools * GAS_ESTIMATE_V3_SWAP
+
+    def cost(self, arb_helper: UniswapLpCycle, base_fee: Optional[int]) -> int:
+        """
+        Args:
+            arb_helper (UniswapLpCycle): The arb.
+            base_fee (Optional[int]): The base fee of the target block, e.g. `base_fee_next`.
+
+        Returns:
+            int: The estimated gas cost in wei, 0 if the base fee is unknown.
+        """
+        if not base_fee:
+            return 0
+        return self.estimate(arb_helper) * base_fee
@@ -0,0 +1,196 @@
+import degenbot
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import web3
+
+from .arbitrage_service import ArbDetails
+from .pool_loader import PoolStateLoader, PrefetchedCallProvider
+from ...config.logging import logger
+
+log = logger(__name__)
+
+PoolHelper = Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]
+
+
+class LazyCatalog:
+    def __init__(
+        self,
+        bot_state,
+        build_pool_helper: Callable[[str, Dict, int], Optional[PoolHelper]],
+        remove_pool: Callable[[str], None],
+        input_token: degenbot.Erc20Token,
+    ):
+        """
+        The pools and arbs of the catalog that have no helper yet, with `LAZY_POOL_HELPERS`.
+
+        Pools are only known by their entry in the LP files and arbs by their path, both are
+        registered in the arb index. A pool helper is built when the first event for the pool
+        arrives, at the block before the event so the event applies on top, or when an arb
+        through it is first evaluated. An arb helper is built when the arb is first affected by
+        a pool update.
+
+        A pool without a helper had no event since the bot started, so its state at any block
+        the bot has completely processed is its current state. Pools needed by arbs are built
+        at the block before the newest one, with their state prefetched in batches.
+
+        Args:
+            bot_state: The shared bot state.
+            build_pool_helper (Callable[[str, Dict, int], Optional[PoolHelper]]): Builds and
+                routes the helper of a pool, from its address, LP file entry and state block.
+            remove_pool (Callable[[str], None]): Removes a pool and its arbs from the bot.
+            input_token (degenbot.Erc20Token): The input token of the arbs.
+        """
+        self.bot_state = bot_state
+        self.build_pool_helper = build_pool_helper
+        self.remove_pool = remove_pool
+        self.input_token = input_token
+
+        self.arb_paths: Dict[str, Tuple[str, ...]] = {}
+        self.pool_data: Dict[str, Dict] = {}
+
+        # Counters
+        self.arbs_built: int = 0
+        self.pools_built: int = 0
+        self.pools_failed: int = 0
+
+    def add_pool(self, pool_address: str, pool_data: Dict):
+        self.pool_data[pool_address] = pool_data
+
+    def add_arb(self, arb_id: str, path: Tuple[str, ...]):
+        self.arb_paths[arb_id] = path
+        self.bot_state.arb_index.add(arb_id, path)
+
+    def materialize_pool(self, pool_address: str, state_block: int) -> Optional[PoolHelper]:
+        """
+        Returns the helper of a pool, building it at `state_block` if it has none yet.
+
+        Args:
+            pool_address (str): The address of the pool.
+            state_block (int): The block to build the helper at.
+
+        Returns:
+            Optional[PoolHelper]: The helper, None if the pool is not in the catalog or its
+                helper could not be built. The arbs through such a pool are dropped.
+        """
+        pool_route = self.bot_state.pool_routes.get(pool_address)
+        if pool_route is not None:
+            return pool_route.pool_helper
+
+        pool_data = self.pool_data.pop(pool_address, None)
+        if pool_data is None:
+            return None
+
+        pool_helper = self.build_pool_helper(pool_address, pool_data, state_block)
+        if pool_helper is None:
+            self.pools_failed += 1
+            self.remove_pool(pool_address)
+            return None
+
+        self.pools_built += 1
+        return pool_helper
+
+    async def materialize_arbs(self, arb_ids: Iterable[str]) -> List[ArbDetails]:
+        """
+        Returns the arbs, building the helpers of those that have none yet and of the pools
+        they need.
+
+        Args:
+            arb_ids (Iterable[str]): The ids of the arbs.
+
+        Returns:
+            List[ArbDetails]: The arbs that have a helper.
+        """
+        all_arbs = self.bot_state.all_arbs
+        arb_ids = list(arb_ids)
+
+        missing_pools = {
+            pool_address: self.pool_data[pool_address]
+            for arb_id in arb_ids
+            if arb_id not in all_arbs and arb_id in self.arb_paths
+            for pool_address in self.arb_paths[arb_id]
+            if pool_address in self.pool_data
+        }
+        if missing_pools:
+            await self._build_pools(missing_pools)
+
+        arbs = []
+        for arb_id in arb_ids:
+            arb_details = all_arbs.get(arb_id)
+            if arb_details is None:
+                arb_details = self._build_arb(arb_id)
+            if arb_details is not None:
+                arbs.append(arb_details)
+        return arbs
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "arbs_built": self.arbs_built,
+            "arbs_pending": len(self.arb_paths),
+            "pools_built": self.pools_built,
+            "pools_failed": self.pools_failed,
+            "pools_pending": len(self.pool_data),
+        }
+
+    def _state_block(self) -> int:
+        # Every event before the newest block has been processed
+        newest_block = self.bot_state.pools_to_process.newest_block
+        if newest_block is None:
+            return self.bot_state.first_event - 1
+        return max(newest_block - 1, self.bot_state.first_event - 1)
+
+    async def _build_pools(self, pool_data: Dict[str, Dict]):
+        start = time.perf_counter()
+        state_block = self._state_block()
+
+        loader = PoolStateLoader(self.bot_state.http_session, self.bot_state.http_uri)
+        try:
+            calls = await loader.fetch_pools(pool_data, state_block)
+        except Exception as exc:
+            log.error(f"(LazyCatalog) Could not prefetch pool state: {exc}")
+            calls = {}
+
+        # Pools with an event during the prefetch were built by it, the others are unchanged
+        provider = PrefetchedCallProvider(
+            calls,
+            state_block,
+            self.bot_state.chain_id,
+            self.bot_state.w3.provider,
+        )
+        degenbot.set_web3(web3.Web3(provider))
+        try:
+            for pool_address in pool_data:
+                self.materialize_pool(pool_address, state_block)
+        finally:
+            degenbot.set_web3(self.bot_state.w3)
+
+        log.info(
+            f"(LazyCatalog) Built {len(pool_data)} pool helpers @ block {state_block} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def _build_arb(self, arb_id: str) -> Optional[ArbDetails]:
+        path = self.arb_paths.pop(arb_id, None)
+        if path is None:
+            return None
+
+        swap_pools = []
+        for pool_address in path:
+            pool_route = self.bot_state.pool_routes.get(pool_address)
+            if pool_route is None:
+                self.bot_state.arb_index.remove(arb_id)
+                return None
+            swap_pools.append(pool_route.pool_helper)
+
+        arb_details = ArbDetails(
+            lp_cycle=degenbot.UniswapLpCycle(
+                input_token=self.input_token,
+                swap_pools=swap_pools,
+                max_input=self.bot_state.max_input_bounds.for_pool(swap_pools[0], self.input_token),
+                id=arb_id,
+            ),
+            status="load",
+        )
+        self.bot_state.all_arbs[arb_id] = arb_details
+        self.arbs_built += 1
+        return arb_details
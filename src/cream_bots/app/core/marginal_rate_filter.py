@@ -0,0 +1,177 @@
+import degenbot
+import math
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import UniswapLpCycle
+
+from ...config.constants import MARGINAL_RATE_THRESHOLD
+from ...config.logging import logger
+
+log = logger(__name__)
+
+_LOG_Q96 = 96 * math.log(2)
+
+
+def swap_directions(arb_helper: UniswapLpCycle) -> Tuple[bool, ...]:
+    """
+    Follows the input token through the pools of an arb.
+
+    Args:
+        arb_helper (UniswapLpCycle): The arb.
+
+    Returns:
+        Tuple[bool, ...]: Whether each pool is swapped token0 -> token1.
+    """
+    zero_for_ones: List[bool] = []
+    token_in = arb_helper.input_token
+    for pool in arb_helper.swap_pools:
+        zero_for_one = token_in == pool.token0
+        zero_for_ones.append(zero_for_one)
+        token_in = pool.token1 if zero_for_one else pool.token0
+    return tuple(zero_for_ones)
+
+
+class MarginalRateFilter:
+    def __init__(self, threshold: float = MARGINAL_RATE_THRESHOLD):
+        """
+        Drops arbs that can't be profitable before they are calculated.
+
+        The marginal rate of an arb, the product of the pool exchange rates net of fees for an
+        infinitesimal input, is an upper bound of its return per unit of input. Arbs with a
+        rate at or below `threshold` are dropped. Rates are computed once per pool and direction
+        in log space, then summed for every arb in one NumPy gather.
+
+        The profit of an arb is at most `(rate - 1) * max_input`, so with a minimum profit, e.g.
+        the gas cost, arbs whose rate can't cover it with their max input are dropped too.
+
+        Arbs through pools other than Uniswap V2 and V3 are always kept.
+
+        Args:
+            threshold (float): The minimum marginal rate.
+        """
+        self.threshold = threshold
+        self._log_threshold = math.log(threshold)
+
+        # Swap directions by arb id, None for arbs with unsupported pools
+        self._paths: Dict[str, Optional[Tuple[bool, ...]]] = {}
+
+        # Counters, to tune the threshold
+        self.checked: int = 0
+        self.pruned: int = 0
+
+    def filter(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        override_state=None,
+        min_profit: Optional[Callable[[UniswapLpCycle], int]] = None,
+    ) -> List[UniswapLpCycle]:
+        """
+        Args:
+            arb_helpers (List[UniswapLpCycle]): The arbs to check.
+            override_state: Pool state overrides, as for `UniswapLpCycle.calculate_with_pool`.
+            min_profit (Optional[Callable[[UniswapLpCycle], int]]): The minimum profit of an arb,
+                in its input token.
+
+        Returns:
+            List[UniswapLpCycle]: The arbs that may be profitable.
+        """
+        pool_indexes: Dict[str, int] = {}
+        pools: List = []
+        rows: List[List[int]] = []
+        log_thresholds: List[float] = []
+        checked_arbs: List[UniswapLpCycle] = []
+        kept_arbs: List[UniswapLpCycle] = []
+
+        for arb_helper in arb_helpers:
+            path = self._path(arb_helper)
+            if path is None:
+                kept_arbs.append(arb_helper)
+                continue
+
+            row = []
+            for pool, zero_for_one in zip(arb_helper.swap_pools, path):
+                pool_index = pool_indexes.get(pool.address)
+                if pool_index is None:
+                    pool_index = pool_indexes[pool.address] = len(pools)
+                    pools.append(pool)
+                row.append(2 * pool_index + (0 if zero_for_one else 1))
+            rows.append(row)
+            checked_arbs.append(arb_helper)
+            if min_profit is not None:
+                log_thresholds.append(
+                    max(self._log_threshold, math.log1p(min_profit(arb_helper) / arb_helper.max_input))
+                )
+
+        if not rows:
+            return kept_arbs
+
+        overrides = {
+            pool.address: getattr(state, "final_state", state)
+            for pool, state in override_state or ()
+        }
+        log_rates = self._log_rates(pools, overrides)
+
+        # Shorter paths are padded with the last entry, a log rate of 0
+        index = np.full((len(rows), max(len(row) for row in rows)), len(log_rates) - 1)
+        for i, row in enumerate(rows):
+            index[i, : len(row)] = row
+
+        with np.errstate(invalid="ignore"):
+            profitable = log_rates[index].sum(axis=1) > (
+                np.array(log_thresholds) if min_profit is not None else self._log_threshold
+            )
+
+        kept_arbs.extend(
+            arb_helper for arb_helper, keep in zip(checked_arbs, profitable.tolist()) if keep
+        )
+
+        self.checked += len(checked_arbs)
+        self.pruned += len(arb_helpers) - len(kept_arbs)
+
+        return kept_arbs
+
+    def _log_rates(self, pools: List, overrides: Dict) -> np.ndarray:
+        # log(amount out / amount in) for each pool, 0 -> 1 then 1 -> 0, plus a trailing 0
+        log_out_0 = np.empty(len(pools))
+        log_in_0 = np.empty(len(pools))
+        log_fees = np.empty((len(pools), 2))
+        is_v3 = np.zeros(len(pools), dtype=bool)
+
+        for i, pool in enumerate(pools):
+            state = overrides.get(pool.address) or pool
+            if isinstance(pool, degenbot.V3LiquidityPool):
+                # price = (sqrtPriceX96 / 2**96) ** 2, the log of sqrtPriceX96 is doubled below
+                is_v3[i] = True
+                log_out_0[i] = math.log(state.sqrt_price_x96) if state.sqrt_price_x96 else -np.inf
+                log_in_0[i] = _LOG_Q96
+                log_fees[i] = math.log1p(-pool.fee / 1_000_000)
+            else:
+                log_out_0[i] = math.log(state.reserves_token1) if state.reserves_token1 else -np.inf
+                log_in_0[i] = math.log(state.reserves_token0) if state.reserves_token0 else -np.inf
+                log_fees[i, 0] = math.log1p(-pool.fee_token0.numerator / pool.fee_token0.denominator)
+                log_fees[i, 1] = math.log1p(-pool.fee_token1.numerator / pool.fee_token1.denominator)
+
+        with np.errstate(invalid="ignore"):
+            log_prices = np.where(is_v3, 2.0, 1.0) * (log_out_0 - log_in_0)
+
+        log_rates = np.zeros(2 * len(pools) + 1)
+        log_rates[0:-1:2] = log_prices + log_fees[:, 0]
+        log_rates[1:-1:2] = -log_prices + log_fees[:, 1]
+        return log_rates
+
+    def _path(self, arb_helper: UniswapLpCycle) -> Optional[Tuple[bool, ...]]:
+        try:
+            return self._paths[arb_helper.id]
+        except KeyError:
+            pass
+
+        path = None
+        if all(
+            type(pool) is degenbot.LiquidityPool or isinstance(pool, degenbot.V3LiquidityPool)
+            for pool in arb_helper.swap_pools
+        ):
+            path = swap_directions(arb_helper)
+
+        self._paths[arb_helper.id] = path
+        return path
@@ -0,0 +1,123 @@
+import degenbot
+from typing import Dict, Optional, Tuple, Union
+
+from ...config.constants import (
+    MAX_INPUT,
+    MAX_INPUT_LIQUIDITY_MULTIPLE,
+    MAX_INPUT_REFRESH_RATIO,
+)
+
+Q96 = 2**96
+
+
+class MaxInputBounds:
+    def __init__(
+        self,
+        liquidity_multiple: float = MAX_INPUT_LIQUIDITY_MULTIPLE,
+        refresh_ratio: float = MAX_INPUT_REFRESH_RATIO,
+    ):
+        """
+        Upper bounds for the input of arbs, from the liquidity of their first pool, the one the
+        input token is swapped into.
+
+        The optimizer searches between 1 and `max_input`, so a bound close to the optimum needs
+        fewer iterations than the global `MAX_INPUT`. For a V2 pool, the optimal input of a cycle
+        is at most `reserve_in * (sqrt(rate) - 1) / (1 - fee)` where rate is the marginal rate of
+        the cycle, so a multiple of the input token reserve is safe for any realistic rate. V3
+        pools use the virtual reserve of the current range, which is a rougher estimate when the
+        swap crosses ticks. Bounds are capped at `MAX_INPUT`.
+
+        A pool's bound is only refreshed when it moved by more than `refresh_ratio` from the bound
+        in use, so small updates don't touch the arbs.
+
+        Args:
+            liquidity_multiple (float): The bound, as a multiple of the input token liquidity.
+            refresh_ratio (float): The relative change of a bound that is applied to the arbs.
+        """
+        self.liquidity_multiple = liquidity_multiple
+        self.refresh_ratio = refresh_ratio
+
+        # Input token and bound in use for each first pool
+        self._bounds: Dict[str, Tuple[degenbot.Erc20Token, int]] = {}
+
+        # Counters
+        self.refreshes: int = 0
+
+    def for_pool(
+        self,
+        pool: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool],
+        input_token: degenbot.Erc20Token,
+    ) -> int:
+        """
+        Returns the bound for arbs starting with `pool`, and remembers it for `refresh`.
+
+        Args:
+            pool (Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]): The first pool.
+            input_token (degenbot.Erc20Token): The input token of the arbs.
+
+        Returns:
+            int: The max input.
+        """
+        cached = self._bounds.get(pool.address)
+        if cached is not None and cached[0] == input_token:
+            return cached[1]
+
+        bound = self.bound(pool, input_token)
+        self._bounds[pool.address] = (input_token, bound)
+        return bound
+
+    def refresh(self, pool: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]) -> Optional[int]:
+        """
+        Recomputes the bound of a first pool after its state changed.
+
+        Args:
+            pool (Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]): The updated pool.
+
+        Returns:
+            Optional[int]: The new bound if it changed materially and must be applied to the
+                arbs starting with the pool, None otherwise.
+        """
+        cached = self._bounds.get(pool.address)
+        if cached is None:
+            return None
+
+        input_token, current_bound = cached
+        bound = self.bound(pool, input_token)
+        if current_bound / self.refresh_ratio <= bound <= current_bound * self.refresh_ratio:
+            return None
+
+        self._bounds[pool.address] = (input_token, bound)
+        self.refreshes += 1
+        return bound
+
+    def remove(self, pool_address: str):
+        self._bounds.pop(pool_address, None)
+
+    def bound(
+        self,
+        pool: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool],
+        input_token: degenbot.Erc20Token,
+    ) -> int:
+        """
+        Args:
+            pool (Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]): The first pool.
+            input_token (degenbot.Erc20Token): The input token of the arbs.
+
+        Returns:
+            int: The max input, `MAX_INPUT` if the pool liquidity is unknown.
+        """
+        is_token0 = input_token == pool.token0
+
+        if isinstance(pool, degenbot.V3LiquidityPool):
+            if not pool.liquidity or not pool.sqrt_price_x96:
+                return MAX_INPUT
+            if is_token0:
+                liquidity = pool.liquidity * Q96 // pool.sqrt_price_x96
+            else:
+                liquidity = pool.liquidity * pool.sqrt_price_x96 // Q96
+        else:
+            liquidity = pool.reserves_token0 if is_token0 else pool.reserves_token1
+
+        if liquidity <= 0:
+            return MAX_INPUT
+        return max(1, min(MAX_INPUT, int(self.liquidity_multiple * liquidity)))
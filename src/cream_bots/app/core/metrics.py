@@ -0,0 +1,67 @@
+from collections import defaultdict
+import time
+from typing import Awaitable, Dict, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class StageMetrics:
+    def __init__(self):
+        """
+        Latency samples per processing stage, plus a queue depth time series.
+
+        Only collected when a `StageMetrics` is attached to the bot state (the replay harness
+        does this), so the services skip all of it in normal operation.
+        """
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.queue_depths: List[Tuple[float, int, int]] = []
+        self.in_flight: int = 0
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def count(self, stage: str) -> int:
+        return len(self.samples.get(stage, ()))
+
+    async def timed(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """
+        Awaits `awaitable` and records how long it took under `stage`.
+        """
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(stage, time.perf_counter() - start)
+            self.in_flight -= 1
+
+    def sample_queue_depth(self, timestamp: float, pool_queue_depth: int, event_backlog: int):
+        self.queue_depths.append((timestamp, pool_queue_depth, event_backlog))
+
+    def percentiles(self, stage: str, points: Iterable[float] = (50, 90, 99)) -> Dict[str, float]:
+        """
+        Nearest-rank percentiles of a stage's latencies, in seconds.
+
+        Args:
+            stage (str): The stage name.
+            points (Iterable[float]): The percentiles to compute.
+
+        Returns:
+            Dict[str, float]: `p<point>` for each point, plus `max`.
+        """
+        samples = sorted(self.samples.get(stage, ()))
+        if not samples:
+            return {}
+
+        result = {
+            f"p{point:g}": samples[min(len(samples) - 1, max(0, round(point / 100 * len(samples)) - 1))]
+            for point in points
+        }
+        result["max"] = samples[-1]
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {"count": len(samples), **self.percentiles(stage)}
+            for stage, samples in self.samples.items()
+        }
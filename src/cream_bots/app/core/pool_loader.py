@@ -0,0 +1,244 @@
+import asyncio
+from aiohttp import ClientSession
+import degenbot
+from eth_abi import decode, encode
+from eth_utils.address import to_checksum_address
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from web3.providers.base import BaseProvider
+
+from ...config.constants import (
+    MULTICALL3_ADDRESS,
+    POOL_LOADER_BATCH_SIZE,
+    POOL_LOADER_CONCURRENCY,
+)
+from ...config.logging import logger
+
+log = logger(__name__)
+
+# aggregate3((address,bool,bytes)[])
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")
+
+GET_RESERVES = bytes.fromhex("0902f1ac")  # getReserves()
+LIQUIDITY = bytes.fromhex("1a686502")  # liquidity()
+SLOT0 = bytes.fromhex("3850c7bd")  # slot0()
+TOKEN0 = bytes.fromhex("0dfe1681")  # token0()
+TOKEN1 = bytes.fromhex("d21220a7")  # token1()
+
+# The calls the degenbot helpers make when they are built
+ERC20_CALLS = (
+    bytes.fromhex("06fdde03"),  # name()
+    bytes.fromhex("95d89b41"),  # symbol()
+    bytes.fromhex("313ce567"),  # decimals()
+)
+POOL_CALLS = {
+    "UniswapV2": (TOKEN0, TOKEN1, GET_RESERVES),
+    "UniswapV3": (TOKEN0, TOKEN1, LIQUIDITY, SLOT0),
+}
+
+Call = Tuple[str, bytes]
+
+
+class PoolStateLoader:
+    def __init__(
+        self,
+        http_session: ClientSession,
+        http_uri: str,
+        batch_size: int = POOL_LOADER_BATCH_SIZE,
+        concurrency: int = POOL_LOADER_CONCURRENCY,
+        rpc: Optional[Callable[[Dict], Awaitable[Dict]]] = None,
+    ):
+        """
+        Fetches the on-chain data the pool and token helpers are built from, many calls per
+        Multicall3 `aggregate3` request and several requests at a time, instead of one blocking
+        RPC per value through the websocket.
+
+        Args:
+            http_session (ClientSession): The session for the JSON-RPC requests.
+            http_uri (str): The HTTP endpoint of the node, e.g. a local anvil.
+            batch_size (int): The number of calls per `aggregate3` request.
+            concurrency (int): The number of requests in flight.
+            rpc (Optional[Callable[[Dict], Awaitable[Dict]]]): Sends a JSON-RPC request and
+                returns the response, instead of posting it to `http_uri`. For tests.
+        """
+        self.http_session = http_session
+        self.http_uri = http_uri
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rpc = rpc or self._post
+
+        # Counters
+        self.requests: int = 0
+        self.failed_calls: int = 0
+
+    async def fetch_pools(
+        self,
+        pool_data: Dict[str, Dict],
+        block_number: int,
+    ) -> Dict[Call, bytes]:
+        """
+        Fetches the data of the pools and of their tokens.
+
+        Args:
+            pool_data (Dict[str, Dict]): The pools to fetch, as in the pool files, by address.
+            block_number (int): The block to fetch the state at.
+
+        Returns:
+            Dict[Call, bytes]: The return data by (lowercase target address, calldata).
+        """
+        calls: List[Call] = []
+        token_addresses = set()
+        for pool_address, pool in pool_data.items():
+            calls.extend((pool_address.lower(), calldata) for calldata in POOL_CALLS.get(pool["type"], ()))
+            token_addresses.update((pool["token0"].lower(), pool["token1"].lower()))
+        for token_address in token_addresses:
+            calls.extend((token_address, calldata) for calldata in ERC20_CALLS)
+
+        return await self.fetch(calls, block_number)
+
+    async def fetch_pool_states(
+        self,
+        pool_helpers: Dict[str, Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]],
+        block_number: int,
+    ) -> Dict[str, Tuple[int, ...]]:
+        """
+        Fetches the reserves of V2 pools and the liquidity and price of V3 pools.
+
+        Args:
+            pool_helpers (Dict[str, Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]]):
+                The pools to fetch, by address.
+            block_number (int): The block to fetch the state at.
+
+        Returns:
+            Dict[str, Tuple[int, ...]]: `(reserves_token0, reserves_token1)` of V2 pools and
+                `(liquidity, sqrt_price_x96, tick)` of V3 pools, by address. Pools whose calls
+                failed are left out.
+        """
+        calls: List[Call] = []
+        for pool_address, pool_helper in pool_helpers.items():
+            if isinstance(pool_helper, degenbot.V3LiquidityPool):
+                calls.extend(((pool_address.lower(), LIQUIDITY), (pool_address.lower(), SLOT0)))
+            else:
+                calls.append((pool_address.lower(), GET_RESERVES))
+
+        results = await self.fetch(calls, block_number)
+
+        states: Dict[str, Tuple[int, ...]] = {}
+        for pool_address, pool_helper in pool_helpers.items():
+            try:
+                if isinstance(pool_helper, degenbot.V3LiquidityPool):
+                    (liquidity,) = decode(["uint128"], results[(pool_address.lower(), LIQUIDITY)])
+                    sqrt_price_x96, tick = decode(
+                        ["uint160", "int24"], results[(pool_address.lower(), SLOT0)][:64]
+                    )
+                    states[pool_address] = (liquidity, sqrt_price_x96, tick)
+                else:
+                    reserves0, reserves1 = decode(
+                        ["uint112", "uint112"], results[(pool_address.lower(), GET_RESERVES)][:64]
+                    )
+                    states[pool_address] = (reserves0, reserves1)
+            except KeyError:
+                continue
+        return states
+
+    async def fetch(self, calls: List[Call], block_number: int) -> Dict[Call, bytes]:
+        """
+        Args:
+            calls (List[Call]): The (target address, calldata) pairs to call.
+            block_number (int): The block to call at.
+
+        Returns:
+            Dict[Call, bytes]: The return data of the calls that succeeded.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_batch(batch: List[Call]) -> List[Tuple[bool, bytes]]:
+            async with semaphore:
+                return await self._aggregate3(batch, block_number)
+
+        batches = [calls[i : i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        batch_results = await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+
+        results: Dict[Call, bytes] = {}
+        for batch, batch_result in zip(batches, batch_results):
+            for call, (success, return_data) in zip(batch, batch_result):
+                # Calls to accounts without code succeed with no data
+                if success and return_data:
+                    results[call] = return_data
+                else:
+                    self.failed_calls += 1
+        return results
+
+    async def _aggregate3(self, calls: List[Call], block_number: int) -> List[Tuple[bool, bytes]]:
+        calldata = AGGREGATE3_SELECTOR + encode(
+            ["(address,bool,bytes)[]"],
+            [[(to_checksum_address(target), True, data) for target, data in calls]],
+        )
+        response = await self.rpc(
+            {
+                "jsonrpc": "2.0",
+                "id": self.requests,
+                "method": "eth_call",
+                "params": [{"to": MULTICALL3_ADDRESS, "data": "0x" + calldata.hex()}, hex(block_number)],
+            }
+        )
+        self.requests += 1
+
+        if "error" in response:
+            raise ValueError(f"aggregate3 failed at block {block_number}: {response['error']}")
+        (results,) = decode(["(bool,bytes)[]"], bytes.fromhex(response["result"][2:]))
+        return results
+
+    async def _post(self, payload: Dict) -> Dict:
+        async with self.http_session.post(self.http_uri, json=payload) as response:
+            return await response.json()
+
+
+class PrefetchedCallProvider(BaseProvider):
+    def __init__(
+        self,
+        calls: Dict[Call, bytes],
+        block_number: int,
+        chain_id: int,
+        fallback: BaseProvider,
+    ):
+        """
+        A web3 provider that answers `eth_call` from prefetched return data, whatever block is
+        asked for, and reports `block_number` as the chain height. Anything else goes to
+        `fallback`. Building the degenbot helpers with it makes their constructors read the
+        state fetched by `PoolStateLoader`, consistently at one block.
+
+        Args:
+            calls (Dict[Call, bytes]): The return data by (lowercase target address, calldata).
+            block_number (int): The block the calls were made at.
+            chain_id (int): The chain id.
+            fallback (BaseProvider): The provider of the real node.
+        """
+        super().__init__()
+        self.calls = calls
+        self.block_number = block_number
+        self.chain_id = chain_id
+        self.fallback = fallback
+
+        # Counters
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def make_request(self, method: str, params: Any) -> Dict:
+        if method == "eth_call":
+            transaction = params[0]
+            calldata = transaction.get("data") or transaction.get("input") or "0x"
+            return_data = self.calls.get((transaction["to"].lower(), bytes.fromhex(calldata[2:])))
+            if return_data is not None:
+                self.hits += 1
+                return {"jsonrpc": "2.0", "id": 0, "result": "0x" + return_data.hex()}
+            self.misses += 1
+        elif method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.block_number)}
+        elif method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.chain_id)}
+
+        return self.fallback.make_request(method, params)
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import StageMetrics
+
+
+class PoolUpdateQueue:
+    """
+    Coalescing work queue of pools whose state changed.
+
+    A pool is pending at most once: repeated updates before the consumer picks it up are
+    collapsed into the existing entry (keeping the newest block), and the consumer takes every
+    dirty pool in a single `get_batch` call. Insertion order is preserved.
+
+    For block-boundary evaluation, `get_block_batch` only hands out pools once the block they
+    were updated in is sealed, either because an update for a later block arrived or because
+    `seal_block` was called when a new block header was seen.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Optional[int]] = {}
+        self._not_empty = asyncio.Event()
+        self.newest_block: Optional[int] = None
+        self.sealed_block: Optional[int] = None
+
+        # Counters
+        self.puts: int = 0
+        self.coalesced: int = 0
+        self.batches: int = 0
+        self.pools_yielded: int = 0
+
+        # Optional latency tracking, see `StageMetrics`
+        self.metrics: Optional[StageMetrics] = None
+        self._enqueued_at: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, pool_address: str) -> bool:
+        return pool_address in self._pending
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def empty(self) -> bool:
+        return not self._pending
+
+    def put_nowait(self, pool_address: str, block_number: Optional[int] = None):
+        """
+        Marks a pool as dirty.
+
+        Args:
+            pool_address (str): The address of the pool that was updated.
+            block_number (Optional[int]): The block of the update, if known.
+        """
+        self.puts += 1
+
+        if self.metrics is not None and pool_address not in self._enqueued_at:
+            self._enqueued_at[pool_address] = time.perf_counter()
+
+        if pool_address in self._pending:
+            self.coalesced += 1
+            pending_block = self._pending[pool_address]
+            if pending_block is not None and (block_number is None or pending_block > block_number):
+                block_number = pending_block
+
+        self._pending[pool_address] = block_number
+
+        if block_number is not None and (self.newest_block is None or block_number > self.newest_block):
+            # An update for a later block means every earlier block is complete
+            if self.newest_block is not None:
+                self.seal_block(self.newest_block)
+            self.newest_block = block_number
+
+        self._not_empty.set()
+
+    def seal_block(self, block_number: int):
+        """
+        Marks every block up to and including `block_number` as complete.
+
+        Args:
+            block_number (int): The newest block known to have no further updates.
+        """
+        if self.sealed_block is None or block_number > self.sealed_block:
+            self.sealed_block = block_number
+            self._not_empty.set()
+
+    async def put(self, pool_address: str, block_number: Optional[int] = None):
+        self.put_nowait(pool_address, block_number)
+
+    def get_batch_nowait(self) -> Dict[str, Optional[int]]:
+        """
+        Takes every pending pool without waiting.
+
+        Returns:
+            Dict[str, Optional[int]]: The dirty pools mapped to the newest block they were updated at.
+        """
+        batch = self._pending
+        self._pending = {}
+        self._not_empty.clear()
+
+        if batch:
+            self.batches += 1
+            self.pools_yielded += len(batch)
+            if self.metrics is not None:
+                self._record_wait(batch)
+
+        return batch
+
+    async def get_batch(self) -> List[str]:
+        """
+        Waits for at least one dirty pool, then takes every pending pool.
+
+        Returns:
+            List[str]: The addresses of the dirty pools, in the order they were first updated.
+        """
+        while not self._pending:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        return list(self.get_batch_nowait())
+
+    async def get_block_batch(self) -> Tuple[Optional[int], List[str]]:
+        """
+        Waits until at least one dirty pool belongs to a sealed block, then takes every pool
+        updated at or before the sealed block. Pools updated in a later block stay pending.
+
+        Returns:
+            Tuple[Optional[int], List[str]]: The sealed block and the addresses of its dirty pools.
+        """
+        while True:
+            sealed_block = self.sealed_block
+            ready = [
+                pool_address
+                for pool_address, block_number in self._pending.items()
+                if block_number is None or (sealed_block is not None and block_number <= sealed_block)
+            ]
+            if ready:
+                break
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        for pool_address in ready:
+            del self._pending[pool_address]
+        if not self._pending:
+            self._not_empty.clear()
+
+        self.batches += 1
+        self.pools_yielded += len(ready)
+        if self.metrics is not None:
+            self._record_wait(ready)
+
+        return sealed_block, ready
+
+    def _record_wait(self, pool_addresses):
+        now = time.perf_counter()
+        for pool_address in pool_addresses:
+            enqueued_at = self._enqueued_at.pop(pool_address, None)
+            if enqueued_at is not None:
+                self.metrics.record("queue_wait", now - enqueued_at)
+
+    @property
+    def coalesce_ratio(self) -> float:
+        """
+        The fraction of updates that were absorbed by an already pending entry.
+        """
+        return self.coalesced / self.puts if self.puts else 0.0
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "depth": len(self._pending),
+            "newest_block": self.newest_block,
+            "sealed_block": self.sealed_block,
+            "puts": self.puts,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": self.coalesce_ratio,
+            "batches": self.batches,
+            "avg_batch_size": self.pools_yielded / self.batches if self.batches else 0.0,
+        }
@@ -1,20 +1,92 @@
 import asyncio
+from contextlib import contextmanager
 import degenbot
+import itertools
 from eth_utils.address import to_checksum_address
 import os
 from pathlib import Path
+import resource
+import sys
 import time
 from tqdm import tqdm
-from typing import TYPE_CHECKING, Dict, List, Optional, Union
-import ujson
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Tuple, Union
+import web3
 
 from .arbitrage_service import ArbDetails
+from .lazy_catalog import LazyCatalog
+from .pool_loader import PoolStateLoader, PrefetchedCallProvider
+from ...config.arb_catalog import ArbCatalog
 from ...config.constants import *
-from ...config.helpers import get_redis_value
+from ...config.helpers import get_redis_value, load_json_file
 from ...config.logging import logger
 
 log = logger(__name__)
 
+# Unique across pools and routes, so a re-created route never repeats an old version
+_state_versions = itertools.count(1)
+
+
+def _peak_memory_mib() -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_memory / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+@contextmanager
+def _load_phase(name: str):
+    # Logs the duration of a `load_pools` phase and the peak memory of the process after it
+    start = time.perf_counter()
+    peak_before = _peak_memory_mib()
+    yield
+    peak_after = _peak_memory_mib()
+    log.info(
+        f"Loaded {name} in {time.perf_counter() - start:.2f}s, "
+        f"peak memory {peak_after:.0f} MiB (+{peak_after - peak_before:.0f} MiB)"
+    )
+
+
+class PoolRoute:
+    def __init__(
+        self,
+        pool_manager: Union[degenbot.UniswapV2LiquidityPoolManager, degenbot.UniswapV3LiquidityPoolManager],
+        pool_helper: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool],
+    ):
+        self.pool_manager = pool_manager
+        self.pool_helper = pool_helper
+        self.state_version: int = next(_state_versions)
+
+    def bump_state_version(self):
+        # Called when an update changed the pool state, see CalculationCache
+        self.state_version = next(_state_versions)
+
+    def update_v2_reserves(self, reserves0: int, reserves1: int, block_number: int, silent: bool = True) -> bool:
+        """
+        Applies a Sync to the V2 pool helper and bumps the state version if the reserves changed.
+        `LiquidityPool.update_reserves` can't tell, it returns False for every external update.
+
+        Args:
+            reserves0 (int): The reserves of token0 from the Sync.
+            reserves1 (int): The reserves of token1 from the Sync.
+            block_number (int): The block of the Sync.
+            silent (bool): Whether the helper skips logging the update.
+
+        Returns:
+            bool: Whether the reserves changed.
+        """
+        pool_helper = self.pool_helper
+        reserves_before = (pool_helper.reserves_token0, pool_helper.reserves_token1)
+        pool_helper.update_reserves(
+            external_token0_reserves=reserves0,
+            external_token1_reserves=reserves1,
+            silent=silent,
+            print_reserves=False,
+            update_block=block_number,
+        )
+        if (pool_helper.reserves_token0, pool_helper.reserves_token1) == reserves_before:
+            return False
+        self.bump_state_version()
+        return True
+
 
 class PoolService:
     def __init__(self, bot_state):
@@ -92,11 +164,32 @@ class PoolService:
             for factory_name in factories.keys()
         ]
 
+        # This dictionary stores file paths, the binary catalogs are preferred over the JSON files
+        arb_file_paths = {}
+        for path_length in (2, 3):
+            arb_file_path = data_dir / f"{chain_name}_arb_paths_{path_length}.bin"
+            if not arb_file_path.exists():
+                arb_file_path = arb_file_path.with_suffix(".json")
+            arb_file_paths[f"arb_paths_{path_length}"] = arb_file_path
+
+        # Restore the pools and arbs from a checkpoint of the same files if there is one
+        checkpoint_service = self.bot_state.checkpoint_service
+        if checkpoint_service is not None and not LAZY_POOL_HELPERS:
+            checkpoint_service.fingerprint = checkpoint_service.source_fingerprint(
+                lp_filepaths + list(arb_file_paths.values())
+            )
+            if await self.restore_checkpoint():
+                return
+
         # Identify all liquidity pools
-        self.liquidity_pool_data = {}
-        for lp_filename in lp_filepaths:
-            with open(lp_filename, encoding="utf-8") as file:
-                for pool in ujson.load(file):
+        with _load_phase("pools"):
+            snapshot_service = self.bot_state.snapshot_service
+            self.liquidity_pool_data = {}
+            for lp_filename in lp_filepaths:
+                for pool in load_json_file(lp_filename):
+                    # The snapshot needs the tick spacing of every V3 pool, blacklisted or not
+                    if snapshot_service is not None and pool["type"] == "UniswapV3":
+                        snapshot_service.register_pool(pool["pool_address"], pool["fee"])
                     if (
                         pool_address := pool["pool_address"]
                     ) in self.bot_state.blacklists["pools"]:
@@ -106,69 +199,35 @@ class PoolService:
                     if pool["token1"] in self.bot_state.blacklists["pools"]:
                         continue
                     self.liquidity_pool_data[pool_address] = pool
-        log.info(f"Found {len(self.liquidity_pool_data)} pools")
-
-        # This dictionary stores file paths
-        arb_file_paths = {
-            "arb_paths_2": data_dir / f"{chain_name}_arb_paths_2.json",
-            "arb_paths_3": data_dir / f"{chain_name}_arb_paths_3.json",
-        }
+            log.info(f"Found {len(self.liquidity_pool_data)} pools")
+
+        # Collect the arb paths, their unique pools and tokens and the pool-to-arbs index in one pass
+        with _load_phase("arb paths"):
+            blacklisted_arbs = self.bot_state.blacklists["arbs"]
+            blacklisted_tokens = self.bot_state.blacklists["tokens"]
+            arb_index = self.bot_state.arb_index
+            arb_paths: Dict[str, Tuple[str, ...]] = {}
+            self.unique_pool_addresses = set()
+            unique_tokens = set()
+
+            for arb_id, path in self.iter_arb_paths(arb_file_paths.values()):
+                if arb_id in blacklisted_arbs:
+                    continue
+                arb_paths[arb_id] = path
+                arb_index.add(arb_id, path)
+
+                for pool_address in path:
+                    if pool_address in self.unique_pool_addresses:
+                        continue
+                    self.unique_pool_addresses.add(pool_address)
+                    pool = self.liquidity_pool_data[pool_address]
+                    for token_address in (pool["token0"], pool["token1"]):
+                        if token_address not in blacklisted_tokens:
+                            unique_tokens.add(token_address)
 
-        # This list will store the arbitrage paths
-        arb_paths = []
-
-        # Iterate over the values of the dictionary (file paths)
-        for arb_file_path in arb_file_paths.values():
-            with arb_file_path.open(encoding="utf-8") as file:
-                arb_data = ujson.load(file)
-                for arb_id, arb in arb_data.items():
-                    passed_checks = True
-                    if arb_id in self.bot_state.blacklists["arbs"]:
-                        passed_checks = False
-
-                    for pool_address in arb.get("path", []):
-                        if not self.liquidity_pool_data.get(pool_address):
-                            passed_checks = False
-
-                    if passed_checks:
-                        arb_paths.append(arb)
-
-        log.info(f"Found {len(arb_paths)} arb paths")
-
-        # Identify all unique pool addresses in arb paths
-        self.unique_pool_addresses = {
-            pool_address
-            for arb in arb_paths
-            for pool_address in arb["path"]
-            if self.liquidity_pool_data.get(pool_address)
-        }
-        log.info(f"Found {len(self.unique_pool_addresses)} unique pools")
-
-        # Identify all unique tokens in the liquidity pools
-        unique_tokens = (
-            # all token0 addresses
-            {
-                token_address
-                for arb in arb_paths
-                for pool_address in arb.get("path")
-                for pool_dict in arb.get("pools").values()
-                if (token_address := pool_dict.get("token0"))
-                if token_address not in self.bot_state.blacklists["tokens"]
-                if self.liquidity_pool_data.get(pool_address)
-            }
-            |
-            # all token1 addresses
-            {
-                token_address
-                for arb in arb_paths
-                for pool_address in arb.get("path")
-                for pool_dict in arb.get("pools").values()
-                if (token_address := pool_dict.get("token1"))
-                if token_address not in self.bot_state.blacklists["tokens"]
-                if self.liquidity_pool_data.get(pool_address)
-            }
-        )
-        log.info(f"Found {len(unique_tokens)} unique tokens")
+            log.info(f"Found {len(arb_paths)} arb paths")
+            log.info(f"Found {len(self.unique_pool_addresses)} unique pools")
+            log.info(f"Found {len(unique_tokens)} unique tokens")
 
         # Sleep if the event watcher is not running
         while not self.bot_state.first_event:
@@ -177,68 +236,354 @@ class PoolService:
         # TEST trim to make the bot load fast.
         # unique_pool_addresses = set(list(unique_pool_addresses)[:100])
 
+        if LAZY_POOL_HELPERS:
+            self.register_lazy_catalog(arb_paths)
+            return
+
         # Create pool helpers
-        await self.create_pool_helpers()
+        with _load_phase("pool helpers"):
+            await self.create_pool_helpers()
 
         degenbot_weth = degenbot.Erc20Token(chain_data.get("wrapped_token"))
 
-        blacklisted_arbs = self.bot_state.blacklists["arbs"]
         all_pools = self.bot_state.all_pools
 
-        for arb in tqdm(arb_paths):
+        with _load_phase("arb helpers"):
+            for arb_id, path in tqdm(arb_paths.items(), total=len(arb_paths)):
+
+                # Get pool objects for the arb path
+                swap_pools = []
+                for pool_address in path:
+                    pool_obj = all_pools.get(pool_address)
+                    if not pool_obj:
+                        break
+                    swap_pools.append(pool_obj)
+
+                # Skip if not all pools are available
+                if len(swap_pools) != len(path):
+                    arb_index.remove(arb_id)
+                    continue
+
+                self.add_arb(
+                    arb_id,
+                    ArbDetails(
+                        lp_cycle=degenbot.UniswapLpCycle(
+                            input_token=degenbot_weth,
+                            swap_pools=swap_pools,
+                            max_input=self.bot_state.max_input_bounds.for_pool(swap_pools[0], degenbot_weth),
+                            id=arb_id,
+                        ),
+                        status="load",
+                    ),
+                )
+            del arb_paths
+        log.info(f"Built {len(self.bot_state.all_arbs)} cycle arb helpers")
+        log.info(f"Indexed {len(self.bot_state.arb_index.arbs_by_pool)} pools to arbs")
+        log.info("Arb loading complete")
+
+        self.bot_state.pools_loaded = True
+        self.bot_state.live = True
+
+    def iter_arb_paths(self, arb_file_paths: Iterable[Path]) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """
+        Reads the arb catalogs, or the JSON arb files, and yields the arbs whose pools are all
+        in `liquidity_pool_data`. The JSON arbs are dropped as they are read, only their paths
+        are kept.
+
+        Args:
+            arb_file_paths (Iterable[Path]): The `{chain}_arb_paths_{n}.bin` or `.json` files.
 
-            arb_id = arb.get("id")
-            if arb_id in blacklisted_arbs:
+        Yields:
+            Tuple[str, Tuple[str, ...]]: The arb id and the pool addresses of its path.
+        """
+        for arb_file_path in arb_file_paths:
+            if arb_file_path.suffix == ".bin":
+                arb_catalog = ArbCatalog(arb_file_path)
+                for arb_id, path in arb_catalog.iter_paths(self.liquidity_pool_data.__contains__):
+                    yield arb_id, tuple(path)
                 continue
 
-            # Get pool objects for the arb path
-            swap_pools = []
-            for pool_address in arb["path"]:
-                pool_obj = all_pools.get(pool_address)
-                if not pool_obj:
-                    break
-                swap_pools.append(pool_obj)
+            arb_data = load_json_file(arb_file_path)
+            while arb_data:
+                arb_id, arb = arb_data.popitem()
+                path = tuple(arb.get("path", ()))
+                if path and all(pool_address in self.liquidity_pool_data for pool_address in path):
+                    yield arb_id, path
+
+    def register_lazy_catalog(self, arb_paths: Dict[str, Tuple[str, ...]]):
+        """
+        Registers the pools and arbs without building their helpers, see `LazyCatalog`.
+
+        Args:
+            arb_paths (Dict[str, Tuple[str, ...]]): The paths of the arbs that passed the
+                checks of `load_pools`, by id.
+        """
+        lazy_catalog = LazyCatalog(
+            self.bot_state,
+            self.build_pool_helper,
+            self.remove_pool,
+            degenbot.Erc20Token(self.bot_state.chain_data.get("wrapped_token")),
+        )
+        for pool_address in self.unique_pool_addresses:
+            lazy_catalog.add_pool(pool_address, self.liquidity_pool_data[pool_address])
+
+        for arb_id, path in arb_paths.items():
+            lazy_catalog.add_arb(arb_id, path)
+
+        self.bot_state.lazy_catalog = lazy_catalog
+        log.info(
+            f"Registered {len(lazy_catalog.pool_data)} pools and {len(lazy_catalog.arb_paths)} arbs, "
+            f"helpers are built on first use"
+        )
+        log.info("Arb loading complete")
+
+        self.bot_state.pools_loaded = True
+        self.bot_state.live = True
+
+    async def restore_checkpoint(self) -> bool:
+        """
+        Restores the pools and arbs from the checkpoint and catches the pools up to the block
+        before the first event: the liquidity events fetched for the snapshot since the
+        checkpoint block are applied to the V3 pools, then the reserves and prices are set to
+        the values fetched in a few Multicall3 requests.
+
+        Returns:
+            bool: Whether the state was restored, False if the pools must be built.
+        """
+        while not self.bot_state.first_event:
+            await asyncio.sleep(1)
+
+        checkpoint = self.bot_state.checkpoint_service.load(self.bot_state.first_event)
+        if checkpoint is None:
+            return False
 
-            # Skip if not all pools are available
-            if len(swap_pools) != len(arb["path"]):
+        start = time.perf_counter()
+        state_block = self.bot_state.first_event - 1
+        blacklists = self.bot_state.blacklists
+
+        arbs = {}
+        for arb_id, arb_details in checkpoint["arbs"].items():
+            if arb_id in blacklists["arbs"]:
+                continue
+            if any(
+                address in blacklists["pools"]
+                for pool_helper in arb_details.lp_cycle.swap_pools
+                for address in (pool_helper.address, pool_helper.token0.address, pool_helper.token1.address)
+            ):
                 continue
+            arbs[arb_id] = arb_details
 
-            self.bot_state.all_arbs[arb_id] = ArbDetails(
-                lp_cycle=degenbot.UniswapLpCycle(
-                    input_token=degenbot_weth,
-                    swap_pools=swap_pools,
-                    max_input=MAX_INPUT,
-                    id=arb_id,
-                ),
-                status="load",
+        pool_helpers = {
+            pool_helper.address: pool_helper
+            for arb_details in arbs.values()
+            for pool_helper in arb_details.lp_cycle.swap_pools
+        }
+
+        loader = PoolStateLoader(self.bot_state.http_session, self.bot_state.http_uri)
+        try:
+            pool_states = await loader.fetch_pool_states(pool_helpers, state_block)
+        except Exception as exc:
+            log.error(f"Could not prefetch pool state: {exc}")
+            pool_states = {}
+
+        # No awaiting from here on, the pools are caught up and routed before any event for
+        # them is processed
+        pool_managers = {
+            to_checksum_address(factory_address): pool_manager
+            for factory_address, pool_manager in self.bot_state.pool_managers.items()
+        }
+        failed_pools = set()
+        for pool_address, pool_helper in pool_helpers.items():
+            pool_manager = pool_managers.get(pool_helper.factory)
+            if pool_manager is None or not self.catch_up_pool(
+                pool_helper, pool_states.get(pool_address), state_block
+            ):
+                failed_pools.add(pool_address)
+                continue
+
+            # The managers find the helper in AllPools and track it
+            self.bot_state.all_pools[pool_address] = pool_helper
+            pool_manager.get_pool(pool_address=pool_address, silent=True)
+            self.bot_state.pool_routes[pool_address] = PoolRoute(
+                pool_manager=pool_manager,
+                pool_helper=pool_helper,
             )
-        log.info(f"Built {len(self.bot_state.all_arbs)} cycle arb helpers")
+
+        max_input_bounds = self.bot_state.max_input_bounds
+        for arb_id, arb_details in arbs.items():
+            arb_helper = arb_details.lp_cycle
+            if any(pool_helper.address in failed_pools for pool_helper in arb_helper.swap_pools):
+                continue
+            arb_helper.max_input = max_input_bounds.for_pool(arb_helper.swap_pools[0], arb_helper.input_token)
+            self.add_arb(arb_id, arb_details)
+
+        if self.bot_state.snapshot_service is not None:
+            self.bot_state.snapshot_service.tick_spacings.update(checkpoint["tick_spacings"])
+
+        if failed_pools:
+            log.error(f"Dropped {len(failed_pools)} pools that could not be caught up, and their arbs")
+        log.info(
+            f"Restored {len(self.bot_state.pool_routes)} pools and {len(self.bot_state.all_arbs)} arbs "
+            f"from block {checkpoint['block']} to {state_block} in {time.perf_counter() - start:.2f}s"
+        )
         log.info("Arb loading complete")
 
         self.bot_state.pools_loaded = True
         self.bot_state.live = True
+        return True
+
+    def catch_up_pool(
+        self,
+        pool_helper: Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool],
+        pool_state: Optional[tuple],
+        state_block: int,
+    ) -> bool:
+        """
+        Brings a pool restored from the checkpoint to `state_block`, or to the state of its
+        node if the state could not be prefetched.
 
+        Args:
+            pool_helper (Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool]): The pool.
+            pool_state (Optional[tuple]): The prefetched state, see `fetch_pool_states`.
+            state_block (int): The block before the first event.
+
+        Returns:
+            bool: Whether the pool was caught up.
+        """
+        try:
+            if isinstance(pool_helper, degenbot.V3LiquidityPool):
+                liquidity_updates = self.bot_state.snapshot.get_new_liquidity_updates(pool_helper.address)
+                for liquidity_update in liquidity_updates:
+                    if liquidity_update.block_number <= state_block:
+                        pool_helper.external_update(liquidity_update)
+                if pool_state is None:
+                    pool_helper.auto_update(block_number=state_block)
+                else:
+                    liquidity, sqrt_price_x96, tick = pool_state
+                    pool_helper.external_update(
+                        update=degenbot.UniswapV3PoolExternalUpdate(
+                            block_number=state_block,
+                            liquidity=liquidity,
+                            sqrt_price_x96=sqrt_price_x96,
+                            tick=tick,
+                        ),
+                    )
+                # Events recorded while the bot was loading
+                for liquidity_update in liquidity_updates:
+                    if liquidity_update.block_number > state_block:
+                        pool_helper.external_update(liquidity_update)
+            else:
+                if pool_state is None:
+                    pool_helper.auto_update(block_number=state_block)
+                else:
+                    reserves0, reserves1 = pool_state
+                    pool_helper.update_reserves(
+                        external_token0_reserves=reserves0,
+                        external_token1_reserves=reserves1,
+                        silent=True,
+                        print_reserves=False,
+                        print_ratios=False,
+                        update_block=state_block,
+                    )
+        except Exception as exc:
+            log.error(f"Could not catch up pool {pool_helper.address}: {exc}")
+            return False
+        return True
+
+    def add_arb(self, arb_id: str, arb_details: ArbDetails):
+        """
+        Adds an arb to `all_arbs` and registers it in the pool-to-arbs index.
+
+        Args:
+            arb_id (str): The id of the arb.
+            arb_details (ArbDetails): The arb helper and its status.
+        """
+        self.bot_state.all_arbs[arb_id] = arb_details
+        self.bot_state.arb_index.add(
+            arb_id, [pool.address for pool in arb_details.lp_cycle.swap_pools]
+        )
+
+    def remove_arb(self, arb_id: str):
+        """
+        Removes an arb from `all_arbs` and from the pool-to-arbs index.
+
+        Args:
+            arb_id (str): The id of the arb.
+        """
+        self.bot_state.all_arbs.pop(arb_id, None)
+        self.bot_state.arb_index.remove(arb_id)
 
-    async def create_pool_helper(
+    def remove_pool(self, pool_address: str):
+        """
+        Removes a pool and the arbs that route through it from every per-pool structure: the
+        routing table, its pool manager, the pool registry, the pool-to-arbs index, the max
+        input bounds, the shared state table, the calculation cache and the lazy catalog.
+
+        Args:
+            pool_address (str): The address of the pool.
+        """
+        pool_route = self.bot_state.pool_routes.pop(pool_address, None)
+        if pool_route is not None:
+            try:
+                pool_route.pool_manager.__delitem__(pool_address)
+            except KeyError:
+                pass
+            else:
+                log.info(f"Removed pool {pool_address} from its pool manager")
+        try:
+            del self.bot_state.all_pools[pool_address]
+        except KeyError:
+            pass
+
+        calculation_cache = self.bot_state.calculation_cache
+        lazy_catalog = self.bot_state.lazy_catalog
+        for arb_id in self.bot_state.arb_index.remove_pool(pool_address):
+            self.bot_state.all_arbs.pop(arb_id, None)
+            if calculation_cache is not None:
+                calculation_cache.discard(arb_id)
+            if lazy_catalog is not None:
+                lazy_catalog.arb_paths.pop(arb_id, None)
+
+        self.bot_state.max_input_bounds.remove(pool_address)
+        if self.bot_state.shared_state is not None:
+            self.bot_state.shared_state.remove_pool(pool_address)
+        if lazy_catalog is not None:
+            lazy_catalog.pool_data.pop(pool_address, None)
+
+
+    def build_pool_helper(
         self,
         pool_address: str,
         pool_data: Dict,
-        pool_managers: Dict,
-        v2_factories: Dict,
-        v3_factories: Dict,
-        first_event: int
+        state_block: int,
     ) -> Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool, None]:
+        """
+        Builds the helper of a pool through its manager and routes its events to it.
+
+        Args:
+            pool_address (str): The address of the pool.
+            pool_data (Dict): The entry of the pool in its LP file.
+            state_block (int): The block to build the helper at.
+
+        Returns:
+            Union[degenbot.LiquidityPool, degenbot.V3LiquidityPool, None]: The helper, None if
+                it could not be built.
+        """
+        pool_managers = self.bot_state.pool_managers
+        v2_factories = self.bot_state.chain_data["factories"]["v2"]
+        v3_factories = self.bot_state.chain_data["factories"]["v3"]
+
         pool_type = pool_data["type"]
         pool_exchange = pool_data["exchange"]
 
         if pool_type == "UniswapV2":
             try:
                 pool_manager = pool_managers[v2_factories[pool_exchange]["factory_address"]]
-                return pool_manager.get_pool(
+                pool_helper = pool_manager.get_pool(
                     pool_address=pool_address,
                     silent=True,
                     update_method="external",
-                    state_block=first_event - 1,
+                    state_block=state_block,
                 )
             except degenbot.exceptions.ManagerError as exc:
                 log.error(exc)
@@ -247,10 +592,10 @@ class PoolService:
         elif pool_type == "UniswapV3":
             try:
                 pool_manager = pool_managers[v3_factories[pool_exchange]["factory_address"]]
-                return pool_manager.get_pool(
+                pool_helper = pool_manager.get_pool(
                     pool_address=pool_address,
                     silent=True,
-                    state_block=first_event - 1,
+                    state_block=state_block,
                     v3liquiditypool_kwargs={"fee": pool_data["fee"]},
                 )
             except degenbot.exceptions.ManagerError as exc:
@@ -260,8 +605,52 @@ class PoolService:
         else:
             log.error(f"Could not identify pool type! {pool_type=}")
             return None
+
+        # Route events for this pool straight to its manager and helper
+        self.bot_state.pool_routes[pool_helper.address] = PoolRoute(
+            pool_manager=pool_manager,
+            pool_helper=pool_helper,
+        )
+        return pool_helper
     
 
+    async def prefetch_pool_state(self, state_block: int) -> PrefetchedCallProvider:
+        """
+        Fetches the pool and token state of all pools at `state_block` through Multicall3.
+
+        Args:
+            state_block (int): The block the pool helpers are created at.
+
+        Returns:
+            PrefetchedCallProvider: A provider answering the calls of the helper constructors
+                from the prefetched state.
+        """
+        start = time.perf_counter()
+        loader = PoolStateLoader(self.bot_state.http_session, self.bot_state.http_uri)
+        pool_data = {
+            pool_address: self.liquidity_pool_data[pool_address]
+            for pool_address in self.unique_pool_addresses
+        }
+
+        try:
+            calls = await loader.fetch_pools(pool_data, state_block)
+        except Exception as exc:
+            # The helpers can still be created with one call per value
+            log.error(f"Could not prefetch pool state: {exc}")
+            calls = {}
+
+        log.info(
+            f"Prefetched {len(calls)} calls in {loader.requests} requests "
+            f"({loader.failed_calls} failed) in {time.perf_counter() - start:.2f}s"
+        )
+        return PrefetchedCallProvider(
+            calls,
+            state_block,
+            self.bot_state.chain_id,
+            self.bot_state.w3.provider,
+        )
+
+
     async def create_pool_helpers(self):
         start = time.perf_counter()
         total_pools = len(self.unique_pool_addresses)
@@ -270,22 +659,30 @@ class PoolService:
         v2_pools = 0
         v3_pools = 0
 
-        with tqdm(total=total_pools, desc="Creating pool helpers", unit="pool") as pbar:
-            for pool_address in self.unique_pool_addresses:
-                helper = await self.create_pool_helper(
-                    pool_address,
-                    self.liquidity_pool_data[pool_address],
-                    self.bot_state.pool_managers,
-                    self.bot_state.chain_data["factories"]["v2"],
-                    self.bot_state.chain_data["factories"]["v3"],
-                    self.bot_state.first_event
-                )
-                if helper is not None:
-                    if isinstance(helper, degenbot.V3LiquidityPool):
-                        v3_pools += 1
-                    else:
-                        v2_pools += 1
-                pbar.update(1)
+        # Fetch the state the helpers are built from in a few batched requests, and serve the
+        # calls of their constructors from it
+        state_block = self.bot_state.first_event - 1
+        provider = await self.prefetch_pool_state(state_block)
+        degenbot.set_web3(web3.Web3(provider))
+
+        try:
+            with tqdm(total=total_pools, desc="Creating pool helpers", unit="pool") as pbar:
+                for pool_address in self.unique_pool_addresses:
+                    helper = self.build_pool_helper(
+                        pool_address,
+                        self.liquidity_pool_data[pool_address],
+                        state_block,
+                    )
+                    if helper is not None:
+                        if isinstance(helper, degenbot.V3LiquidityPool):
+                            v3_pools += 1
+                        else:
+                            v2_pools += 1
+                    pbar.update(1)
+        finally:
+            degenbot.set_web3(self.bot_state.w3)
+
+        log.info(f"Prefetched calls: {provider.hits} served, {provider.misses} sent to the node")
 
         duration = time.perf_counter() - start
         total_pools_created = v2_pools + v3_pools
@@ -0,0 +1,417 @@
+from collections import namedtuple
+import degenbot
+from multiprocessing.shared_memory import SharedMemory
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import (
+    ArbitrageCalculationResult,
+    UniswapLpCycle,
+)
+from degenbot.uniswap.v3_types import (
+    UniswapV3BitmapAtWord,
+    UniswapV3LiquidityAtTick,
+)
+
+from ...config.constants import SHARED_STATE_POOLS, SHARED_STATE_TICK_BYTES
+from ...config.logging import logger
+
+log = logger(__name__)
+
+KIND_V2 = 1
+KIND_V3 = 2
+
+# seq, block, kind, tick, tick_version, tick_offset, tick_count, value0, value1
+# value0/value1 are the reserves of a V2 pool, or the liquidity and sqrtPriceX96 of a V3 pool
+_SLOT = struct.Struct("<QQB3xiQqq32s32s")
+_SEQ = struct.Struct("<Q")
+_TICK = struct.Struct("<i16s16s")
+
+SlotRecord = namedtuple(
+    "SlotRecord",
+    "seq block kind tick tick_version tick_offset tick_count value0 value1",
+)
+
+# Set in the parent right before the worker processes are forked, so every worker inherits them
+_worker_table: Optional["SharedPoolStateTable"] = None
+_worker_arbs: Dict[str, UniswapLpCycle] = {}
+
+
+def calculate_shared_chunk(
+    arb_ids: List[str],
+    max_inputs: List[int],
+) -> Tuple[List[ArbitrageCalculationResult], List[Tuple[str, str]], List[Tuple[str, float]], float]:
+    """
+    Calculates a chunk of arbs in a worker process, from the arb helpers the worker inherited
+    and the pool states in the shared table. Only the arb ids and their current max inputs,
+    which change with the liquidity of their first pool, are sent to the worker.
+
+    Args:
+        arb_ids (List[str]): The ids of the arbs to calculate.
+        max_inputs (List[int]): The max input of each arb.
+
+    Returns:
+        Tuple[List[ArbitrageCalculationResult], List[Tuple[str, str]], List[Tuple[str, float]], float]:
+            Same as `calculate_chunk`.
+    """
+    # Imported here, batch_evaluator imports this module
+    from .batch_evaluator import calculate_chunk
+
+    table = _worker_table
+    arb_helpers: List[UniswapLpCycle] = []
+    errors: List[Tuple[str, str]] = []
+    synced_pools: Set[str] = set()
+
+    for arb_id, max_input in zip(arb_ids, max_inputs):
+        arb_helper = _worker_arbs[arb_id]
+        arb_helper.max_input = max_input
+        try:
+            for pool in arb_helper.swap_pools:
+                if pool.address not in synced_pools:
+                    table.sync_pool(pool)
+                    synced_pools.add(pool.address)
+        except Exception as exc:
+            errors.append((arb_id, f"{type(exc).__name__} - {exc}"))
+            continue
+        arb_helpers.append(arb_helper)
+
+    results, calculation_errors, costs, elapsed = calculate_chunk(arb_helpers)
+    return results, errors + calculation_errors, costs, elapsed
+
+
+class SharedPoolStateTable:
+    def __init__(
+        self,
+        capacity: int = SHARED_STATE_POOLS,
+        tick_region_bytes: int = SHARED_STATE_TICK_BYTES,
+    ):
+        """
+        Pool states in shared memory, written by the event service and read by the executor
+        workers, so pool states don't have to be pickled for every calculation.
+
+        Every pool has a fixed-size slot with its V2 reserves or V3 liquidity, sqrtPriceX96 and
+        tick, guarded by a sequence lock: the writer makes the sequence odd while it writes, and
+        a reader retries until it reads the same even sequence before and after copying the slot.
+
+        V3 tick liquidity lives in a separate region, rewritten only when a Mint or Burn changes
+        it. A pool's ticks are appended to the active half of the region with a new version
+        number in its slot, workers only decode them again when the version changes. When the
+        active half is full, the current ticks of every pool are copied to the other half.
+
+        The workers inherit the table, the slot map and the arb helpers when they are forked, see
+        `freeze`.
+
+        Args:
+            capacity (int): The maximum number of pools.
+            tick_region_bytes (int): The size of the tick liquidity region.
+        """
+        self.capacity = capacity
+        self.slots: Dict[str, int] = {}
+        self.slots_used: int = 0
+        self.frozen_arb_ids: Set[str] = set()
+
+        self._slot_memory = SharedMemory(create=True, size=capacity * _SLOT.size)
+        self._tick_memory = SharedMemory(create=True, size=tick_region_bytes)
+        self._slot_buffer = self._slot_memory.buf
+        self._tick_buffer = self._tick_memory.buf
+
+        # Writer side
+        self._tick_blobs: Dict[int, bytes] = {}
+        self._tick_half: int = 0
+        self._tick_cursor: int = 0
+        self._tick_half_size: int = tick_region_bytes // 2
+
+        # Reader side
+        self._synced_seqs: Dict[int, int] = {}
+        self._tick_versions: Dict[int, int] = {}
+
+        log.info(
+            f"SharedPoolStateTable created: {capacity} pools, "
+            f"{tick_region_bytes / 2**20:.0f} MB tick region"
+        )
+
+    @property
+    def frozen(self) -> bool:
+        return _worker_table is self
+
+    def freeze(self, all_arbs: Dict):
+        """
+        Publishes the table and the current arb helpers to the workers. Must be called before
+        the executor starts its worker processes, they only inherit what exists at that point.
+        Arbs added later are not known to the workers and have to be sent to them as before.
+
+        Args:
+            all_arbs (Dict): The `all_arbs` catalog of the bot state.
+        """
+        global _worker_table, _worker_arbs
+
+        _worker_arbs = {arb_id: arb_details.lp_cycle for arb_id, arb_details in all_arbs.items()}
+        for arb_helper in _worker_arbs.values():
+            for pool in arb_helper.swap_pools:
+                self.slot(pool.address)
+
+        self.frozen_arb_ids = set(_worker_arbs)
+        _worker_table = self
+
+        log.info(f"SharedPoolStateTable frozen with {len(self.frozen_arb_ids)} arbs, {len(self.slots)} pools")
+
+    def slot(self, pool_address: str) -> int:
+        try:
+            return self.slots[pool_address]
+        except KeyError:
+            if self.slots_used >= self.capacity:
+                raise ValueError("SharedPoolStateTable is full") from None
+            slot = self.slots[pool_address] = self.slots_used
+            self.slots_used += 1
+            return slot
+
+    def remove_pool(self, pool_address: str):
+        """
+        Forgets a pool removed from the bot, its ticks are no longer copied by compactions. The
+        slot is not reused, workers forked earlier still map the pool to it.
+
+        Args:
+            pool_address (str): The address of the pool.
+        """
+        slot = self.slots.pop(pool_address, None)
+        if slot is not None:
+            self._tick_blobs.pop(slot, None)
+
+    def update_v2(self, pool_helper: degenbot.LiquidityPool, block_number: int):
+        """
+        Writes the reserves of a V2 pool.
+
+        Args:
+            pool_helper (degenbot.LiquidityPool): The updated pool helper.
+            block_number (int): The block of the update.
+        """
+        slot = self.slot(pool_helper.address)
+        current = self._read_slot(slot)
+        self._write_slot(
+            slot,
+            block_number,
+            KIND_V2,
+            0,
+            current.tick_version,
+            current.tick_offset,
+            current.tick_count,
+            pool_helper.reserves_token0,
+            pool_helper.reserves_token1,
+        )
+
+    def update_v3(
+        self,
+        pool_helper: degenbot.V3LiquidityPool,
+        block_number: int,
+        ticks_changed: bool = False,
+    ):
+        """
+        Writes the liquidity, price and tick of a V3 pool, and its tick liquidity after a Mint
+        or Burn.
+
+        Args:
+            pool_helper (degenbot.V3LiquidityPool): The updated pool helper.
+            block_number (int): The block of the update.
+            ticks_changed (bool): Whether the tick liquidity changed.
+        """
+        slot = self.slot(pool_helper.address)
+        current = self._read_slot(slot)
+        tick_version, tick_offset, tick_count = (
+            current.tick_version,
+            current.tick_offset,
+            current.tick_count,
+        )
+
+        if ticks_changed:
+            blob = b"".join(
+                _TICK.pack(
+                    tick,
+                    liquidity_at_tick.liquidityNet.to_bytes(16, "little", signed=True),
+                    liquidity_at_tick.liquidityGross.to_bytes(16, "little"),
+                )
+                for tick, liquidity_at_tick in pool_helper.tick_data.items()
+            )
+            self._tick_blobs[slot] = blob
+            tick_version += 1
+            tick_offset = self._store_ticks(slot, blob)
+            tick_count = len(blob) // _TICK.size
+
+        self._write_slot(
+            slot,
+            block_number,
+            KIND_V3,
+            pool_helper.tick,
+            tick_version,
+            tick_offset,
+            tick_count,
+            pool_helper.liquidity,
+            pool_helper.sqrt_price_x96,
+        )
+
+    def sync_pool(self, pool):
+        """
+        Brings a worker's copy of a pool helper up to date with the table. Pools that were not
+        written since the worker was forked are left as they are.
+
+        Args:
+            pool: The worker's pool helper.
+        """
+        slot = self.slots.get(pool.address)
+        if slot is None:
+            return
+
+        while True:
+            record = self._read_slot(slot)
+            if record.seq == 0 or self._synced_seqs.get(slot) == record.seq:
+                return
+
+            tick_rows = None
+            if record.kind == KIND_V3 and record.tick_version != self._tick_versions.get(slot, 0):
+                if record.tick_offset < 0:
+                    raise ValueError(f"Tick liquidity of {pool.address} is not in shared memory")
+                tick_rows = bytes(
+                    self._tick_buffer[record.tick_offset : record.tick_offset + record.tick_count * _TICK.size]
+                )
+
+            # The ticks may have been moved or replaced while they were copied
+            if _SEQ.unpack_from(self._slot_buffer, slot * _SLOT.size)[0] == record.seq:
+                break
+
+        value0 = int.from_bytes(record.value0, "little")
+        value1 = int.from_bytes(record.value1, "little")
+
+        try:
+            if record.kind == KIND_V2:
+                pool.update_reserves(
+                    external_token0_reserves=value0,
+                    external_token1_reserves=value1,
+                    silent=True,
+                    print_reserves=False,
+                    update_block=record.block,
+                )
+            elif record.kind == KIND_V3:
+                if tick_rows is not None:
+                    pool.tick_data, pool.tick_bitmap = self._decode_ticks(
+                        tick_rows, pool.tick_spacing, record.block
+                    )
+                    self._tick_versions[slot] = record.tick_version
+                pool.external_update(
+                    update=degenbot.UniswapV3PoolExternalUpdate(
+                        block_number=record.block,
+                        liquidity=value0,
+                        sqrt_price_x96=value1,
+                        tick=record.tick,
+                    ),
+                )
+        except degenbot.exceptions.ExternalUpdateError:
+            pass
+
+        self._synced_seqs[slot] = record.seq
+
+    def close(self, unlink: bool = False):
+        self._slot_buffer.release()
+        self._tick_buffer.release()
+        self._slot_memory.close()
+        self._tick_memory.close()
+        if unlink:
+            self._slot_memory.unlink()
+            self._tick_memory.unlink()
+
+    def _read_slot(self, slot: int) -> SlotRecord:
+        offset = slot * _SLOT.size
+        while True:
+            record = SlotRecord._make(_SLOT.unpack_from(self._slot_buffer, offset))
+            if record.seq & 1:
+                continue
+            if _SEQ.unpack_from(self._slot_buffer, offset)[0] == record.seq:
+                return record
+
+    def _write_slot(
+        self,
+        slot: int,
+        block_number: int,
+        kind: int,
+        tick: int,
+        tick_version: int,
+        tick_offset: int,
+        tick_count: int,
+        value0: int,
+        value1: int,
+    ):
+        offset = slot * _SLOT.size
+        seq = _SEQ.unpack_from(self._slot_buffer, offset)[0]
+        _SEQ.pack_into(self._slot_buffer, offset, seq + 1)
+        _SLOT.pack_into(
+            self._slot_buffer,
+            offset,
+            seq + 1,
+            block_number,
+            kind,
+            tick,
+            tick_version,
+            tick_offset,
+            tick_count,
+            value0.to_bytes(32, "little"),
+            value1.to_bytes(32, "little"),
+        )
+        _SEQ.pack_into(self._slot_buffer, offset, seq + 2)
+
+    def _store_ticks(self, slot: int, blob: bytes) -> int:
+        if self._tick_cursor + len(blob) > self._tick_half_size:
+            self._compact_ticks(skip_slot=slot)
+        if self._tick_cursor + len(blob) > self._tick_half_size:
+            log.error(f"(SharedPoolStateTable) No room for {len(blob)} bytes of tick liquidity")
+            return -1
+
+        offset = self._tick_half * self._tick_half_size + self._tick_cursor
+        self._tick_buffer[offset : offset + len(blob)] = blob
+        self._tick_cursor += len(blob)
+        return offset
+
+    def _compact_ticks(self, skip_slot: int):
+        # Copies the current ticks of every pool to the other half, which is only written
+        # again by the next compaction
+        self._tick_half ^= 1
+        self._tick_cursor = 0
+
+        for slot, blob in self._tick_blobs.items():
+            if slot == skip_slot:
+                continue
+            current = self._read_slot(slot)
+            tick_offset = self._store_ticks(slot, blob) if self._tick_cursor + len(blob) <= self._tick_half_size else -1
+            self._write_slot(
+                slot,
+                current.block,
+                current.kind,
+                current.tick,
+                current.tick_version,
+                tick_offset,
+                current.tick_count,
+                int.from_bytes(current.value0, "little"),
+                int.from_bytes(current.value1, "little"),
+            )
+
+        log.info(
+            f"(SharedPoolStateTable) Compacted tick liquidity of {len(self._tick_blobs)} pools "
+            f"into {self._tick_cursor / 2**20:.1f} MB"
+        )
+
+    @staticmethod
+    def _decode_ticks(tick_rows: bytes, tick_spacing: int, block_number: int):
+        tick_data: Dict[int, UniswapV3LiquidityAtTick] = {}
+        bitmaps: Dict[int, int] = {}
+
+        for tick, liquidity_net, liquidity_gross in _TICK.iter_unpack(tick_rows):
+            tick_data[tick] = UniswapV3LiquidityAtTick(
+                liquidityNet=int.from_bytes(liquidity_net, "little", signed=True),
+                liquidityGross=int.from_bytes(liquidity_gross, "little"),
+                block=block_number,
+            )
+            word, bit = divmod(tick // tick_spacing, 256)
+            bitmaps[word] = bitmaps.get(word, 0) | (1 << bit)
+
+        tick_bitmap = {
+            word: UniswapV3BitmapAtWord(bitmap=bitmap, block=block_number)
+            for word, bitmap in bitmaps.items()
+        }
+        return tick_data, tick_bitmap
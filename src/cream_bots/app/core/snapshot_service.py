@@ -0,0 +1,461 @@
+import asyncio
+import degenbot
+import json
+import os
+from pathlib import Path
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from degenbot.uniswap.v3_types import (
+    UniswapV3BitmapAtWord,
+    UniswapV3LiquidityAtTick,
+    UniswapV3LiquidityEvent,
+)
+
+from ...config.constants import SNAPSHOT_FLUSH_INTERVAL, TICKSPACING_BY_FEE
+from ...config.logging import logger
+
+log = logger(__name__)
+
+
+class SnapshotService:
+    def __init__(self, bot_state, snapshot_path: Union[str, Path]):
+        """
+        Keeps the V3 liquidity snapshot current and periodically writes it back to disk.
+
+        Liquidity events only copy the ticks (and bitmap words) they touched into the snapshot and
+        mark the pool dirty. Every pool is serialized to its own JSON fragment once, and a flush
+        only re-serializes the dirty pools before joining the cached fragments and writing the
+        file in a worker thread. Flushes happen at block boundaries, so the file always matches
+        `snapshot_block` exactly and a restart only replays the blocks after it.
+
+        The incremental updates work on the private maps of `UniswapV3LiquiditySnapshot`
+        (`_liquidity_snapshot` and `_liquidity_events`). If a degenbot version doesn't have
+        them, every change goes through the public `update_snapshot` with the pool's full tick
+        maps instead, so the snapshot keeps being written, only more slowly.
+
+        Args:
+            bot_state: The shared bot state.
+            snapshot_path (Union[str, Path]): The `{chain}_v3_liquidity_snapshot.json` file.
+        """
+        self.bot_state = bot_state
+        self.snapshot_path = Path(snapshot_path)
+
+        self.dirty_pools: Set[str] = set()
+        self.flush_interval: float = SNAPSHOT_FLUSH_INTERVAL
+        self.flushed_block: Optional[int] = None
+        self.last_event_block: Optional[int] = None
+        self.tick_spacings: Dict[str, int] = {}
+        self.unresolved_pools: Set[str] = set()
+
+        snapshot = bot_state.snapshot
+        self.incremental: bool = isinstance(
+            getattr(snapshot, "_liquidity_snapshot", None), dict
+        ) and isinstance(getattr(snapshot, "_liquidity_events", None), dict)
+        if not self.incremental:
+            log.warning(
+                "UniswapV3LiquiditySnapshot has no _liquidity_snapshot or _liquidity_events, "
+                "falling back to full snapshot updates"
+            )
+
+        self._fragments: Dict[str, str] = {}
+        # Liquidity events of pools without a helper, when the snapshot's own queue can't be used
+        self._queued_events: Dict[str, List[UniswapV3LiquidityEvent]] = {}
+        self._fragments_ready: bool = False
+        self._next_flush: float = time.monotonic() + self.flush_interval
+        self._write_task: Optional[asyncio.Task] = None
+
+        log.info(f"SnapshotService initialized with app instance at {id(self.bot_state)}")
+
+    def register_pool(self, pool_address: str, fee: int):
+        """
+        Records the tick spacing of a V3 pool, needed to update the snapshot of pools that have
+        no helper.
+
+        Args:
+            pool_address (str): The address of the pool.
+            fee (int): The pool fee, in hundredths of a bip.
+        """
+        try:
+            self.tick_spacings[pool_address] = TICKSPACING_BY_FEE[fee]
+        except KeyError:
+            pass
+
+    def record_liquidity_change(
+        self,
+        pool_address: str,
+        block_number: int,
+        liquidity: int,
+        tick_lower: int,
+        tick_upper: int,
+        pool_helper: Optional[degenbot.V3LiquidityPool] = None,
+    ):
+        """
+        Applies a Mint or Burn to the snapshot.
+
+        With a helper, the liquidity change has already been applied to it and the touched ticks
+        are copied from it. Without one, the change is either queued for the helper that will be
+        built for the pool while pools are still loading, or applied to the snapshot directly.
+
+        Args:
+            pool_address (str): The address of the pool.
+            block_number (int): The block of the event.
+            liquidity (int): The liquidity change, negative for a Burn.
+            tick_lower (int): The lower tick of the position.
+            tick_upper (int): The upper tick of the position.
+            pool_helper (Optional[degenbot.V3LiquidityPool]): The pool helper, if there is one.
+        """
+        snapshot = self.bot_state.snapshot
+
+        if pool_helper is not None:
+            if pool_helper._sparse_bitmap:
+                # A sparse helper does not know the full liquidity map, so it can't be persisted
+                return
+            if not self.incremental:
+                snapshot.update_snapshot(
+                    pool=pool_address,
+                    tick_bitmap=pool_helper.tick_bitmap,
+                    tick_data=pool_helper.tick_data,
+                )
+                self.dirty_pools.add(pool_address)
+                return
+            pool_snapshot = snapshot._liquidity_snapshot.get(pool_address)
+            if not pool_snapshot:
+                snapshot._liquidity_snapshot[pool_address] = {
+                    "tick_bitmap": dict(pool_helper.tick_bitmap),
+                    "tick_data": dict(pool_helper.tick_data),
+                }
+            else:
+                self._copy_ticks(pool_snapshot, pool_helper, (tick_lower, tick_upper))
+
+        elif not self.bot_state.pools_loaded:
+            # Helpers built while loading apply these through get_new_liquidity_updates, when
+            # they can be queued on the snapshot
+            self._pending_events().setdefault(pool_address, []).append(
+                UniswapV3LiquidityEvent(
+                    block_number=block_number,
+                    liquidity=liquidity,
+                    tick_lower=tick_lower,
+                    tick_upper=tick_upper,
+                    tx_index=0,
+                )
+            )
+            return
+
+        else:
+            if self._pending_events().get(pool_address):
+                self._fold_pending_events(pool_address)
+            if not self._apply_liquidity_change(pool_address, block_number, liquidity, tick_lower, tick_upper):
+                return
+
+        self.dirty_pools.add(pool_address)
+
+    def mark_block(self, block_number: int):
+        """
+        Records the block of an incoming event, before it is processed. The first event of a new
+        block means the previous one is complete, which is when a due flush is started.
+
+        Args:
+            block_number (int): The block of the event.
+        """
+        last_event_block = self.last_event_block
+        if last_event_block is not None and block_number > last_event_block:
+            if time.monotonic() >= self._next_flush:
+                self.flush(last_event_block)
+        if last_event_block is None or block_number > last_event_block:
+            self.last_event_block = block_number
+
+    def flush(self, block_number: int):
+        """
+        Serializes the dirty pools, assembles the snapshot as of `block_number` and writes it in
+        the background. Must only be called once every event up to `block_number` is applied.
+
+        Args:
+            block_number (int): The newest complete block.
+        """
+        if not self._fragments_ready:
+            return
+        if self._write_task is not None and not self._write_task.done():
+            return
+        if self.flushed_block is not None and block_number <= self.flushed_block:
+            return
+        if block_number <= self.bot_state.snapshot.newest_block:
+            return
+
+        self._next_flush = time.monotonic() + self.flush_interval
+
+        if self.unresolved_pools:
+            log.warning(
+                f"Not writing liquidity snapshot, {len(self.unresolved_pools)} pools have "
+                f"liquidity events but no known tick spacing"
+            )
+            return
+
+        start = time.perf_counter()
+        dirty_pools = len(self.dirty_pools)
+        for pool_address in self.dirty_pools:
+            self._cache_fragment(pool_address)
+        self.dirty_pools.clear()
+
+        fragments = list(self._fragments.values())
+        fragments.append(f'"snapshot_block":{block_number}')
+        document = "{" + ",".join(fragments) + "}"
+
+        log.info(
+            f"Serialized liquidity snapshot @ block {block_number} "
+            f"({dirty_pools} dirty pools) in {time.perf_counter() - start:.3f}s"
+        )
+
+        # The checkpoint is only kept once the snapshot is written, so they match the same block
+        checkpoint_pid = None
+        checkpoint_service = self.bot_state.checkpoint_service
+        if checkpoint_service is not None and checkpoint_service.due():
+            checkpoint_pid = checkpoint_service.fork(block_number)
+
+        self._write_task = asyncio.create_task(self._write(document, block_number, checkpoint_pid))
+
+    async def start(self):
+        """
+        Waits for the pools to load, applies the liquidity events that no helper consumed, copies
+        the tick maps of the routed V3 helpers into the snapshot and serializes every pool once, in small steps so events keep being processed. Pools changed
+        in the meantime are dirty and get serialized again by the first flush.
+        """
+        while not self.bot_state.pools_loaded:
+            await asyncio.sleep(1)
+
+        snapshot = self.bot_state.snapshot
+
+        if self.incremental:
+            snapshot_pools = list(snapshot._liquidity_snapshot)
+        else:
+            # Only the pools of the LP files can be listed, and their catch-up events read
+            snapshot_pools = list(self.tick_spacings)
+            for pool_address in snapshot_pools:
+                if pool_address in self.bot_state.pool_routes:
+                    continue
+                for update in snapshot.get_new_liquidity_updates(pool_address):
+                    liquidity, tick_lower, tick_upper = update.liquidity_change
+                    self._queued_events.setdefault(pool_address, []).append(
+                        UniswapV3LiquidityEvent(
+                            block_number=update.block_number,
+                            liquidity=liquidity,
+                            tick_lower=tick_lower,
+                            tick_upper=tick_upper,
+                            tx_index=0,
+                        )
+                    )
+
+        pending_events = self._pending_events()
+        for pool_address in list(pending_events):
+            if pending_events[pool_address] and self._fold_pending_events(pool_address):
+                self.dirty_pools.add(pool_address)
+
+        # Routed helpers consumed their catch-up events into their own copies of the tick maps
+        for pool_address in self._seed_from_helpers():
+            if pool_address not in snapshot_pools:
+                snapshot_pools.append(pool_address)
+
+        start = time.perf_counter()
+        for i, pool_address in enumerate(snapshot_pools):
+            self._cache_fragment(pool_address)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+        self._fragments_ready = True
+        log.info(
+            f"Serialized {len(self._fragments)} pools for the liquidity snapshot "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def _apply_liquidity_change(
+        self,
+        pool_address: str,
+        block_number: int,
+        liquidity: int,
+        tick_lower: int,
+        tick_upper: int,
+    ) -> bool:
+        """
+        Applies a liquidity change to the snapshot the way the pool contract updates its ticks:
+        liquidityGross changes by the amount at both ticks, liquidityNet by +amount at the lower
+        tick and -amount at the upper tick, and a tick's bitmap bit flips when its gross liquidity
+        goes to or from zero.
+
+        Returns:
+            bool: Whether the change was applied.
+        """
+        snapshot = self.bot_state.snapshot
+
+        try:
+            tick_spacing = self.tick_spacings[pool_address]
+        except KeyError:
+            # Pools outside the LP files are not in the snapshot either, only a snapshot pool
+            # that can't be updated makes the file stale
+            if (
+                snapshot.get_tick_data(pool_address) or snapshot.get_tick_bitmap(pool_address)
+            ) and pool_address not in self.unresolved_pools:
+                log.warning(f"No tick spacing for {pool_address}, liquidity snapshot can't be updated")
+                self.unresolved_pools.add(pool_address)
+            return False
+
+        tick_data, tick_bitmap = self._pool_maps(pool_address)
+
+        for tick, net_change in ((tick_lower, liquidity), (tick_upper, -liquidity)):
+            current = tick_data.get(tick)
+            gross_before = current.liquidityGross if current else 0
+            gross_after = gross_before + liquidity
+            net_after = (current.liquidityNet if current else 0) + net_change
+
+            if gross_after == 0:
+                tick_data.pop(tick, None)
+            else:
+                tick_data[tick] = UniswapV3LiquidityAtTick(
+                    liquidityNet=net_after,
+                    liquidityGross=gross_after,
+                    block=block_number,
+                )
+
+            if (gross_before == 0) != (gross_after == 0):
+                word, bit = divmod(tick // tick_spacing, 256)
+                current_word = tick_bitmap.get(word)
+                tick_bitmap[word] = UniswapV3BitmapAtWord(
+                    bitmap=(current_word.bitmap if current_word else 0) ^ (1 << bit),
+                    block=block_number,
+                )
+
+        if not self.incremental:
+            snapshot.update_snapshot(pool=pool_address, tick_data=tick_data, tick_bitmap=tick_bitmap)
+        return True
+
+    def _pool_maps(
+        self, pool_address: str
+    ) -> Tuple[Dict[int, UniswapV3LiquidityAtTick], Dict[int, UniswapV3BitmapAtWord]]:
+        # The snapshot's own tick maps, or copies of them to pass to update_snapshot
+        snapshot = self.bot_state.snapshot
+        if not self.incremental:
+            return dict(snapshot.get_tick_data(pool_address)), dict(snapshot.get_tick_bitmap(pool_address))
+
+        pool_snapshot = snapshot._liquidity_snapshot.get(pool_address)
+        if not pool_snapshot:
+            pool_snapshot = snapshot._liquidity_snapshot[pool_address] = {
+                "tick_bitmap": {},
+                "tick_data": {},
+            }
+        return pool_snapshot.setdefault("tick_data", {}), pool_snapshot.setdefault("tick_bitmap", {})
+
+    def _pending_events(self) -> Dict[str, List[UniswapV3LiquidityEvent]]:
+        if self.incremental:
+            return self.bot_state.snapshot._liquidity_events
+        return self._queued_events
+
+    def _seed_from_helpers(self) -> List[str]:
+        # Replaces the snapshot's tick maps with the helper's where they differ, and returns the
+        # pools that changed
+        snapshot = self.bot_state.snapshot
+        seeded_pools = []
+        for pool_address, pool_route in self.bot_state.pool_routes.items():
+            pool_helper = pool_route.pool_helper
+            if not isinstance(pool_helper, degenbot.V3LiquidityPool) or pool_helper._sparse_bitmap:
+                continue
+            if (
+                snapshot.get_tick_bitmap(pool_address) == pool_helper.tick_bitmap
+                and snapshot.get_tick_data(pool_address) == pool_helper.tick_data
+            ):
+                continue
+
+            if self.incremental:
+                snapshot._liquidity_snapshot[pool_address] = {
+                    "tick_bitmap": dict(pool_helper.tick_bitmap),
+                    "tick_data": dict(pool_helper.tick_data),
+                }
+            else:
+                snapshot.update_snapshot(
+                    pool=pool_address,
+                    tick_bitmap=pool_helper.tick_bitmap,
+                    tick_data=pool_helper.tick_data,
+                )
+            self.dirty_pools.add(pool_address)
+            seeded_pools.append(pool_address)
+        return seeded_pools
+
+    def _copy_ticks(self, pool_snapshot: Dict, pool_helper: degenbot.V3LiquidityPool, ticks):
+        tick_data = pool_snapshot.setdefault("tick_data", {})
+        tick_bitmap = pool_snapshot.setdefault("tick_bitmap", {})
+        helper_tick_data = pool_helper.tick_data
+        helper_tick_bitmap = pool_helper.tick_bitmap
+
+        for tick in ticks:
+            try:
+                tick_data[tick] = helper_tick_data[tick]
+            except KeyError:
+                tick_data.pop(tick, None)
+
+            word = (tick // pool_helper.tick_spacing) >> 8
+            try:
+                tick_bitmap[word] = helper_tick_bitmap[word]
+            except KeyError:
+                tick_bitmap.pop(word, None)
+
+    def _fold_pending_events(self, pool_address: str) -> bool:
+        pending_events = sorted(
+            self._pending_events()[pool_address],
+            key=lambda event: (event.block_number, event.tx_index),
+        )
+        self._pending_events()[pool_address] = []
+
+        applied = False
+        for event in pending_events:
+            applied |= self._apply_liquidity_change(
+                pool_address,
+                event.block_number,
+                event.liquidity,
+                event.tick_lower,
+                event.tick_upper,
+            )
+        return applied
+
+    def _cache_fragment(self, pool_address: str):
+        # Liquidity values exceed 64 bits, so this uses the standard library encoder
+        snapshot = self.bot_state.snapshot
+        tick_bitmap = snapshot.get_tick_bitmap(pool_address)
+        tick_data = snapshot.get_tick_data(pool_address)
+        if not tick_bitmap and not tick_data:
+            # Placeholder for a pool that only had catch-up events, the builder skips these too
+            self._fragments.pop(pool_address, None)
+            return
+
+        fragment = {
+            "tick_bitmap": {
+                str(word): value.to_dict() for word, value in tick_bitmap.items() if value.bitmap
+            },
+            "tick_data": {str(tick): value.to_dict() for tick, value in tick_data.items()},
+        }
+        self._fragments[pool_address] = f'"{pool_address}":{json.dumps(fragment, separators=(",", ":"))}'
+
+    async def _write(self, document: str, block_number: int, checkpoint_pid: Optional[int] = None):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_file, document)
+        except Exception as exc:
+            log.error(f"(SnapshotService) Failed to write liquidity snapshot: {exc}")
+            if checkpoint_pid is not None:
+                await self.bot_state.checkpoint_service.finish(checkpoint_pid, block_number, keep=False)
+            return
+
+        self.flushed_block = block_number
+        log.info(
+            f"Wrote liquidity snapshot @ block {block_number} to {self.snapshot_path.name} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+        if checkpoint_pid is not None:
+            try:
+                await self.bot_state.checkpoint_service.finish(checkpoint_pid, block_number)
+            except Exception as exc:
+                log.error(f"(SnapshotService) Failed to write checkpoint: {exc}")
+
+    def _write_file(self, document: str):
+        temp_path = self.snapshot_path.with_suffix(".json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(document)
+        os.replace(temp_path, self.snapshot_path)
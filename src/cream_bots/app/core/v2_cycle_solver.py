@@ -0,0 +1,172 @@
+from collections import defaultdict
+import degenbot
+from fractions import Fraction
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from degenbot.arbitrage.uniswap_lp_cycle import (
+    ArbitrageCalculationResult,
+    UniswapLpCycle,
+)
+
+from .marginal_rate_filter import swap_directions
+from ...config.logging import logger
+
+log = logger(__name__)
+
+
+class V2CycleSolver:
+    def __init__(self):
+        """
+        Solves arbs made only of Uniswap V2 pools in closed form, in the main process.
+
+        A V2 swap maps an input x to `g * x * R_out / (R_in + g * x)`, where g is one minus the
+        fee. A chain of such maps has the same form, `A * x / (B + C * x)`, so the profit of a
+        whole cycle is maximal at `x = (sqrt(A * B) - B) / C`, and only cycles with `A > B`
+        (a marginal rate above 1) can be profitable. The coefficients of every affected cycle
+        are computed together with NumPy, then the optimum of each candidate is checked with
+        the exact integer swap math of the pools.
+        """
+        # Swap directions and fees by arb id, None for arbs with other pool types
+        self._paths: Dict[str, Optional[Tuple[Tuple[bool, ...], Tuple[Fraction, ...]]]] = {}
+
+    def supports(self, arb_helper: UniswapLpCycle) -> bool:
+        return self._path(arb_helper) is not None
+
+    def solve(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        override_state=None,
+    ) -> List[ArbitrageCalculationResult]:
+        """
+        Finds the optimal input of V2 arbs and returns the profitable results.
+
+        Args:
+            arb_helpers (List[UniswapLpCycle]): Arbs for which `supports` is True.
+            override_state: Pool state overrides, as for `UniswapLpCycle.calculate_with_pool`.
+
+        Returns:
+            List[ArbitrageCalculationResult]: The results with a non-negative profit.
+        """
+        overrides = {
+            pool.address: getattr(state, "final_state", state)
+            for pool, state in override_state or ()
+        }
+
+        # Cycles of the same length are solved in one set of array operations
+        arbs_by_length: Dict[int, List[UniswapLpCycle]] = defaultdict(list)
+        for arb_helper in arb_helpers:
+            arbs_by_length[len(arb_helper.swap_pools)].append(arb_helper)
+
+        calculation_results: List[ArbitrageCalculationResult] = []
+        for arb_group in arbs_by_length.values():
+            calculation_results.extend(self._solve_group(arb_group, overrides))
+        return calculation_results
+
+    def _solve_group(
+        self,
+        arb_helpers: List[UniswapLpCycle],
+        overrides: Dict,
+    ) -> List[ArbitrageCalculationResult]:
+        num_arbs = len(arb_helpers)
+        num_pools = len(arb_helpers[0].swap_pools)
+
+        reserves_in = np.empty((num_arbs, num_pools))
+        reserves_out = np.empty((num_arbs, num_pools))
+        gammas = np.empty((num_arbs, num_pools))
+
+        for i, arb_helper in enumerate(arb_helpers):
+            zero_for_ones, fees = self._paths[arb_helper.id]
+            for k, (pool, zero_for_one, fee) in enumerate(
+                zip(arb_helper.swap_pools, zero_for_ones, fees)
+            ):
+                reserves0, reserves1 = self._reserves(pool, overrides)
+                if zero_for_one:
+                    reserves_in[i, k], reserves_out[i, k] = reserves0, reserves1
+                else:
+                    reserves_in[i, k], reserves_out[i, k] = reserves1, reserves0
+                gammas[i, k] = 1 - fee.numerator / fee.denominator
+
+        # Compose the swaps: (A, B, C) o (a, b, c) = (A * a, B * b, b * C + c * A)
+        a = np.ones(num_arbs)
+        b = np.ones(num_arbs)
+        c = np.zeros(num_arbs)
+        for k in range(num_pools):
+            c = reserves_in[:, k] * c + gammas[:, k] * a
+            a = a * gammas[:, k] * reserves_out[:, k]
+            b = b * reserves_in[:, k]
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            optimal_inputs = (np.sqrt(a) * np.sqrt(b) - b) / c
+        candidates = np.flatnonzero((a > b) & np.isfinite(optimal_inputs))
+
+        calculation_results: List[ArbitrageCalculationResult] = []
+        for i in candidates:
+            arb_helper = arb_helpers[i]
+            input_amount = int(min(optimal_inputs[i], arb_helper.max_input))
+            if input_amount < 1:
+                continue
+
+            profit_amount = self._amount_out(arb_helper, input_amount, overrides) - input_amount
+            if profit_amount < 0:
+                continue
+
+            try:
+                swap_amounts = arb_helper._build_amounts_out(
+                    token_in=arb_helper.input_token,
+                    token_in_quantity=input_amount,
+                    pool_state_overrides=overrides,
+                )
+            except Exception as exc:
+                log.info(f"(V2CycleSolver) {arb_helper.id}: {type(exc).__name__} - {exc}")
+                continue
+
+            calculation_results.append(
+                ArbitrageCalculationResult(
+                    id=arb_helper.id,
+                    input_token=arb_helper.input_token,
+                    profit_token=arb_helper.input_token,
+                    input_amount=input_amount,
+                    profit_amount=profit_amount,
+                    swap_amounts=swap_amounts,
+                )
+            )
+
+        return calculation_results
+
+    def _amount_out(self, arb_helper: UniswapLpCycle, input_amount: int, overrides: Dict) -> int:
+        # The integer math of UniswapV2Pair.getAmountOut, pool by pool
+        zero_for_ones, fees = self._paths[arb_helper.id]
+        amount = input_amount
+        for pool, zero_for_one, fee in zip(arb_helper.swap_pools, zero_for_ones, fees):
+            reserves0, reserves1 = self._reserves(pool, overrides)
+            reserves_in, reserves_out = (reserves0, reserves1) if zero_for_one else (reserves1, reserves0)
+            amount_in_with_fee = amount * (fee.denominator - fee.numerator)
+            amount = amount_in_with_fee * reserves_out // (reserves_in * fee.denominator + amount_in_with_fee)
+        return amount
+
+    def _path(self, arb_helper: UniswapLpCycle):
+        try:
+            return self._paths[arb_helper.id]
+        except KeyError:
+            pass
+
+        path = None
+        # Subclasses (e.g. Camelot stable pools) use different swap math
+        if all(type(pool) is degenbot.LiquidityPool for pool in arb_helper.swap_pools):
+            zero_for_ones = swap_directions(arb_helper)
+            fees = tuple(
+                pool.fee_token0 if zero_for_one else pool.fee_token1
+                for pool, zero_for_one in zip(arb_helper.swap_pools, zero_for_ones)
+            )
+            path = (zero_for_ones, fees)
+
+        self._paths[arb_helper.id] = path
+        return path
+
+    @staticmethod
+    def _reserves(pool: degenbot.LiquidityPool, overrides: Dict) -> Tuple[int, int]:
+        state = overrides.get(pool.address)
+        if state is None:
+            return pool.reserves_token0, pool.reserves_token1
+        return state.reserves_token0, state.reserves_token1
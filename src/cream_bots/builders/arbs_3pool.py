@@ -5,17 +5,22 @@ import os
 from pathlib import Path
 import sys
 import time
-import ujson
 import web3
 
 from cream_chains import chain_data as cream_chains_data
 
+from ..config.arb_catalog import dump_arb_catalog
+from ..config.helpers import dump_json_file, load_json_file
+
 
 def main():
     parser = argparse.ArgumentParser(description="3-pool Arb Path Builder")
     parser.add_argument(
         "chain_name", type=str, nargs="?", help="The name of the chain", default=None
     )
+    parser.add_argument(
+        "--json", action="store_true", help="Also write the arb paths as JSON"
+    )
     args = parser.parse_args()
 
     if args.chain_name:
@@ -54,22 +59,20 @@ def main():
         for name, _ in v2_factories.items():
             lp_file = chain_data_dir / f"{chain_name}_{name}_v2.json"
             print(f"Loading {lp_file}")
-            with open(lp_file) as file:
-                for pool in ujson.load(file):
-                    v2_lp_data[pool.get("pool_address")] = {
-                        key: value for key, value in pool.items() if key != "pool_id"
-                    }
+            for pool in load_json_file(lp_file):
+                v2_lp_data[pool.get("pool_address")] = {
+                    key: value for key, value in pool.items() if key != "pool_id"
+                }
         print(f"Found {len(v2_lp_data)} V2 pools")
 
         v3_lp_data = {}
         for name, _ in v3_factories.items():
             lp_file = chain_data_dir / f"{chain_name}_{name}_v3.json"
             print(f"Loading {lp_file}")
-            with open(lp_file) as file:
-                for pool in ujson.load(file):
-                    v3_lp_data[pool.get("pool_address")] = {
-                        key: value for key, value in pool.items() if key != "pool_id"
-                    }
+            for pool in load_json_file(lp_file):
+                v3_lp_data[pool.get("pool_address")] = {
+                    key: value for key, value in pool.items() if key != "pool_id"
+                }
         print(f"Found {len(v3_lp_data)} V3 pools")
 
         # all_v2_pools = set(v2_lp_data.keys())
@@ -215,11 +218,14 @@ def main():
         print(
             f"Found {len(three_pool_arb_paths)} unique three-pool arbitrage paths in {time.monotonic() - start_timer:.5f}s"
         )
-        print("• Saving pool data to JSON")
-        arbs_file = chain_data_dir / f"{chain_name}_arb_paths_3.json"
-
-        with open(arbs_file, "w") as file:
-            ujson.dump(three_pool_arb_paths, file, indent=4)
+        print("• Saving arb catalog")
+        catalog_file = chain_data_dir / f"{chain_name}_arb_paths_3.bin"
+        dump_arb_catalog(catalog_file, three_pool_arb_paths)
+
+        if args.json:
+            print("• Saving pool data to JSON")
+            arbs_file = chain_data_dir / f"{chain_name}_arb_paths_3.json"
+            dump_json_file(arbs_file, three_pool_arb_paths)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,11 @@
 import argparse
 import degenbot
 from pathlib import Path
-import ujson
 import web3
 
 from threading import Lock
 from tqdm import tqdm
 from typing import Dict
-from web3._utils.events import get_event_data
 from web3._utils.filters import construct_event_filter_params
 
 from degenbot.uniswap.v3_types import (
@@ -19,20 +17,13 @@ from degenbot.uniswap.v3_types import (
 
 from cream_chains import chain_data as cream_chains_data
 
+from ..config import decoders
+from ..config.constants import TICKSPACING_BY_FEE
+from ..config.helpers import dump_json_file, load_json_file
+
 UNISWAPV3_START_BLOCK = 1000
 BLOCK_SPAN = 10_000
 
-TICKSPACING_BY_FEE: Dict = {
-    100: 1,
-    200: 4,
-    300: 6,
-    400: 8,
-    500: 10,
-    2500: 50,
-    3000: 60,
-    10000: 200,
-}
-
 
 class MockV3LiquidityPool(degenbot.V3LiquidityPool):
     def __init__(self):
@@ -95,8 +86,7 @@ def main():
 
         for path in paths:
             if path.exists():
-                with open(path) as file:
-                    l = ujson.load(file)
+                l = load_json_file(path)
                 for lp in l:
                     lp_data[lp["pool_address"]] = lp
             else:
@@ -104,8 +94,7 @@ def main():
                 return
 
         try:
-            with open(snapshot_file, "r") as file:
-                json_liquidity_snapshot = ujson.load(file)
+            json_liquidity_snapshot = load_json_file(snapshot_file, exact_ints=True)
         except:
             snapshot_last_block = None
         else:
@@ -146,6 +135,7 @@ def main():
             done = False
 
             event_abi = event._get_event_abi()
+            is_burn = event.event_name == "Burn"
 
             while not done:
                 end_block = min(newest_block, start_block + block_span)
@@ -164,17 +154,17 @@ def main():
                     block_span = int(0.75 * block_span)
                     continue
 
-                for event in event_logs:
-                    decoded_event = get_event_data(w3.codec, event_abi, event)
-
-                    pool_address = decoded_event["address"]
-                    block = decoded_event["blockNumber"]
-                    tx_index = decoded_event["transactionIndex"]
-                    liquidity = decoded_event["args"]["amount"] * (
-                        -1 if decoded_event["event"] == "Burn" else 1
-                    )
-                    tick_lower = decoded_event["args"]["tickLower"]
-                    tick_upper = decoded_event["args"]["tickUpper"]
+                for log in event_logs:
+                    pool_address = log["address"]
+                    block = log["blockNumber"]
+                    tx_index = log["transactionIndex"]
+                    tick_lower = decoders.decode_int_topic(log["topics"][2])
+                    tick_upper = decoders.decode_int_topic(log["topics"][3])
+                    if is_burn:
+                        amount, _, _ = decoders.decode_v3_burn(decoders.to_bytes(log["data"]))
+                        liquidity = -amount
+                    else:
+                        liquidity, _, _ = decoders.decode_v3_mint(decoders.to_bytes(log["data"]))
 
                     if liquidity == 0:
                         continue
@@ -310,14 +300,8 @@ def main():
 
         liquidity_snapshot["snapshot_block"] = newest_block
 
-        with open(snapshot_file, "w") as file:
-            ujson.dump(
-                liquidity_snapshot,
-                file,
-                indent=2,
-                sort_keys=True,
-            )
-            print("Writing LP snapshot")
+        dump_json_file(snapshot_file, liquidity_snapshot, sort_keys=True)
+        print("Writing LP snapshot")
 
 
 if __name__ == "__main__":
@@ -2,12 +2,13 @@ import argparse
 from pathlib import Path
 import signal
 import time
-import ujson
 import web3
 
 from cream_chains import chain_data as cream_chains_data
 from cream_chains.abis import UNISWAP_V2_FACTORY_ABI
 
+from ..config.helpers import dump_json_file, load_json_file
+
 # Maximum blocks to process with getLogs
 BLOCK_SPAN = 10_000
 keep_running = True
@@ -66,8 +67,7 @@ def main():
 
             # See if we have an existing file
             if data_file.exists():
-                with open(data_file) as file:
-                    lp_data = ujson.load(file)
+                lp_data = load_json_file(data_file)
             else:
                 lp_data = []
 
@@ -119,8 +119,7 @@ def main():
                         )
 
                 # Save them to the file
-                with open(data_file, "w") as file:
-                    ujson.dump(lp_data, file, indent=4)
+                dump_json_file(data_file, lp_data)
 
                 print(
                     f"• Found {len(lp_data) - previously_found_pools} new pools up to block {end_block}"
@@ -131,8 +130,7 @@ def main():
 
             if not keep_running:
                 # Final save before exiting
-                with open(data_file, "w") as file:
-                    ujson.dump(lp_data, file, indent=4)
+                dump_json_file(data_file, lp_data)
                 print(f"Final data saved to {data_file}.")
 
 
@@ -0,0 +1,169 @@
+import numpy as np
+from pathlib import Path
+import struct
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+from .helpers import json_dumps, json_loads
+
+ARB_CATALOG_MAGIC = b"CRMARBS1"
+# magic, header length
+ARB_CATALOG_PREAMBLE = struct.Struct("<8sI")
+ARB_CATALOG_ALIGNMENT = 64
+
+POOL_TYPES = ("UniswapV2", "UniswapV3")
+POOL_DTYPE = np.dtype(
+    [
+        ("address", "S42"),
+        ("token0", "<u4"),
+        ("token1", "<u4"),
+        ("fee", "<u4"),
+        ("type", "u1"),
+    ]
+)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ARB_CATALOG_ALIGNMENT) * ARB_CATALOG_ALIGNMENT
+
+
+def dump_arb_catalog(path: Union[str, Path], arb_paths: Dict[str, Dict]):
+    """
+    Writes arb paths, as built by the arb builders, to a binary catalog.
+
+    The catalog holds a token table, a pool table whose rows reference the token table, one
+    row of pool indices per arb and the raw 32-byte arb ids. Each table is stored as a flat
+    array at an aligned offset described by a JSON header, so `ArbCatalog` can map it without
+    parsing.
+
+    Args:
+        path (Union[str, Path]): The `{chain}_arb_paths_{n}.bin` file.
+        arb_paths (Dict[str, Dict]): The arbs by id, with their `path` and `pools`. Every path
+            must have the same length.
+    """
+    path_lengths = {len(arb["path"]) for arb in arb_paths.values()}
+    if len(path_lengths) > 1:
+        raise ValueError(f"Arb paths of different lengths: {sorted(path_lengths)}")
+    path_length = path_lengths.pop() if path_lengths else 0
+
+    token_indices: Dict[str, int] = {}
+    pool_indices: Dict[str, int] = {}
+    pool_rows: List[Tuple] = []
+    ids = np.empty((len(arb_paths), 32), dtype=np.uint8)
+    paths = np.empty((len(arb_paths), path_length), dtype="<u4")
+    id_prefixes = set()
+
+    for i, (arb_id, arb) in enumerate(arb_paths.items()):
+        id_prefixes.add(arb_id[:2] == "0x")
+        ids[i] = np.frombuffer(bytes.fromhex(arb_id.removeprefix("0x")), dtype=np.uint8)
+
+        for j, pool_address in enumerate(arb["path"]):
+            pool_index = pool_indices.get(pool_address)
+            if pool_index is None:
+                pool = arb["pools"][pool_address]
+                pool_index = pool_indices[pool_address] = len(pool_rows)
+                pool_rows.append(
+                    (
+                        pool_address.encode(),
+                        token_indices.setdefault(pool["token0"], len(token_indices)),
+                        token_indices.setdefault(pool["token1"], len(token_indices)),
+                        pool.get("fee") or 0,
+                        POOL_TYPES.index(pool["type"]),
+                    )
+                )
+            paths[i, j] = pool_index
+
+    sections = {
+        "tokens": np.array([token.encode() for token in token_indices], dtype="S42"),
+        "pools": np.array(pool_rows, dtype=POOL_DTYPE),
+        "paths": paths,
+        "ids": ids,
+    }
+
+    layout = {}
+    offset = 0
+    for name, array in sections.items():
+        offset = _aligned(offset)
+        layout[name] = {
+            "offset": offset,
+            "descr": np.lib.format.dtype_to_descr(array.dtype),
+            "shape": list(array.shape),
+        }
+        offset += array.nbytes
+
+    header = json_dumps({"id_prefix": "0x" if id_prefixes != {False} else "", "sections": layout})
+    data_start = _aligned(ARB_CATALOG_PREAMBLE.size + len(header))
+
+    temp_path = Path(path).with_suffix(".bin.tmp")
+    with open(temp_path, "wb") as file:
+        file.write(ARB_CATALOG_PREAMBLE.pack(ARB_CATALOG_MAGIC, len(header)))
+        file.write(header)
+        for name, array in sections.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(array.tobytes())
+    temp_path.replace(path)
+
+
+class ArbCatalog:
+    def __init__(self, path: Union[str, Path]):
+        """
+        A memory-mapped arb catalog written by `dump_arb_catalog`. Opening it only reads the
+        header, the tables are paged in as they are used.
+
+        Args:
+            path (Union[str, Path]): The `{chain}_arb_paths_{n}.bin` file.
+        """
+        self.path = Path(path)
+
+        with open(self.path, "rb") as file:
+            magic, header_length = ARB_CATALOG_PREAMBLE.unpack(file.read(ARB_CATALOG_PREAMBLE.size))
+            if magic != ARB_CATALOG_MAGIC:
+                raise ValueError(f"{self.path.name} is not an arb catalog")
+            header = json_loads(file.read(header_length))
+        data_start = _aligned(ARB_CATALOG_PREAMBLE.size + header_length)
+
+        self.id_prefix: str = header["id_prefix"]
+
+        data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        sections = {}
+        for name, section in header["sections"].items():
+            dtype = np.lib.format.descr_to_dtype(section["descr"])
+            shape = tuple(section["shape"])
+            start = data_start + section["offset"]
+            count = int(np.prod(shape))
+            sections[name] = data[start : start + count * dtype.itemsize].view(dtype).reshape(shape)
+
+        self.tokens: np.ndarray = sections["tokens"]
+        self.pools: np.ndarray = sections["pools"]
+        self.paths: np.ndarray = sections["paths"]
+        self.ids: np.ndarray = sections["ids"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def arb_id(self, index: int) -> str:
+        return self.id_prefix + self.ids[index].tobytes().hex()
+
+    def pool_addresses(self) -> List[str]:
+        return [address.decode() for address in self.pools["address"]]
+
+    def iter_paths(self, pool_filter: Callable[[str], bool]) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Yields the arbs whose pools all pass `pool_filter`. The filter runs once per pool and
+        the arbs are selected in one vectorized pass.
+
+        Args:
+            pool_filter (Callable[[str], bool]): Whether a pool address can be used.
+
+        Yields:
+            Tuple[str, List[str]]: The arb id and the pool addresses of its path.
+        """
+        pool_addresses = self.pool_addresses()
+        usable_pools = np.fromiter(
+            (pool_filter(pool_address) for pool_address in pool_addresses),
+            dtype=bool,
+            count=len(pool_addresses),
+        )
+        usable_arbs = usable_pools[self.paths].all(axis=1) if len(self.paths) else np.zeros(0, dtype=bool)
+
+        for index in np.flatnonzero(usable_arbs):
+            yield self.arb_id(index), [pool_addresses[pool_index] for pool_index in self.paths[index]]
@@ -1,7 +1,44 @@
+BATCH_EVAL_MAX_CHUNK = 256
+BATCH_EVAL_MIN_CHUNK = 8
+BATCH_EVAL_TARGET_SECONDS = 0.025  # worker time per chunk the chunk size adapts to
+CALCULATION_CACHE_SIZE = 100_000  # arbs whose latest calculation result is kept
+CHECKPOINT_INTERVAL = 1800  # minimum seconds between state checkpoints, taken with liquidity snapshot flushes
+EVALUATE_ARBS_BY_BLOCK = False
+EVALUATION_MAX_IN_FLIGHT = 4  # arb evaluations running at once, see EvaluationScheduler
+EXECUTOR_WORKERS = 8
+GAS_ESTIMATE_BASE = 50_000  # gas of an arb transaction besides its swaps, keep the estimates on the low side
+GAS_ESTIMATE_V2_SWAP = 60_000
+GAS_ESTIMATE_V3_SWAP = 110_000
+JSON_BACKEND = None  # "orjson", "msgspec" or "ujson", None picks the fastest installed
+LAZY_POOL_HELPERS = False  # build pool and arb helpers on first use instead of at startup, see LazyCatalog
+MARGINAL_RATE_THRESHOLD = 1.0  # minimum product of the pool rates net of fees for an arb to be calculated
 MAX_INPUT = 4722 * 10**18
+MAX_INPUT_LIQUIDITY_MULTIPLE = 2.0  # max input of an arb, as a multiple of the input token liquidity of its first pool
+MAX_INPUT_REFRESH_RATIO = 1.5  # relative liquidity change of a first pool that updates the max input of its arbs
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+POOL_LOADER_BATCH_SIZE = 500  # calls per Multicall3 request when prefetching pool state at startup
+POOL_LOADER_CONCURRENCY = 8
 REDIS_HOST = "127.0.0.1"
 REDIS_PORT = 6379
+REDIS_STREAMS = False
+REDIS_STREAM_BATCH_SIZE = 100
+REDIS_STREAM_BLOCK_MS = 1000
 REDUCE_TRIANGLE_ARBS = True
+SHARED_POOL_STATE = False  # share pool states with the executor workers through shared memory
+SHARED_STATE_POOLS = 131_072
+SHARED_STATE_TICK_BYTES = 512 * 2**20
+SNAPSHOT_FLUSH_INTERVAL = 300  # seconds between liquidity snapshot writes
+TICKSPACING_BY_FEE = {
+    100: 1,
+    200: 4,
+    300: 6,
+    400: 8,
+    500: 10,
+    2500: 50,
+    3000: 60,
+    10000: 200,
+}
+V2_CLOSED_FORM_SOLVER = True  # solve arbs made only of V2 pools in the main process
 VERBOSE_EVENT_UPDATES = False
 VERBOSE_EVENT_PROCESSING = False
 VERBOSE_TRANSACTION_UPDATES = False
@@ -0,0 +1,137 @@
+"""
+Fixed-layout decoders for the raw logs the bots react to.
+
+Every field in these events is a single 32-byte ABI word, so the values can be sliced out
+at fixed offsets with `int.from_bytes` instead of going through `eth_abi.decode` and its
+type-string parsing. Signed fields (int24, int256) are sign-extended to the full word by the
+ABI encoder, so reading the whole word as a signed big-endian integer recovers the value.
+"""
+
+from eth_utils.address import to_checksum_address
+from typing import Tuple, Union
+
+WORD_SIZE = 32
+
+_INT256_SIGN_BIT = 1 << 255
+_UINT256_MODULUS = 1 << 256
+
+
+def to_bytes(data: Union[bytes, bytearray, memoryview, str]) -> bytes:
+    """
+    Converts a hex string (with or without the 0x prefix) or a bytes-like value to bytes.
+    """
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data[:2] in ("0x", "0X") else data)
+    return bytes(data)
+
+
+def _check_length(data: bytes, words: int):
+    if len(data) < words * WORD_SIZE:
+        raise ValueError(
+            f"Expected at least {words * WORD_SIZE} bytes of log data, got {len(data)}"
+        )
+
+
+def decode_int_topic(topic: Union[bytes, str]) -> int:
+    """
+    Decodes an indexed signed integer topic (e.g. the int24 ticks of a V3 Mint or Burn).
+    """
+    if isinstance(topic, str):
+        value = int(topic, 16)
+        return value - _UINT256_MODULUS if value >= _INT256_SIGN_BIT else value
+    return int.from_bytes(topic, "big", signed=True)
+
+
+def decode_sync(data: bytes) -> Tuple[int, int]:
+    """
+    Sync(uint112 reserve0, uint112 reserve1)
+
+    Returns:
+        Tuple[int, int]: reserve0, reserve1
+    """
+    _check_length(data, 2)
+    return (
+        int.from_bytes(data[0:32], "big"),
+        int.from_bytes(data[32:64], "big"),
+    )
+
+
+def decode_v3_swap(data: bytes) -> Tuple[int, int, int, int, int]:
+    """
+    Swap(address indexed sender, address indexed recipient, int256 amount0, int256 amount1,
+    uint160 sqrtPriceX96, uint128 liquidity, int24 tick)
+
+    Returns:
+        Tuple[int, int, int, int, int]: amount0, amount1, sqrtPriceX96, liquidity, tick
+    """
+    _check_length(data, 5)
+    return (
+        int.from_bytes(data[0:32], "big", signed=True),
+        int.from_bytes(data[32:64], "big", signed=True),
+        int.from_bytes(data[64:96], "big"),
+        int.from_bytes(data[96:128], "big"),
+        int.from_bytes(data[128:160], "big", signed=True),
+    )
+
+
+def decode_v3_mint(data: bytes) -> Tuple[int, int, int]:
+    """
+    Mint(address sender, address indexed owner, int24 indexed tickLower, int24 indexed tickUpper,
+    uint128 amount, uint256 amount0, uint256 amount1)
+
+    The `sender` word is skipped, which saves a checksum (keccak) per event.
+
+    Returns:
+        Tuple[int, int, int]: amount, amount0, amount1
+    """
+    _check_length(data, 4)
+    return (
+        int.from_bytes(data[32:64], "big"),
+        int.from_bytes(data[64:96], "big"),
+        int.from_bytes(data[96:128], "big"),
+    )
+
+
+def decode_v3_burn(data: bytes) -> Tuple[int, int, int]:
+    """
+    Burn(address indexed owner, int24 indexed tickLower, int24 indexed tickUpper,
+    uint128 amount, uint256 amount0, uint256 amount1)
+
+    Returns:
+        Tuple[int, int, int]: amount, amount0, amount1
+    """
+    _check_length(data, 3)
+    return (
+        int.from_bytes(data[0:32], "big"),
+        int.from_bytes(data[32:64], "big"),
+        int.from_bytes(data[64:96], "big"),
+    )
+
+
+def decode_pair_created(data: bytes) -> Tuple[str, int]:
+    """
+    PairCreated(address indexed token0, address indexed token1, address pair, uint256)
+
+    Returns:
+        Tuple[str, int]: pair, number of pairs
+    """
+    _check_length(data, 2)
+    return (
+        to_checksum_address(data[12:32]),
+        int.from_bytes(data[32:64], "big"),
+    )
+
+
+def decode_pool_created(data: bytes) -> Tuple[int, str]:
+    """
+    PoolCreated(address indexed token0, address indexed token1, uint24 indexed fee,
+    int24 tickSpacing, address pool)
+
+    Returns:
+        Tuple[int, str]: tickSpacing, pool
+    """
+    _check_length(data, 2)
+    return (
+        int.from_bytes(data[0:32], "big", signed=True),
+        to_checksum_address(data[44:64]),
+    )
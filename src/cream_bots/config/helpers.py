@@ -1,27 +1,255 @@
+import json
+from pathlib import Path
+from redis.exceptions import ResponseError
+from typing import Any, AsyncIterator, List, Optional, Union
 import ujson
 
+from .constants import (
+    JSON_BACKEND,
+    REDIS_STREAM_BATCH_SIZE,
+    REDIS_STREAM_BLOCK_MS,
+    REDIS_STREAMS,
+)
 from .logging import logger
 
 log = logger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _select_json_backend(preferred: Optional[str]) -> str:
+    available = {
+        "orjson": orjson is not None,
+        "msgspec": msgspec is not None,
+        "ujson": True,
+    }
+    if preferred:
+        if available.get(preferred):
+            return preferred
+        log.warning(f"JSON backend {preferred} is not available, picking the fastest installed one")
+    return next(backend for backend, installed in available.items() if installed)
+
+
+json_backend = _select_json_backend(JSON_BACKEND)
+
+if json_backend == "orjson":
+    _fast_loads = orjson.loads
+    _orjson_options = orjson.OPT_NON_STR_KEYS
+
+    def _fast_dumps(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+        options = _orjson_options
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=options)
+
+elif json_backend == "msgspec":
+    _msgspec_decoder = msgspec.json.Decoder()
+    _msgspec_encoder = msgspec.json.Encoder()
+    _fast_loads = _msgspec_decoder.decode
+
+    def _fast_dumps(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+        if sort_keys:
+            obj = msgspec.to_builtins(obj, order="sorted")
+        data = _msgspec_encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+else:
+    _fast_loads = ujson.loads
+
+    def _fast_dumps(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+        return ujson.dumps(obj, indent=2 if indent else 0, sort_keys=sort_keys).encode()
+
+
+def json_loads(data: Union[bytes, bytearray, memoryview, str], exact_ints: bool = False) -> Any:
+    """
+    Parses a JSON document with the selected backend. Bytes are parsed directly, without
+    decoding them to a str first.
+
+    orjson and msgspec only handle 64-bit integers, and orjson silently turns larger ones into
+    floats. Pass `exact_ints=True` for documents that may contain them (e.g. V3 liquidity
+    snapshots) to parse with the standard library instead.
+
+    Args:
+        data (Union[bytes, bytearray, memoryview, str]): The JSON document.
+        exact_ints (bool): Parse integers of any size exactly.
+
+    Returns:
+        Any: The parsed document.
+    """
+    if exact_ints:
+        return json.loads(data if isinstance(data, (str, bytes, bytearray)) else bytes(data))
+    return _fast_loads(data)
+
+
+def json_dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serializes an object to JSON bytes with the selected backend, falling back to the standard
+    library for values the backend rejects (such as integers wider than 64 bits).
+
+    Args:
+        obj (Any): The object to serialize.
+        indent (bool): Indent nested values by two spaces.
+        sort_keys (bool): Sort dictionary keys.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    try:
+        return _fast_dumps(obj, indent=indent, sort_keys=sort_keys)
+    except (TypeError, ValueError, OverflowError):
+        return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys).encode()
+
+
+def load_json_file(path: Union[str, Path], exact_ints: bool = False) -> Any:
+    """
+    Reads and parses a JSON file in one pass over its raw bytes.
+
+    Args:
+        path (Union[str, Path]): The file to read.
+        exact_ints (bool): Parse integers of any size exactly, see `json_loads`.
+
+    Returns:
+        Any: The parsed document.
+    """
+    with open(path, "rb") as file:
+        return json_loads(file.read(), exact_ints=exact_ints)
+
+
+def dump_json_file(path: Union[str, Path], obj: Any, indent: bool = True, sort_keys: bool = False):
+    """
+    Serializes an object and writes it to a JSON file.
+
+    Args:
+        path (Union[str, Path]): The file to write.
+        obj (Any): The object to serialize.
+        indent (bool): Indent nested values by two spaces.
+        sort_keys (bool): Sort dictionary keys.
+    """
+    data = json_dumps(obj, indent=indent, sort_keys=sort_keys)
+    with open(path, "wb") as file:
+        file.write(data)
+
 
 async def get_redis_value(redis_client, key):
     try:
         result = await redis_client.get(key)
-        return ujson.loads(result) if result else None
+        return json_loads(result) if result else None
     except Exception as exc:
         log.error(f"(get_redis_value) ({key}) ({type(exc)}): {exc}")
 
 
 async def publish_redis_message(redis_client, channel, message):
     try:
-        result = await redis_client.publish(channel, ujson.dumps(message))
+        result = await redis_client.publish(channel, json_dumps(message))
     except Exception as exc:
         log.error(f"(publish_redis_message) ({channel}) ({type(exc)}): {exc}")
 
 
 async def set_redis_value(redis_client, key, value):
     try:
-        result = await redis_client.set(key, ujson.dumps(value))
+        result = await redis_client.set(key, json_dumps(value))
     except Exception as exc:
         log.error(f"(set_redis_value) ({key} : {value}) ({type(exc)}): {exc}")
+
+
+async def iter_redis_channel(redis_client, channel) -> AsyncIterator[List[bytes]]:
+    """
+    Yields the payloads published on a redis pub/sub channel, one per batch.
+
+    Messages published while nobody is subscribed are lost.
+    """
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(channel)
+    try:
+        async for message in pubsub.listen():
+            if message["type"] == "message" and message.get("data"):
+                yield [message["data"]]
+    finally:
+        await pubsub.unsubscribe(channel)
+
+
+async def iter_redis_stream(
+    redis_client,
+    stream,
+    group,
+    consumer,
+    batch_size: int = REDIS_STREAM_BATCH_SIZE,
+    block_ms: int = REDIS_STREAM_BLOCK_MS,
+) -> AsyncIterator[List[bytes]]:
+    """
+    Yields batches of payloads read from a redis stream through a consumer group.
+
+    Entries are expected to carry their JSON payload in a `data` field. A batch is
+    acknowledged once the consumer asks for the next one, so anything that was delivered
+    but not fully processed before a restart is read again. On start, the entries still
+    pending for this consumer are replayed before new entries are read, and the group
+    itself remembers the last delivered ID, so nothing published while the bot was down
+    is skipped.
+    """
+    try:
+        await redis_client.xgroup_create(stream, group, id="$", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+    # "0" reads this consumer's pending (unacknowledged) entries, ">" reads new ones
+    last_id = "0"
+
+    while True:
+        response = await redis_client.xreadgroup(
+            group,
+            consumer,
+            {stream: last_id},
+            count=batch_size,
+            block=block_ms,
+        )
+
+        entries = response[0][1] if response else []
+
+        if not entries:
+            if last_id != ">":
+                log.info(f"(iter_redis_stream) ({stream}) Replayed pending entries, reading new entries")
+                last_id = ">"
+            continue
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+
+        # Entries trimmed from the stream while pending come back without fields
+        payloads = [fields[b"data"] for _, fields in entries if fields and fields.get(b"data")]
+        if payloads:
+            yield payloads
+
+        await redis_client.xack(stream, group, *entry_ids)
+
+        if last_id != ">":
+            last_id = entry_ids[-1]
+
+
+def iter_redis_messages(
+    redis_client,
+    channel,
+    consumer_group: Optional[str] = None,
+    consumer: Optional[str] = None,
+) -> AsyncIterator[List[bytes]]:
+    """
+    Yields batches of message payloads for a channel, from a redis stream of the same name
+    when `REDIS_STREAMS` is enabled, or from pub/sub otherwise.
+    """
+    if REDIS_STREAMS:
+        return iter_redis_stream(
+            redis_client,
+            stream=channel,
+            group=consumer_group or "cream_bots",
+            consumer=consumer or "cream_bots",
+        )
+    return iter_redis_channel(redis_client, channel)
@@ -0,0 +1,100 @@
+"""
+Typed schemas for the messages CREAM publishes to Redis.
+
+Log events arrive as `eth_subscription` envelopes. They are decoded once into a `LogEvent` with
+the fields the handlers use already converted (checksummed address, int block number, raw data
+bytes), so nothing downstream walks the nested dicts or converts hex again. When msgspec is
+installed the envelope is decoded straight into typed structs, otherwise it is parsed with the
+configured JSON backend and the same fields are picked out.
+"""
+
+from eth_utils.address import to_checksum_address
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+from .decoders import to_bytes
+from .helpers import json_loads
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Pool and factory addresses repeat constantly, checksumming each one costs a keccak
+checksum_address = lru_cache(maxsize=65_536)(to_checksum_address)
+
+
+if msgspec is not None:
+
+    class LogEvent(msgspec.Struct, frozen=True, gc=False):
+        address: str
+        block_number: int
+        data: bytes
+        topics: Tuple[str, ...]
+
+    class _RawLog(msgspec.Struct, rename="camel", gc=False):
+        address: str
+        block_number: str
+        data: str
+        topics: List[str]
+
+    class _LogParams(msgspec.Struct, gc=False):
+        result: _RawLog
+
+    class _LogEnvelope(msgspec.Struct, gc=False):
+        params: _LogParams
+
+    _log_envelope_decoder = msgspec.json.Decoder(_LogEnvelope)
+
+    def decode_log_event(payload: Union[bytes, str]) -> LogEvent:
+        """
+        Decodes a `cream_events` message into a `LogEvent`.
+
+        Args:
+            payload (Union[bytes, str]): The raw JSON message.
+
+        Returns:
+            LogEvent: The decoded log.
+        """
+        result = _log_envelope_decoder.decode(payload).params.result
+        return LogEvent(
+            checksum_address(result.address),
+            int(result.block_number, 16),
+            to_bytes(result.data),
+            tuple(result.topics),
+        )
+
+else:
+
+    class LogEvent:
+        __slots__ = ("address", "block_number", "data", "topics")
+
+        def __init__(self, address: str, block_number: int, data: bytes, topics: Tuple[str, ...]):
+            self.address = address
+            self.block_number = block_number
+            self.data = data
+            self.topics = topics
+
+        def __repr__(self) -> str:
+            return (
+                f"LogEvent(address={self.address!r}, block_number={self.block_number}, "
+                f"data={self.data!r}, topics={self.topics!r})"
+            )
+
+    def decode_log_event(payload: Union[bytes, str]) -> LogEvent:
+        """
+        Decodes a `cream_events` message into a `LogEvent`.
+
+        Args:
+            payload (Union[bytes, str]): The raw JSON message.
+
+        Returns:
+            LogEvent: The decoded log.
+        """
+        result = json_loads(payload)["params"]["result"]
+        return LogEvent(
+            checksum_address(result["address"]),
+            int(result["blockNumber"], 16),
+            to_bytes(result["data"]),
+            tuple(result["topics"]),
+        )
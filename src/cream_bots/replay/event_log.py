@@ -0,0 +1,86 @@
+"""
+On-disk log of the messages CREAM publishes, for replaying them through the bots.
+
+The file starts with an 8 byte magic and a version, followed by one record per message: the
+channel id (1 byte), the receive timestamp (float64) and the payload length (uint32), then the
+raw payload bytes exactly as they came off Redis.
+"""
+
+from pathlib import Path
+import struct
+from typing import BinaryIO, Iterator, Tuple, Union
+
+CHANNELS = ("cream_events", "cream_app_state")
+MAGIC = b"CREAMLOG"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sH")
+_RECORD = struct.Struct("<BdI")
+
+
+class EventLogWriter:
+    def __init__(self, path: Union[str, Path]):
+        """
+        Appends messages to a new event log.
+
+        Args:
+            path (Union[str, Path]): The log file, overwritten if it exists.
+        """
+        self.path = Path(path)
+        self.records: int = 0
+        self._file: BinaryIO = open(self.path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, channel: str, timestamp: float, payload: bytes):
+        """
+        Args:
+            channel (str): One of `CHANNELS`.
+            timestamp (float): When the message was received, in seconds since the epoch.
+            payload (bytes): The raw message.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._file.write(_RECORD.pack(CHANNELS.index(channel), timestamp, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_event_log(path: Union[str, Path]) -> Iterator[Tuple[str, float, bytes]]:
+    """
+    Reads the records of an event log, in the order they were written. A truncated final
+    record (the recorder was killed mid-write) is ignored.
+
+    Args:
+        path (Union[str, Path]): The log file.
+
+    Returns:
+        Iterator[Tuple[str, float, bytes]]: The channel, timestamp and payload of each record.
+    """
+    with open(path, "rb") as file:
+        magic, version = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported event log version {version}")
+
+        while True:
+            record = file.read(_RECORD.size)
+            if len(record) < _RECORD.size:
+                return
+            channel_id, timestamp, length = _RECORD.unpack(record)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield CHANNELS[channel_id], timestamp, payload
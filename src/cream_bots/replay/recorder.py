@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import redis.asyncio as redis
+import time
+
+from .event_log import CHANNELS, EventLogWriter
+from ..config import helpers
+from ..config.constants import REDIS_HOST, REDIS_PORT
+
+
+async def record_channel(redis_client, channel: str, writer: EventLogWriter, counts: dict):
+    async for payloads in helpers.iter_redis_messages(
+        redis_client,
+        channel,
+        consumer_group="cream_recorder",
+        consumer="cream_recorder",
+    ):
+        timestamp = time.time()
+        for payload in payloads:
+            writer.write(channel, timestamp, payload)
+        counts[channel] += len(payloads)
+
+
+async def record(output: str, duration: float):
+    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+    counts = {channel: 0 for channel in CHANNELS}
+
+    with EventLogWriter(output) as writer:
+        tasks = [
+            asyncio.create_task(record_channel(redis_client, channel, writer, counts))
+            for channel in CHANNELS
+        ]
+        start = time.monotonic()
+        try:
+            while not duration or time.monotonic() - start < duration:
+                await asyncio.sleep(5)
+                writer.flush()
+                print(", ".join(f"{channel}: {count}" for channel, count in counts.items()))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await redis_client.aclose()
+
+    print(f"Recorded {writer.records} messages to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record the CREAM Redis channels to an event log")
+    parser.add_argument("output", type=str, help="The event log file to write")
+    parser.add_argument(
+        "--duration", type=float, default=0, help="Seconds to record for, until interrupted if 0"
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(record(args.output, args.duration))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
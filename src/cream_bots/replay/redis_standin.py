@@ -0,0 +1,133 @@
+import asyncio
+from collections import defaultdict, deque
+import itertools
+from typing import Deque, Dict, List, Optional
+
+
+class ReplayPubSub:
+    def __init__(self, redis_client: "ReplayRedis"):
+        self.redis_client = redis_client
+        self.channels: List[str] = []
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.channels.append(channel)
+            self.redis_client._subscribe(channel, self.queue)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or list(self.channels):
+            self.channels.remove(channel)
+            self.redis_client._unsubscribe(channel, self.queue)
+
+    async def listen(self):
+        while True:
+            channel, payload = await self.queue.get()
+            yield {"type": "message", "channel": channel.encode(), "data": payload}
+
+
+class ReplayRedis:
+    def __init__(self):
+        """
+        In-process stand-in for the subset of the `redis.asyncio.Redis` client the bots use,
+        so recorded messages can be replayed without a Redis server or its round trips.
+
+        Unlike Redis, messages fed to a channel nobody is subscribed to (or a stream with no
+        consumer group) are kept until the first subscriber arrives, since the event service
+        only subscribes once the pools are loaded.
+        """
+        self.values: Dict[str, bytes] = {}
+
+        self._backlog: Dict[str, Deque[bytes]] = defaultdict(deque)
+        self._subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+        self._groups: Dict[str, Dict[str, asyncio.Queue]] = defaultdict(dict)
+        self._entry_ids = itertools.count(1)
+
+    def feed(self, channel: str, payload: bytes) -> int:
+        """
+        Delivers a message to the subscribers and consumer groups of `channel`.
+
+        Returns:
+            int: The number of receivers, 0 if the message was buffered.
+        """
+        receivers = self._subscribers[channel] + list(self._groups[channel].values())
+        if not receivers:
+            self._backlog[channel].append(payload)
+            return 0
+        for queue in receivers:
+            queue.put_nowait((channel, payload))
+        return len(receivers)
+
+    def backlog(self, channel: str) -> int:
+        """
+        The number of messages fed to `channel` that no receiver has taken yet.
+        """
+        receivers = self._subscribers[channel] + list(self._groups[channel].values())
+        return len(self._backlog[channel]) + sum(queue.qsize() for queue in receivers)
+
+    def pubsub(self) -> ReplayPubSub:
+        return ReplayPubSub(self)
+
+    async def publish(self, channel: str, message) -> int:
+        return self.feed(channel, message)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.values.get(key)
+
+    async def set(self, key: str, value):
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def xgroup_create(self, stream: str, group: str, id: str = "$", mkstream: bool = False):
+        if group not in self._groups[stream]:
+            queue = self._groups[stream][group] = asyncio.Queue()
+            self._drain_backlog(stream, queue)
+        return True
+
+    async def xreadgroup(
+        self,
+        group: str,
+        consumer: str,
+        streams: Dict[str, str],
+        count: Optional[int] = None,
+        block: Optional[int] = None,
+    ):
+        # Entries are acknowledged as they are read, so there are never pending entries
+        (stream, last_id), = streams.items()
+        if last_id != ">":
+            return []
+
+        queue = self._groups[stream][group]
+        try:
+            first = await asyncio.wait_for(queue.get(), timeout=(block or 0) / 1000 or None)
+        except asyncio.TimeoutError:
+            return []
+
+        entries = [first]
+        while not queue.empty() and (count is None or len(entries) < count):
+            entries.append(queue.get_nowait())
+
+        return [
+            [
+                stream.encode(),
+                [(f"{next(self._entry_ids)}-0".encode(), {b"data": payload}) for _, payload in entries],
+            ]
+        ]
+
+    async def xack(self, stream: str, group: str, *entry_ids) -> int:
+        return len(entry_ids)
+
+    async def aclose(self):
+        pass
+
+    def _subscribe(self, channel: str, queue: asyncio.Queue):
+        self._subscribers[channel].append(queue)
+        self._drain_backlog(channel, queue)
+
+    def _unsubscribe(self, channel: str, queue: asyncio.Queue):
+        self._subscribers[channel].remove(queue)
+
+    def _drain_backlog(self, channel: str, queue: asyncio.Queue):
+        backlog = self._backlog[channel]
+        while backlog:
+            queue.put_nowait((channel, backlog.popleft()))
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import csv
+import time
+from typing import List, Tuple
+
+from .event_log import read_event_log
+from .redis_standin import ReplayRedis
+from ..app.bots.arb_bot import ArbBot
+from ..app.core.metrics import StageMetrics
+from ..config.constants import REDIS_STREAMS
+from ..config.schemas import decode_log_event
+
+
+async def wait_for_receivers(redis_client, bot_state, channels):
+    """
+    Waits until the bot is listening on every channel, messages published to Redis before
+    that are lost.
+    """
+    consumer_group = f"cream_bots_{bot_state.chain_name}_{bot_state.bot_name}".encode()
+    while True:
+        if REDIS_STREAMS:
+            ready = True
+            for channel in channels:
+                try:
+                    groups = await redis_client.xinfo_groups(channel)
+                except Exception:
+                    groups = []
+                ready &= any(group["name"] == consumer_group for group in groups)
+        else:
+            subscribers = await redis_client.pubsub_numsub(*channels)
+            ready = all(count > 0 for _, count in subscribers)
+        if ready:
+            return
+        await asyncio.sleep(0.1)
+
+
+async def feed_records(records, deliver, speed: float):
+    """
+    Delivers the records, keeping their recorded spacing divided by `speed`, or as fast as
+    possible if `speed` is 0.
+    """
+    replay_start = time.monotonic()
+    record_start = records[0][1]
+
+    for i, (channel, timestamp, payload) in enumerate(records):
+        if speed:
+            delay = (timestamp - record_start) / speed - (time.monotonic() - replay_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+        await deliver(channel, payload)
+
+
+async def sample_depths(bot_state, metrics: StageMetrics, event_backlog, interval: float):
+    start = time.monotonic()
+    while True:
+        metrics.sample_queue_depth(
+            time.monotonic() - start,
+            len(bot_state.pools_to_process),
+            event_backlog(),
+        )
+        await asyncio.sleep(interval)
+
+
+async def replay(args):
+    records: List[Tuple[str, float, bytes]] = list(read_event_log(args.log_file))
+    events = [payload for channel, _, payload in records if channel == "cream_events"]
+    if not events:
+        raise SystemExit(f"No events in {args.log_file}")
+
+    standin = ReplayRedis() if args.transport == "inprocess" else None
+    bot = ArbBot(args.chain_name, redis_client=standin)
+    bot_state = bot.bot_state
+    redis_client = bot_state.redis_client
+
+    metrics = StageMetrics()
+    bot_state.metrics = metrics
+    bot_state.pools_to_process.metrics = metrics
+
+    # The pool helpers are built at the state of the block before the first recorded event
+    bot_state.first_event = decode_log_event(events[0]).block_number
+
+    bot_task = asyncio.create_task(bot.run())
+    try:
+        print("Loading pools...")
+        while not bot_state.live:
+            if bot_task.done():
+                bot_task.result()
+            await asyncio.sleep(0.5)
+
+        if standin is not None:
+            async def deliver(channel, payload):
+                standin.feed(channel, payload)
+
+            def event_backlog():
+                return standin.backlog("cream_events")
+
+        else:
+            await wait_for_receivers(redis_client, bot_state, ("cream_events", "cream_app_state"))
+
+            async def deliver(channel, payload):
+                if REDIS_STREAMS:
+                    await redis_client.xadd(channel, {"data": payload})
+                else:
+                    await redis_client.publish(channel, payload)
+
+            def event_backlog():
+                return len(events) - metrics.count("event_decode")
+
+        sampler = asyncio.create_task(
+            sample_depths(bot_state, metrics, event_backlog, args.sample_interval)
+        )
+
+        speed = 0 if args.max_speed else args.speed
+        print(f"Replaying {len(records)} messages ({len(events)} events) at {'max' if not speed else f'{speed:g}x'} speed")
+
+        start = time.monotonic()
+        await feed_records(records, deliver, speed)
+        fed = time.monotonic() - start
+
+        # Drain: every event handled, no dirty pools left and no evaluation running
+        idle_since = None
+        while True:
+            drained = (
+                event_backlog() == 0
+                and len(bot_state.pools_to_process) == 0
+                and metrics.in_flight == 0
+            )
+            if drained:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= args.settle:
+                    break
+            else:
+                idle_since = None
+            await asyncio.sleep(0.01)
+        elapsed = idle_since - start
+
+        sampler.cancel()
+    finally:
+        bot_task.cancel()
+        await asyncio.gather(bot_task, return_exceptions=True)
+        await bot.close()
+
+    report(metrics, len(events), fed, elapsed)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["seconds", "pool_queue_depth", "event_backlog"])
+            writer.writerows(metrics.queue_depths)
+
+
+def report(metrics: StageMetrics, events: int, fed: float, elapsed: float):
+    print(f"\nEvents: {events} fed in {fed:.2f}s, processed in {elapsed:.2f}s ({events / elapsed:,.0f} events/s)")
+
+    print(f"\n{'stage':<16} {'count':>8} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, summary in sorted(metrics.summary().items()):
+        print(
+            f"{stage:<16} {summary['count']:>8} "
+            + " ".join(f"{summary[point] * 1e3:>10.3f}" for point in ("p50", "p90", "p99", "max"))
+        )
+
+    if metrics.queue_depths:
+        pool_depths = [pool_depth for _, pool_depth, _ in metrics.queue_depths]
+        backlogs = [backlog for _, _, backlog in metrics.queue_depths]
+        print(
+            f"\nPool queue depth: mean {sum(pool_depths) / len(pool_depths):.1f}, max {max(pool_depths)}"
+            f"\nEvent backlog: mean {sum(backlogs) / len(backlogs):.1f}, max {max(backlogs)}"
+            f" ({len(metrics.queue_depths)} samples)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an event log through the arb bot")
+    parser.add_argument("log_file", type=str, help="The event log written by cream_record")
+    parser.add_argument("chain_name", type=str, help="The name of the chain the log was recorded on")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Multiple of the recorded speed (default: 1)"
+    )
+    parser.add_argument(
+        "--max-speed", action="store_true", help="Feed the messages as fast as possible"
+    )
+    parser.add_argument(
+        "--transport",
+        choices=("inprocess", "redis"),
+        default="inprocess",
+        help="Feed the bot in-process, or publish to the Redis at REDIS_HOST",
+    )
+    parser.add_argument(
+        "--sample-interval", type=float, default=0.1, help="Seconds between queue depth samples"
+    )
+    parser.add_argument(
+        "--settle", type=float, default=0.5, help="Seconds the bot must stay idle to count as drained"
+    )
+    parser.add_argument("--csv", type=str, default=None, help="Write the queue depth samples to a CSV file")
+    args = parser.parse_args()
+
+    asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
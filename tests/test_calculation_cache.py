@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from cream_bots.app.core.calculation_cache import CalculationCache
+from cream_bots.app.core.pool_service import PoolRoute
+
+POOL_ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+class ExternalUpdatePool:
+    """
+    Mirrors `degenbot.LiquidityPool.update_reserves` on the external update path, which
+    replaces the reserves but returns False.
+    """
+
+    def __init__(self, reserves_token0: int, reserves_token1: int):
+        self.address = POOL_ADDRESS
+        self.reserves_token0 = reserves_token0
+        self.reserves_token1 = reserves_token1
+
+    def update_reserves(self, external_token0_reserves, external_token1_reserves, **kwargs) -> bool:
+        self.reserves_token0 = external_token0_reserves
+        self.reserves_token1 = external_token1_reserves
+        return False
+
+
+def make_cache():
+    pool_helper = ExternalUpdatePool(10**18, 2 * 10**18)
+    pool_route = PoolRoute(pool_manager=None, pool_helper=pool_helper)
+    cache = CalculationCache({POOL_ADDRESS: pool_route})
+    arb_helper = SimpleNamespace(id="arb", swap_pools=[pool_helper])
+
+    cache.put(arb_helper.id, cache.state_key(arb_helper), None)
+    return pool_route, cache, arb_helper
+
+
+def test_sync_with_new_reserves_invalidates_cached_result():
+    pool_route, cache, arb_helper = make_cache()
+
+    assert pool_route.update_v2_reserves(10**18 + 1, 2 * 10**18 - 1, 100)
+
+    hit, _ = cache.get(arb_helper.id, cache.state_key(arb_helper))
+    assert not hit
+
+
+def test_sync_with_same_reserves_keeps_cached_result():
+    pool_route, cache, arb_helper = make_cache()
+
+    assert not pool_route.update_v2_reserves(10**18, 2 * 10**18, 100)
+
+    hit, result = cache.get(arb_helper.id, cache.state_key(arb_helper))
+    assert hit
+    assert result is None
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import degenbot
+from degenbot.uniswap.v3_snapshot import UniswapV3LiquiditySnapshot
+from degenbot.uniswap.v3_types import (
+    UniswapV3BitmapAtWord,
+    UniswapV3LiquidityAtTick,
+    UniswapV3LiquidityEvent,
+    UniswapV3PoolState,
+)
+
+from cream_bots.app.core.pool_service import PoolRoute
+from cream_bots.app.core.snapshot_service import SnapshotService
+
+POOL_ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+def make_helper(tick_bitmap, tick_data) -> degenbot.V3LiquidityPool:
+    # Skips __init__, which needs a chain connection
+    pool_helper = object.__new__(degenbot.V3LiquidityPool)
+    pool_helper.address = POOL_ADDRESS
+    pool_helper.tick_spacing = 60
+    pool_helper.state = UniswapV3PoolState(
+        pool=POOL_ADDRESS,
+        liquidity=0,
+        sqrt_price_x96=2**96,
+        tick=0,
+        tick_bitmap=tick_bitmap,
+        tick_data=tick_data,
+    )
+    pool_helper._sparse_bitmap = False
+    return pool_helper
+
+
+def test_restart_with_catch_up_events_writes_helper_ticks(tmp_path):
+    snapshot_path = tmp_path / "ethereum_v3_liquidity_snapshot.json"
+    snapshot_path.write_text(
+        json.dumps(
+            {
+                "snapshot_block": 100,
+                POOL_ADDRESS: {
+                    "tick_bitmap": {"0": {"bitmap": 1, "block": 90}},
+                    "tick_data": {"0": {"liquidityNet": 10, "liquidityGross": 10, "block": 90}},
+                },
+            }
+        )
+    )
+    snapshot = UniswapV3LiquiditySnapshot(str(snapshot_path), chain_id=1)
+    snapshot._liquidity_events[POOL_ADDRESS] = [
+        UniswapV3LiquidityEvent(block_number=105, liquidity=5, tick_lower=0, tick_upper=60, tx_index=0)
+    ]
+    snapshot.newest_block = 105
+
+    # The helper is built from the snapshot and applies the catch-up event to its own tick maps
+    assert snapshot.get_new_liquidity_updates(POOL_ADDRESS)
+    tick_bitmap = dict(snapshot.get_tick_bitmap(POOL_ADDRESS))
+    tick_data = dict(snapshot.get_tick_data(POOL_ADDRESS))
+    tick_bitmap[0] = UniswapV3BitmapAtWord(bitmap=3, block=105)
+    tick_data[0] = UniswapV3LiquidityAtTick(liquidityNet=15, liquidityGross=15, block=105)
+    tick_data[60] = UniswapV3LiquidityAtTick(liquidityNet=-5, liquidityGross=5, block=105)
+    pool_helper = make_helper(tick_bitmap, tick_data)
+
+    bot_state = SimpleNamespace(
+        snapshot=snapshot,
+        pool_routes={POOL_ADDRESS: PoolRoute(pool_manager=None, pool_helper=pool_helper)},
+        pools_loaded=True,
+        checkpoint_service=None,
+    )
+    snapshot_service = SnapshotService(bot_state, snapshot_path)
+
+    async def restart():
+        await snapshot_service.start()
+        assert POOL_ADDRESS in snapshot_service.dirty_pools
+        snapshot_service.flush(106)
+        await snapshot_service._write_task
+
+    asyncio.run(restart())
+
+    written = json.loads(snapshot_path.read_text())
+    assert written["snapshot_block"] == 106
+    assert written[POOL_ADDRESS]["tick_bitmap"] == {"0": {"bitmap": 3, "block": 105}}
+    assert written[POOL_ADDRESS]["tick_data"] == {
+        "0": {"liquidityNet": 15, "liquidityGross": 15, "block": 105},
+        "60": {"liquidityNet": -5, "liquidityGross": 5, "block": 105},
+    }